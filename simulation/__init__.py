@@ -0,0 +1,10 @@
+"""Monte Carlo simulations to test schedule scenarios.
+
+    Call ``run`` to simulate scenarios from Python, or run the package with
+    ``python -m simulation`` to write the results workbook. ``IncrementalRun``
+    re-evaluates a run quickly after an event's rates change.
+"""
+from .incremental import IncrementalRun
+from .results import SimulationResultSet
+from .runner import run
+from .scenarios import scenarios
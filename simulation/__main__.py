@@ -1,496 +1,346 @@
 """Runs the simulations."""
+import argparse
+import asyncio
 from pathlib import Path
+import sys
 import time
 
 import numpy as np
-from openpyxl import Workbook
-
-from scenarios import scenarios, cycle_length, Stats
-
-
-def simulate_period(weeks, scenario):
-    """Runs a simulation over the defined period.
-
-        Attributes:
-            weeks (float): the number of weeks in each simulation
-            case_details (dict): a dicationary of details for this case
-    """
-    # The employee capacity for shifts (or how many shifts the staff can
-    # cover in this scenario)
-    shift_capacity = scenario.fte.actual.total * 5
-
-    # Dictionary to contain all event outcomes
-    event_results = {}
-
-    for event in scenario.events:
-        event_results[event.name] = {
-            'outcome_0': 0,
-            'outcome_2': 0,
-            'outcome_4': 0,
-            'outcome_12': 0,
-            'outcome_total': 0,
-        }
-
-    # Dictionary to hold all results for shift evaluations
-    uncovered_shifts = {}
-    excess_shifts = 0
-    actual_fte = []
-
-    for shift in scenario.shifts:
-        uncovered_shifts[shift.name] = 0
-
-    # Variable to track the number of shift changes
-    total_shift_changes = {
-        'change_0': 0,
-        'change_2': 0,
-        'change_4': 0,
-        'change_12': 0,
-        'change_total': 0,
-    }
-
-    # Iterate through each week
-    for _ in range(weeks):
-        # Numpy generator for binomial evaluations
-        gen = np.random.Generator(np.random.PCG64())
-
-        # Number of shifts lost each week
-        week_shift_losses = 0
-
-        for event in scenario.events:
-            # Only evaluate event if current total is less than cycle max
-            if event.cycle_max and event_results[event.name]['outcome_total'] >= event.cycle_max:
-                continue
-            else:
-                # Check if an event occurence happens for each timeframe
-                week_0 = gen.binomial(shift_capacity, event.rate_0)
-                week_2 = gen.binomial(shift_capacity, event.rate_2)
-                week_4 = gen.binomial(shift_capacity, event.rate_4)
-                week_12 = gen.binomial(shift_capacity, event.rate_12)
-                event_total = week_0 + week_2 + week_4 + week_12
-
-                week_shift_losses += (event_total * event.losses)
-
-                week_changes_0 = week_0 * event.changes
-                week_changes_2 = week_2 * event.changes
-                week_changes_4 = week_4 * event.changes
-                week_changes_12 = week_12 * event.changes
-                week_changes_total = event_total * event.changes
-
-                # Update the results dictionaries with this week's results
-                event_results[event.name]['outcome_0'] += week_0
-                event_results[event.name]['outcome_2'] += week_2
-                event_results[event.name]['outcome_4'] += week_4
-                event_results[event.name]['outcome_12'] += week_12
-                event_results[event.name]['outcome_total'] += event_total
-
-                total_shift_changes['change_0'] += week_changes_0
-                total_shift_changes['change_2'] += week_changes_2
-                total_shift_changes['change_4'] += week_changes_4
-                total_shift_changes['change_12'] += week_changes_12
-                total_shift_changes['change_total'] += week_changes_total
-
-        # Evaluates how many shifts can be covered in this scenario based
-        # based on desired shifts to be covered, the employee availability,
-        # and the events that occurred this week.
-        # The starting capacity will be the normal weekly capacity minus the
-        # week event total.
-        remaining_capacity = shift_capacity - week_shift_losses
-        actual_fte.append(remaining_capacity / 5)
-
-        # Iterate through each shift and start assigning remaining capacity
-        for shift in scenario.shifts:
-            if remaining_capacity >= shift.number:
-                remaining_capacity -= shift.number
-            else:
-                remaining_capacity = 0
-                uncovered_shifts[shift.name] += (shift.number - remaining_capacity)
-
-        # Record any remaining capacity
-        if remaining_capacity > 0:
-            excess_shifts += remaining_capacity
-
-    return {
-        'events': event_results,
-        'uncovered_shifts': uncovered_shifts,
-        'excess_shifts': excess_shifts,
-        'actual_fte': np.mean(actual_fte),
-        'shift_changes': total_shift_changes,
-    }
+
+from .checkpoints import Checkpoint
+from .export import write_workbook
+from .pipeline import queue_size_for_budget, run_pipeline
+from .rare_events import estimate_shortfall_risk
+from .runner import bit_generators, engines, stream_block_size
+from .samplers import samplers, variance_reductions
+from .scenarios import scenarios, cycle_length
+from .service import serve
+from .shards import merge_shards, write_shard
+
 
 # Simulation Details
 num_simulations = 1000
 
-# Running the simulations
-print('========================================================================')
-print('RDRHC Monte Carlo Simulations')
-print('========================================================================')
-print('Created by Joshua Torrance. 2024.')
-print('\nRunning simulations for each scenario.')
-print(f'  - Number of Simulations per Scenario: {num_simulations}')
-print(f'  - Length of Each Simulation: {cycle_length} weeks')
-print('\n------------------------------------------------------------------------')
-print('SCENARIOS')
-print('------------------------------------------------------------------------')
-
-# Variables to manage output workbook details
-output_wb = Workbook()
-output_ws = output_wb.active
-num_scenarios = len(scenarios)
-
-for scenario in scenarios:
-    print(f'  - {scenario.name}')
-
-    # Set Worksheet Title
-    output_ws.title = scenario.name
-
-    # Run simulations function and collect results in array
-    scenario_results = []
-
-    for _ in range(num_simulations):
-        scenario_results.append(simulate_period(cycle_length, scenario))
-
-    # Analyze event results
-    # Add each type of event as a dictionary value
-    simulation_event_results = {
-        'All Events': {
-            'outcome_0': [],
-            'outcome_2': [],
-            'outcome_4': [],
-            'outcome_12': [],
-            'outcome_total': [],
-        },
-    }
-
-    for event in scenario.events:
-        simulation_event_results[event.name] = {
-            'outcome_0': [],
-            'outcome_2': [],
-            'outcome_4': [],
-            'outcome_12': [],
-            'outcome_total': [],
-        }
-
-    # Add each type of shift as a dictionary value
-    simulation_coverage_results = {
-        'All Shifts': [],
-    }
-
-    for shift in scenario.shifts:
-        simulation_coverage_results[shift.name] = []
-    
-    # Holds the count for number of excess shifts
-    simulation_excess_shifts = []
-
-    # Holds the actual FTE amounts
-    simulation_actual_fte = []
-
-    # Holds the number of shift changes
-    simulation_shift_changes = {
-        'week_0': [],
-        'week_2': [],
-        'week_4': [],
-        'week_12': [],
-        'week_total': [],
-    }
-
-    # Iterate through each scenario results
-    for cycle_results in scenario_results:
-        all_events_0 = []
-        all_events_2 = []
-        all_events_4 = []
-        all_events_12 = []
-        all_events_total = []
-        all_uncovered_shifts = 0
-
-        # Iterate through the results of each event
-        for name, results in cycle_results['events'].items():
-            outcome_0 = results['outcome_0']
-            outcome_2 = results['outcome_2']
-            outcome_4 = results['outcome_4']
-            outcome_12 = results['outcome_12']
-            outcome_total = results['outcome_total']
-
-            simulation_event_results[name]['outcome_0'].append(outcome_0)
-            simulation_event_results[name]['outcome_2'].append(outcome_2)
-            simulation_event_results[name]['outcome_4'].append(outcome_4)
-            simulation_event_results[name]['outcome_12'].append(outcome_12)
-            simulation_event_results[name]['outcome_total'].append(outcome_total)
-
-            all_events_0.append(outcome_0)
-            all_events_2.append(outcome_2)
-            all_events_4.append(outcome_4)
-            all_events_12.append(outcome_12)
-            all_events_total.append(outcome_total)
-        
-        # Update the special "All Events" entry
-        simulation_event_results['All Events']['outcome_0'] = all_events_0
-        simulation_event_results['All Events']['outcome_2'] = all_events_2
-        simulation_event_results['All Events']['outcome_4'] = all_events_4
-        simulation_event_results['All Events']['outcome_12'] = all_events_12
-        simulation_event_results['All Events']['outcome_total'] = all_events_total
-
-        # Iterate through the results of each shift
-        for name, results in cycle_results['uncovered_shifts'].items():
-            simulation_coverage_results[name].append(results)
-            all_uncovered_shifts += results
-
-        # Update the special "All Shifts" entry
-        simulation_coverage_results['All Shifts'].append(all_uncovered_shifts)
-
-        # Add the excess shifts results
-        simulation_excess_shifts.append(cycle_results['excess_shifts'])
-
-        # Add the actual FTE results
-        simulation_actual_fte.append(cycle_results['actual_fte'])
-
-        # Add the shift changes results
-        simulation_shift_changes['week_0'].append(cycle_results['shift_changes']['change_0'])
-        simulation_shift_changes['week_2'].append(cycle_results['shift_changes']['change_2'])
-        simulation_shift_changes['week_4'].append(cycle_results['shift_changes']['change_4'])
-        simulation_shift_changes['week_12'].append(cycle_results['shift_changes']['change_12'])
-        simulation_shift_changes['week_total'].append(cycle_results['shift_changes']['change_total'])
-
-    # Iterate through the lists of simulation event results to run calculations
-    simulations_stats = {
-        'events': {},
-        'uncovered_shifts': {},
-    }
-
-    for name, values in simulation_event_results.items():
-        stats_0 = Stats(values['outcome_0'])
-        stats_2 = Stats(values['outcome_2'])
-        stats_4 = Stats(values['outcome_4'])
-        stats_12 = Stats(values['outcome_12'])
-        stats_total = Stats(values['outcome_total'])
-
-        simulations_stats['events'][name] = {
-            'stats_0': stats_0,
-            'stats_2': stats_2,
-            'stats_4': stats_4,
-            'stats_12': stats_12,
-            'stats_total': stats_total,
-        }
-
-    # Shift Coverage Stats
-    for name, values in simulation_coverage_results.items():
-        uncovered_shift_stats = Stats(values)
-
-        simulations_stats['uncovered_shifts'][name] = uncovered_shift_stats
-        
-    # Excess shift capacity stats
-    excess_shifts_stats = Stats(simulation_excess_shifts)
-
-    # Actual FTE stats
-    actual_fte_stats = Stats(simulation_actual_fte)
-
-    # Number of shift changes for cycle
-    shift_changes_stats_0 = Stats(simulation_shift_changes['week_0'])
-    shift_changes_stats_2 = Stats(simulation_shift_changes['week_2'])
-    shift_changes_stats_4 = Stats(simulation_shift_changes['week_4'])
-    shift_changes_stats_12 = Stats(simulation_shift_changes['week_12'])
-    shift_changes_stats_total = Stats(simulation_shift_changes['week_total'])
-
-    # Write data to the active worksheet
-    row_num = 1
-
-    # Basic Monte Carlo Details
-    output_ws.cell(row=row_num, column=1, value='SIMULATION DETAILS')
-    row_num += 1
-    
-    output_ws.cell(row=row_num, column=2, value='Value')
-    row_num += 1
-
-    output_ws.cell(row=row_num, column=1, value='Number of Simulations')
-    output_ws.cell(row=row_num, column=2, value=num_simulations)
-    row_num += 1
-
-    output_ws.cell(row=row_num, column=1, value='Length of Simulation Cycle (weeks)')
-    output_ws.cell(row=row_num, column=2, value=cycle_length)
-    row_num += 2
-
-    # Event Details
-    output_ws.cell(row=row_num, column=1, value='EVENT DETAILS')
-    row_num += 1
-
-    output_ws.cell(row=row_num, column=1, value='Event')
-    output_ws.cell(row=row_num, column=2, value='Rate of Changes (changes per event occurrence)')
-    output_ws.cell(row=row_num, column=3, value='Rate of Lost Shift Capacity (lost shifts per event occurrence)')
-    output_ws.cell(row=row_num, column=4, value='Event Rate Occurence - Total')
-    output_ws.cell(row=row_num, column=5, value='Event Rate Occurence - 0 to 2 weeks')
-    output_ws.cell(row=row_num, column=6, value='Event Rate Occurence - 2 to 4 weeks')
-    output_ws.cell(row=row_num, column=7, value='Event Rate Occurence - 4 to 12 weeks')
-    output_ws.cell(row=row_num, column=8, value='Event Rate Occurence - 12+ weeks')
-    output_ws.cell(row=row_num, column=9, value='Maximum Number of Allowed Events per Cycle')
-    row_num += 1
-
-    for event in scenario.events:
-        output_ws.cell(row=row_num, column=1, value=event.name)
-        output_ws.cell(row=row_num, column=2, value=event.changes)
-        output_ws.cell(row=row_num, column=3, value=event.losses)
-        output_ws.cell(row=row_num, column=4, value=np.round(event.rate_total, 4))
-        output_ws.cell(row=row_num, column=5, value=np.round(event.rate_0, 4))
-        output_ws.cell(row=row_num, column=6, value=np.round(event.rate_2, 4))
-        output_ws.cell(row=row_num, column=7, value=np.round(event.rate_4, 4))
-        output_ws.cell(row=row_num, column=8, value=np.round(event.rate_12, 4))
-        output_ws.cell(row=row_num, column=9, value=event.cycle_max)
-        row_num +=1
-
-    row_num +=1
-
-    # Event occurence details for the simulation
-    output_ws.cell(row=row_num, column=1, value='EVENT RESULTS')
-    row_num += 1
-
-    output_ws.cell(row=row_num, column=1, value='Event')
-    output_ws.cell(row=row_num, column=2, value='Total - Mean')
-    output_ws.cell(row=row_num, column=3, value='Total - Lower CI')
-    output_ws.cell(row=row_num, column=4, value='Total - Upper CI')
-    output_ws.cell(row=row_num, column=5, value='Weeks 0 to 2 - Mean')
-    output_ws.cell(row=row_num, column=6, value='Weeks 0 to 2 - Lower CI')
-    output_ws.cell(row=row_num, column=7, value='Weeks 0 to 2 - Upper CI')
-    output_ws.cell(row=row_num, column=8, value='Weeks 2 to 4 - Mean')
-    output_ws.cell(row=row_num, column=9, value='Weeks 2 to 4 - Lower CI')
-    output_ws.cell(row=row_num, column=10, value='Weeks 2 to 4 - Upper CI')
-    output_ws.cell(row=row_num, column=11, value='Weeks 4 to 12 - Mean')
-    output_ws.cell(row=row_num, column=12, value='Weeks 4 to 12 - Lower CI')
-    output_ws.cell(row=row_num, column=13, value='Weeks 4 to 12 - Upper CI')
-    output_ws.cell(row=row_num, column=14, value='Weeks 12+ - Mean')
-    output_ws.cell(row=row_num, column=15, value='Weeks 12+ - Lower CI')
-    output_ws.cell(row=row_num, column=16, value='Weeks 12+ - Upper CI')
-
-    row_num += 1
-
-    for event_name, event_stats in simulations_stats['events'].items():
-        output_ws.cell(row=row_num, column=1, value=event_name)
-        output_ws.cell(row=row_num, column=2, value=event_stats['stats_total'].mean)
-        output_ws.cell(row=row_num, column=3, value=event_stats['stats_total'].ci_lower)
-        output_ws.cell(row=row_num, column=4, value=event_stats['stats_total'].ci_upper)
-        output_ws.cell(row=row_num, column=5, value=event_stats['stats_0'].mean)
-        output_ws.cell(row=row_num, column=6, value=event_stats['stats_0'].ci_lower)
-        output_ws.cell(row=row_num, column=7, value=event_stats['stats_0'].ci_upper)
-        output_ws.cell(row=row_num, column=8, value=event_stats['stats_2'].mean)
-        output_ws.cell(row=row_num, column=9, value=event_stats['stats_2'].ci_lower)
-        output_ws.cell(row=row_num, column=10, value=event_stats['stats_2'].ci_upper)
-        output_ws.cell(row=row_num, column=11, value=event_stats['stats_4'].mean)
-        output_ws.cell(row=row_num, column=12, value=event_stats['stats_4'].ci_lower)
-        output_ws.cell(row=row_num, column=13, value=event_stats['stats_4'].ci_upper)
-        output_ws.cell(row=row_num, column=14, value=event_stats['stats_12'].mean)
-        output_ws.cell(row=row_num, column=15, value=event_stats['stats_12'].ci_lower)
-        output_ws.cell(row=row_num, column=16, value=event_stats['stats_12'].ci_upper)
-        row_num += 1
-
-    row_num += 1
-
-    # Shift Details
-    output_ws.cell(row=row_num, column=1, value='SHIFT DETAILS')
-    row_num += 1
-
-    output_ws.cell(row=row_num, column=1, value='Shift Name')
-    output_ws.cell(row=row_num, column=2, value='Number of Shifts')
-    output_ws.cell(row=row_num, column=3, value='Shift Priority')
-    row_num += 1
-
-    for shift in scenario.shifts:
-        output_ws.cell(row=row_num, column=1, value=shift.name)
-        output_ws.cell(row=row_num, column=2, value=shift.number)
-        output_ws.cell(row=row_num, column=3, value=shift.priority)
-        row_num += 1
-        
-    row_num += 1
-
-    # Shift Results
-    output_ws.cell(row=row_num, column=1, value='UNCOVERED SHIFT RESULTS')
-    row_num += 1
-
-    output_ws.cell(row=row_num, column=1, value='Shift')
-    output_ws.cell(row=row_num, column=2, value='Mean Uncovered Shifts per Cycle')
-    output_ws.cell(row=row_num, column=3, value='Lower CI')
-    output_ws.cell(row=row_num, column=4, value='Upper CI')
-    row_num += 1
-
-    for shift_name, shift_stats in simulations_stats['uncovered_shifts'].items():
-        output_ws.cell(row=row_num, column=1, value=shift_name)
-        output_ws.cell(row=row_num, column=2, value=shift_stats.mean)
-        output_ws.cell(row=row_num, column=3, value=shift_stats.ci_lower)
-        output_ws.cell(row=row_num, column=4, value=shift_stats.ci_upper)
-        row_num += 1
-
-    row_num += 1
-
-    # Excess Shift Results
-    output_ws.cell(row=row_num, column=1, value='EXCESS SHIFT RESULTS')
-    row_num += 1
-    
-    output_ws.cell(row=row_num, column=2, value='Mean Number of Shifts Per Cycle')
-    output_ws.cell(row=row_num, column=3, value='Lower CI')
-    output_ws.cell(row=row_num, column=4, value='Upper CI')
-    row_num += 1
-    
-    output_ws.cell(row=row_num, column=1, value='Number of Excess Shifts')
-    output_ws.cell(row=row_num, column=2, value=excess_shifts_stats.mean)
-    output_ws.cell(row=row_num, column=3, value=excess_shifts_stats.ci_lower)
-    output_ws.cell(row=row_num, column=4, value=excess_shifts_stats.ci_upper)
-    row_num += 2
-
-    # Actual FTE Results
-    output_ws.cell(row=row_num, column=1, value='ACTUAL FTE RESULTS')
-    row_num += 1
-    
-    output_ws.cell(row=row_num, column=2, value='Mean Actual Worked FTE per Cycle')
-    output_ws.cell(row=row_num, column=3, value='Lower CI')
-    output_ws.cell(row=row_num, column=4, value='Upper CI')
-    row_num += 1
-    
-    output_ws.cell(row=row_num, column=1, value='Actual Worked FTE')
-    output_ws.cell(row=row_num, column=2, value=actual_fte_stats.mean)
-    output_ws.cell(row=row_num, column=3, value=actual_fte_stats.ci_lower)
-    output_ws.cell(row=row_num, column=4, value=actual_fte_stats.ci_upper)
-    row_num += 2
-
-    # Number of Shift Changes
-    output_ws.cell(row=row_num, column=1, value='NUMBER OF SHIFT CHANGES')
-    row_num += 1
-
-    output_ws.cell(row=row_num, column=2, value='Total - Mean')
-    output_ws.cell(row=row_num, column=3, value='Total - Lower CI')
-    output_ws.cell(row=row_num, column=4, value='Total - Upper CI')
-    output_ws.cell(row=row_num, column=5, value='Weeks 0 to 2 - Mean')
-    output_ws.cell(row=row_num, column=6, value='Weeks 0 to 2 - Lower CI')
-    output_ws.cell(row=row_num, column=7, value='Weeks 0 to 2 - Upper CI')
-    output_ws.cell(row=row_num, column=8, value='Weeks 2 to 4 - Mean')
-    output_ws.cell(row=row_num, column=9, value='Weeks 2 to 4 - Lower CI')
-    output_ws.cell(row=row_num, column=10, value='Weeks 2 to 4 - Upper CI')
-    output_ws.cell(row=row_num, column=11, value='Weeks 4 to 12 - Mean')
-    output_ws.cell(row=row_num, column=12, value='Weeks 4 to 12 - Lower CI')
-    output_ws.cell(row=row_num, column=13, value='Weeks 4 to 12 - Upper CI')
-    output_ws.cell(row=row_num, column=14, value='Weeks 12+ - Mean')
-    output_ws.cell(row=row_num, column=15, value='Weeks 12+ - Lower CI')
-    output_ws.cell(row=row_num, column=16, value='Weeks 12+ - Upper CI')
-    row_num += 1
-
-    output_ws.cell(row=row_num, column=1, value='Number of Shift Changes')
-    output_ws.cell(row=row_num, column=2, value=shift_changes_stats_total.mean)
-    output_ws.cell(row=row_num, column=3, value=shift_changes_stats_total.ci_lower)
-    output_ws.cell(row=row_num, column=4, value=shift_changes_stats_total.ci_upper)
-    output_ws.cell(row=row_num, column=5, value=shift_changes_stats_0.mean)
-    output_ws.cell(row=row_num, column=6, value=shift_changes_stats_0.ci_lower)
-    output_ws.cell(row=row_num, column=7, value=shift_changes_stats_0.ci_upper)
-    output_ws.cell(row=row_num, column=8, value=shift_changes_stats_2.mean)
-    output_ws.cell(row=row_num, column=9, value=shift_changes_stats_2.ci_lower)
-    output_ws.cell(row=row_num, column=10, value=shift_changes_stats_2.ci_upper)
-    output_ws.cell(row=row_num, column=11, value=shift_changes_stats_4.mean)
-    output_ws.cell(row=row_num, column=12, value=shift_changes_stats_4.ci_lower)
-    output_ws.cell(row=row_num, column=13, value=shift_changes_stats_4.ci_upper)
-    output_ws.cell(row=row_num, column=14, value=shift_changes_stats_12.mean)
-    output_ws.cell(row=row_num, column=15, value=shift_changes_stats_12.ci_lower)
-    output_ws.cell(row=row_num, column=16, value=shift_changes_stats_12.ci_upper)
-    
-    # Create a new worksheet if necessary
-    if len(output_wb.worksheets) < num_scenarios:
-        output_ws = output_wb.create_sheet()
-
-# Save the workbook results
-current_loc = Path('.')
-save_loc = (current_loc / 'results' / f'simulation_results_{int(time.time())}.xlsx').resolve()
-print(f'Writing results to file: {save_loc}')
-output_wb.save(save_loc)
\ No newline at end of file
+# The simulation engine to use (see ``runner.engines``)
+engine = 'period'
+
+# How event occurrences are sampled (see ``samplers.samplers``); 'binomial'
+# is exact, the others are faster approximations
+sampler = 'binomial'
+
+# The bit generator behind the random streams (see ``runner.bit_generators``)
+bit_generator = 'pcg64'
+
+# How the simulations are sampled to reduce the variance of the results
+# (see ``samplers.variance_reductions``)
+variance_reduction = 'none'
+
+# Where checkpoints are kept when resuming without a checkpoint directory
+default_checkpoint_dir = Path('results') / 'checkpoint'
+
+
+def print_header(
+    num_simulations, engine, seed, sampler, bit_generator, variance_reduction,
+    common_random_numbers=False,
+):
+    """Prints the details of the run."""
+    print('========================================================================')
+    print('RDRHC Monte Carlo Simulations')
+    print('========================================================================')
+    print('Created by Joshua Torrance. 2024.')
+    print('\nRunning simulations for each scenario.')
+    print(f'  - Number of Simulations per Scenario: {num_simulations}')
+    print(f'  - Length of Each Simulation: {cycle_length} weeks')
+    print(f'  - Simulation Engine: {engine}')
+    print(f'  - Sampler: {sampler}')
+    print(f'  - Bit Generator: {bit_generator}')
+    print(f'  - Variance Reduction: {variance_reduction}')
+    print(f'  - Common Random Numbers: {"Yes" if common_random_numbers else "No"}')
+    print(f'  - Seed: {seed}')
+    print('\n------------------------------------------------------------------------')
+    print('SCENARIOS')
+    print('------------------------------------------------------------------------')
+
+
+def memory_size(text):
+    """Converts a memory size such as '16G' or '512M' to bytes."""
+    units = {'K': 1e3, 'M': 1e6, 'G': 1e9, 'T': 1e12}
+    text = text.strip().upper().removesuffix('B')
+
+    try:
+        if text[-1:] in units:
+            return int(float(text[:-1]) * units[text[-1]])
+
+        return int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Invalid memory size: {text}')
+
+
+def workbook_path():
+    """Returns a new path for the results workbook."""
+    current_loc = Path('.')
+
+    return (
+        current_loc / 'results' / f'simulation_results_{int(time.time())}.xlsx'
+    ).resolve()
+
+
+def parse_args(argv=None):
+    """Parses the command line arguments."""
+    run_options = argparse.ArgumentParser(add_help=False)
+    run_options.add_argument(
+        '-n', '--num-simulations', type=int, default=num_simulations,
+        help='the number of simulations per scenario',
+    )
+    run_options.add_argument(
+        '--engine', choices=engines, default=engine,
+        help='the simulation engine to use',
+    )
+    run_options.add_argument(
+        '--sampler', choices=samplers, default=sampler,
+        help='how event occurrences are sampled',
+    )
+    run_options.add_argument(
+        '--bit-generator', choices=bit_generators, default=bit_generator,
+        help='the bit generator behind the random streams',
+    )
+    run_options.add_argument(
+        '--variance-reduction', choices=variance_reductions,
+        default=variance_reduction,
+        help='how to reduce the variance of the results (period engine only)',
+    )
+    run_options.add_argument(
+        '--common-random-numbers', action='store_true',
+        help='draw every scenario from the same streams to pair their simulations',
+    )
+    run_options.add_argument(
+        '--seed', type=int, default=None,
+        help='the seed for the run; shards of one run must share a seed',
+    )
+    run_options.add_argument(
+        '--workers', type=int, default=1,
+        help='the number of processes to simulate in',
+    )
+
+    parser = argparse.ArgumentParser(
+        prog='python -m simulation', description='RDRHC Monte Carlo Simulations',
+    )
+    subparsers = parser.add_subparsers(dest='command')
+    run_parser = subparsers.add_parser(
+        'run', parents=[run_options], help='run every scenario (default)',
+    )
+    run_parser.add_argument(
+        '--checkpoint-dir', type=Path, default=None,
+        help='save completed blocks of simulations to this directory',
+    )
+    run_parser.add_argument(
+        '--resume', action='store_true',
+        help='continue the run saved in the checkpoint directory',
+    )
+    run_parser.add_argument(
+        '--memory-budget', type=memory_size, default=None,
+        help='the memory the run may use, e.g. 16G; this sets how many blocks '
+        'wait to be aggregated and stops runs that cannot fit, but blocks keep '
+        f'{stream_block_size:,} simulations so the results do not change',
+    )
+
+    shard_parser = subparsers.add_parser(
+        'run-shard', parents=[run_options],
+        help='run one shard of the simulations and save its partial results',
+    )
+    shard_parser.add_argument('shard_index', type=int, help='the shard to run')
+    shard_parser.add_argument('num_shards', type=int, help='the total number of shards')
+    shard_parser.add_argument('output', type=Path, help='the shard file to write')
+
+    merge_parser = subparsers.add_parser(
+        'merge', help='combine shard files into the results workbook',
+    )
+    merge_parser.add_argument('shards', type=Path, nargs='+', help='the shard files')
+
+    # Both commands that write the workbook can bootstrap its intervals
+    for subparser in (run_parser, merge_parser):
+        subparser.add_argument(
+            '--bootstrap-replicates', type=int, default=0,
+            help='bootstrap the confidence intervals with this many replicates '
+            '(0 uses analytic intervals)',
+        )
+
+    risk_parser = subparsers.add_parser(
+        'rare-events',
+        help='estimate the risk of rare high priority shortfalls by importance sampling',
+    )
+    risk_parser.add_argument(
+        '-n', '--num-simulations', type=int, default=10000,
+        help='the number of simulations per scenario',
+    )
+    risk_parser.add_argument(
+        '--seed', type=int, default=None, help='the seed for the run',
+    )
+    risk_parser.add_argument(
+        '--priority', type=int, default=1,
+        help='count shortfalls in shifts with this priority or higher',
+    )
+
+    serve_parser = subparsers.add_parser(
+        'serve', help='answer simulation requests over HTTP on this machine',
+    )
+    serve_parser.add_argument(
+        '--port', type=int, default=8765, help='the port to listen on',
+    )
+
+    # Running without a command runs every scenario
+    argv = sys.argv[1:] if argv is None else list(argv)
+
+    if not argv or argv[0] not in subparsers.choices and argv[0] not in ('-h', '--help'):
+        argv = ['run'] + argv
+
+    args = parser.parse_args(argv)
+
+    if getattr(args, 'engine', None) == 'staff' and args.variance_reduction != 'none':
+        parser.error('--variance-reduction is only available for the period engine')
+
+    if args.command == 'run' and args.resume:
+        checkpoint_dir = args.checkpoint_dir or default_checkpoint_dir
+
+        if not (checkpoint_dir / 'run.json').exists():
+            parser.error(f'no checkpoint to resume in {checkpoint_dir}')
+
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.command == 'serve':
+        print(f'Serving simulations on http://127.0.0.1:{args.port}')
+        asyncio.run(serve(scenarios, port=args.port))
+
+        return
+
+    if args.command == 'rare-events':
+        if args.seed is None:
+            args.seed = np.random.SeedSequence().entropy
+
+        print(
+            f'Estimating shortfall risk with {args.num_simulations} '
+            f'simulations (seed {args.seed})'
+        )
+
+        for scenario_index, scenario in enumerate(scenarios):
+            print()
+            print(estimate_shortfall_risk(
+                scenario, args.num_simulations, args.seed, args.priority,
+                scenario_index,
+            ))
+
+        return
+
+    if args.command == 'merge':
+        details, merged = merge_shards(args.shards)
+        scenarios_by_name = {scenario.name: scenario for scenario in scenarios}
+
+        print_header(
+            details['num_simulations'], details['engine'], details['seed'],
+            details['sampler'], details['bit_generator'],
+            details['variance_reduction'], details['common_random_numbers'],
+        )
+
+        scenario_results = []
+
+        for name, results in merged:
+            print(f'  - {name}')
+            scenario_results.append((scenarios_by_name[name], results))
+    else:
+        checkpoint = None
+
+        if args.command == 'run' and args.resume:
+            checkpoint = Checkpoint.resume(
+                args.checkpoint_dir or default_checkpoint_dir, scenarios
+            )
+
+            # The resumed run keeps the details it was started with
+            args.seed = checkpoint.details['seed']
+            args.num_simulations = checkpoint.details['num_simulations']
+            args.engine = checkpoint.details['engine']
+            args.sampler = checkpoint.details.get('sampler', 'binomial')
+            args.bit_generator = checkpoint.details.get('bit_generator', 'pcg64')
+            args.variance_reduction = checkpoint.details.get(
+                'variance_reduction', 'none'
+            )
+            args.common_random_numbers = checkpoint.details.get(
+                'common_random_numbers', False
+            )
+
+        if args.seed is None:
+            if args.command == 'run-shard':
+                raise SystemExit('A --seed is required so that shards can be merged')
+
+            args.seed = np.random.SeedSequence().entropy
+
+        # Check the run fits in the memory budget before anything starts
+        queue_size = 4
+
+        if args.command == 'run' and args.memory_budget:
+            try:
+                queue_size = queue_size_for_budget(
+                    args.memory_budget, scenarios, args.num_simulations,
+                    args.workers, keep_results=False, engine=args.engine,
+                )
+            except MemoryError as e:
+                raise SystemExit(str(e))
+
+        if args.command == 'run' and args.checkpoint_dir and not checkpoint:
+            checkpoint = Checkpoint.create(
+                args.checkpoint_dir, args.seed, args.num_simulations,
+                args.engine, scenarios, args.sampler, args.bit_generator,
+                args.variance_reduction, args.common_random_numbers,
+            )
+
+        print_header(
+            args.num_simulations, args.engine, args.seed, args.sampler,
+            args.bit_generator, args.variance_reduction, args.common_random_numbers,
+        )
+
+        if args.command == 'run-shard':
+            print(f'  - Shard {args.shard_index + 1} of {args.num_shards}')
+            write_shard(
+                args.output, scenarios, args.num_simulations, args.seed,
+                args.shard_index, args.num_shards, args.engine, args.sampler,
+                args.bit_generator, args.variance_reduction,
+                args.common_random_numbers,
+            )
+            print(f'Writing partial results to file: {args.output.resolve()}')
+
+            return
+
+        # Simulation, aggregation and export of the workbook overlap
+        save_loc = workbook_path()
+        run_pipeline(
+            scenarios, args.num_simulations, args.seed, args.engine, save_loc,
+            checkpoint, queue_size=queue_size,
+            progress=lambda scenario: print(f'  - {scenario.name}'),
+            workers=args.workers, sampler=args.sampler,
+            bit_generator=args.bit_generator,
+            variance_reduction=args.variance_reduction, keep_results=False,
+            bootstrap_replicates=args.bootstrap_replicates,
+            common_random_numbers=args.common_random_numbers,
+        )
+        print(f'Writing results to file: {save_loc}')
+
+        # The checkpoint is no longer needed once the results are saved
+        if checkpoint:
+            checkpoint.remove()
+
+        return
+
+    # Save the workbook results
+    save_loc = workbook_path()
+    print(f'Writing results to file: {save_loc}')
+    write_workbook(
+        scenario_results, save_loc, details['variance_reduction'],
+        args.bootstrap_replicates, details['common_random_numbers'],
+    )
+
+
+if __name__ == '__main__':
+    main()
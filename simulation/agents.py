@@ -0,0 +1,250 @@
+"""Staff-level simulation that tracks the entitlements of each employee."""
+import numpy as np
+
+from .engine import simulate_block
+from .results import SimulationResultSet
+from .samplers import samplers
+from .scenarios import horizons
+
+
+# Employee types in the order used for the ``employee_type`` codes
+employee_types = ('regular', 'bece', 'casual')
+
+# The number of simulations sampled together; banked events hold arrays for
+# every employee and week of these simulations
+staff_block_size = 1000
+
+
+class StaffArrays:
+    """Holds the details of every employee in a scenario as parallel arrays.
+
+        Each attribute is an array with one entry per employee, so that
+        events can be sampled for all staff at once.
+
+        Attributes:
+            fte (np.ndarray): the actual FTE worked by each employee.
+            employee_type (np.ndarray): the index of each employee's type in
+                ``employee_types``.
+            pl_bank (np.ndarray): personal leave days in each bank at the
+                start of the cycle.
+            education_allowance (np.ndarray): education days available to
+                each employee in the cycle.
+            vacation_accrual (np.ndarray): vacation days accrued by each
+                employee per week.
+    """
+    def __init__(
+        self, fte, employee_type, pl_bank, education_allowance, vacation_accrual
+    ):
+        self.fte = np.asarray(fte, dtype=float)
+        self.employee_type = np.asarray(employee_type, dtype=np.int8)
+        self.pl_bank = np.asarray(pl_bank, dtype=float)
+        self.education_allowance = np.asarray(education_allowance, dtype=float)
+        self.vacation_accrual = np.asarray(vacation_accrual, dtype=float)
+
+    @classmethod
+    def from_scenario(cls, scenario):
+        """Builds the staff arrays from a scenario's staff and FTE counts.
+
+            The actual FTE for each employee type is split evenly between
+            the staff of that type.
+        """
+        fte = []
+        employee_type = []
+
+        for code, name in enumerate(employee_types):
+            count = int(getattr(scenario.staff, name))
+
+            if count == 0:
+                continue
+
+            fte.append(np.full(count, getattr(scenario.fte.actual, name) / count))
+            employee_type.append(np.full(count, code, dtype=np.int8))
+
+        fte = np.concatenate(fte)
+        employee_type = np.concatenate(employee_type)
+
+        def per_person(bank):
+            """Looks up an entitlement for each employee by their type."""
+            values = np.array([
+                scenario.entitlements[bank].get(name, 0) for name in employee_types
+            ], dtype=float)
+
+            return values[employee_type]
+
+        return cls(
+            fte=fte,
+            employee_type=employee_type,
+            pl_bank=per_person('pl'),
+            education_allowance=per_person('education'),
+            vacation_accrual=(
+                per_person('vacation') * fte / scenario.fte_definitions.weeks
+            ),
+        )
+
+    def __len__(self):
+        return len(self.fte)
+
+    def bank_limits(self, bank, weeks):
+        """Returns the days each employee can have used from a bank by each
+            week, as an array of shape (staff, weeks).
+
+            PL and education banks are available in full from the start of
+            the cycle, while vacation can only be used once it is accrued.
+
+            Attributes:
+                bank (str): the name of the bank (see ``Event.bank``).
+                weeks (int): the number of weeks in the simulation.
+        """
+        if bank == 'pl':
+            days = self.pl_bank
+        elif bank == 'education':
+            days = self.education_allowance
+        elif bank == 'vacation':
+            return np.floor(self.vacation_accrual[:, None] * np.arange(1, weeks + 1))
+        else:
+            raise ValueError(f'Unknown bank: {bank}')
+
+        return np.repeat(np.floor(days)[:, None], weeks, axis=1)
+
+
+def _sample_banked(gen, size, work_probability, rates, limits):
+    """Samples an event for each employee and applies their bank limits.
+
+        Each employee's weekly occurrences are drawn from the total weekly
+        rate and capped by their bank. The capped occurrences for all staff
+        are then split across the notice periods in proportion to the
+        period rates, which needs one draw per employee and week rather
+        than one per notice period.
+
+        The rates are of shape (weeks, notice periods), or (simulations,
+        weeks, notice periods) when each simulation draws its own.
+
+        The limits are the days each employee can have used by each week,
+        of shape (staff, weeks) (see ``StaffArrays.bank_limits``).
+
+        Returns the event occurrences summed across staff, as an array of
+        shape (simulations, weeks, notice periods).
+    """
+    eligible = limits[:, -1] >= 1
+    weeks, periods = rates.shape[-2:]
+
+    if not eligible.any():
+        return np.zeros((size, weeks, periods), dtype=np.int64)
+
+    week_rates = rates.sum(axis=-1)
+    probability = work_probability[eligible, None] * week_rates[..., np.newaxis, :]
+    sampled = gen.binomial(5, probability, size=(size,) + probability.shape[-2:])
+
+    # Use each employee's bank in week order. Occurrences past the limit of
+    # their week are denied, so the days used trail the days sampled by the
+    # largest excess seen so far; with a fixed limit this is the running
+    # total capped at the limit. Nobody can have more than five days a
+    # week, so the running totals are kept in the smallest type that holds
+    # them, which is the largest working memory of the staff engine
+    days = np.min_scalar_type(-5 * weeks)
+    limits = np.minimum(limits[eligible], 5 * weeks).astype(days)
+    sampled = np.cumsum(sampled, axis=2, dtype=days)
+    denied = np.maximum.accumulate(np.maximum(sampled - limits, 0), axis=2)
+    capped = np.diff(sampled - denied, axis=2, prepend=0).sum(axis=1)
+
+    # Split the weekly totals across the notice periods
+    period_share = np.divide(
+        rates, week_rates[..., None],
+        out=np.full_like(rates, 1 / periods), where=week_rates[..., None] > 0,
+    )
+
+    return gen.multinomial(capped, period_share)
+
+
+def _sample_pooled(gen, size, groups, group_sizes, rates, sample):
+    """Samples an event for staff grouped by their FTE.
+
+        Employees with the same FTE share the same event probability, so the
+        sum of their occurrences is a single draw per group from ``sample``
+        (see ``samplers.samplers``). Rates drawn per simulation have the
+        simulations as their first axis.
+    """
+    weeks, periods = rates.shape[-2:]
+    outcomes = np.zeros((size, weeks, periods), dtype=np.int64)
+    draw_size = size
+
+    # Simulations come ahead of the groups when they have their own rates
+    if rates.ndim == 3:
+        rates = rates[:, np.newaxis]
+        draw_size = None
+
+    # Skip notice periods that can never occur for this event
+    active = rates.reshape(-1, periods).any(axis=0)
+    probability = groups[:, None, None] * rates[..., active]
+    trials = group_sizes[:, None, None] * 5
+
+    outcomes[..., active] = sample(gen, trials, probability, draw_size).sum(axis=-3)
+
+    return outcomes
+
+
+def simulate_staff(
+    weeks, scenario, num_simulations, block_size=staff_block_size, gen=None,
+    sampler='binomial',
+    variance_reduction='none',
+):
+    """Runs simulations that track each employee individually.
+
+        Events linked to a bank (see ``Event.bank``) are sampled per
+        employee so that PL, education and vacation limits apply to each
+        person rather than the pooled cycle maximum. Other events are
+        sampled per group of employees with the same FTE using the selected
+        sampler. Simulations are run in blocks to bound memory use.
+
+        Each employee's FTE is treated as the chance they work any weekday,
+        so the expected capacity matches the pooled simulation.
+
+        Attributes:
+            weeks (int): the number of weeks in each simulation
+            scenario (ScenarioDetails): the scenario to simulate
+            num_simulations (int): the number of simulations to run
+            block_size (int): the number of simulations sampled together
+            gen (np.random.Generator): the generator to draw from
+            sampler (str): the name of the sampler in ``samplers.samplers``
+                used for events without a bank
+            variance_reduction (str): must be 'none'; variance reduction is
+                only available in ``engine.simulate_period``
+
+        Returns a ``SimulationResultSet``.
+    """
+    if variance_reduction != 'none':
+        raise ValueError('Variance reduction is only available for the period engine')
+
+    if gen is None:
+        gen = np.random.Generator(np.random.PCG64())
+
+    staff = StaffArrays.from_scenario(scenario)
+    shift_capacity = staff.fte.sum() * 5
+    work_probability = np.minimum(staff.fte, 1)
+    groups, group_index = np.unique(work_probability, return_inverse=True)
+    group_sizes = np.bincount(group_index)
+
+    def sample_event(event_index, rates, size):
+        event = scenario.events[event_index]
+
+        if event.bank:
+            limits = staff.bank_limits(event.bank, weeks)
+
+            return _sample_banked(gen, size, work_probability, rates, limits)
+
+        # Events without a bank are drawn per group and keep the pooled
+        # cycle max
+        return _sample_pooled(gen, size, groups, group_sizes, rates, samplers[sampler])
+
+    results = SimulationResultSet.for_scenario(
+        scenario, num_simulations, horizons, weeks
+    )
+
+    for start in range(0, num_simulations, block_size):
+        block = results.block(start, min(start + block_size, num_simulations))
+        simulate_block(
+            block, weeks, scenario, shift_capacity, sample_event, gen,
+            bank_limits=True,
+        )
+
+    return results
@@ -0,0 +1,162 @@
+"""Policies for assigning the weekly capacity to the shifts.
+
+    Each policy takes the capacity of every simulation and week and returns
+    the shifts of each group it covers, as an array of shape (shifts,
+    simulations, weeks), along with the capacity it leaves unused. Every
+    policy works on the whole (simulation, week) array with a fixed number
+    of array operations per shift group, so the choice of policy does not
+    change how long a run takes.
+"""
+import numpy as np
+
+
+def _priority_tiers(shifts):
+    """Returns the indices of the shifts of each priority, highest first."""
+    tiers = {}
+
+    for i, shift in enumerate(shifts):
+        tiers.setdefault(shift.priority, []).append(i)
+
+    return [tiers[priority] for priority in sorted(tiers)]
+
+
+def share_capacity(capacity, needs, weights):
+    """Splits the capacity between needs in proportion to their weights.
+
+        Each need claims a share in proportion to its weight times the
+        shifts it needs. A need never gets more than it asked for; what it
+        would have had beyond that is shared again among the others. Each
+        need therefore gets its shifts times the smaller of 1 and a common
+        level times its weight, and is filled once the level reaches 1 over
+        its weight. The capacity given out at each of those levels does not
+        depend on the capacity, so the level of every simulation and week is
+        found with one search of them.
+
+        Attributes:
+            capacity (np.ndarray): the capacity of each simulation and week.
+            needs (list): the shifts each group needs.
+            weights (list): the weight of each group.
+
+        Returns the shifts given to each group, of shape (groups,
+        simulations, weeks), and the capacity left over.
+    """
+    needs = np.asarray(needs, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    left = np.maximum(capacity, 0)
+
+    # The needs in the order they are filled, and the capacity given out
+    # when each is filled
+    order = np.argsort(-weights, kind='stable')
+    fill_levels = 1 / weights[order]
+    fill_totals = np.minimum(fill_levels[:, np.newaxis] * weights, 1) @ needs
+
+    # With the first ``filled`` needs met, the rest share what is left by
+    # their claims
+    filled_needs = np.concatenate([[0], np.cumsum(needs[order])])
+    open_claims = np.concatenate([
+        np.cumsum((needs * weights)[order][::-1])[::-1], [0],
+    ])
+    filled = np.searchsorted(fill_totals, left, side='right')
+    claims = open_claims[filled]
+    level = np.divide(
+        left - filled_needs[filled], claims,
+        out=np.full(left.shape, np.inf), where=claims > 0,
+    )
+
+    given = needs[:, np.newaxis, np.newaxis] * np.minimum(
+        level * weights[:, np.newaxis, np.newaxis], 1
+    )
+
+    return given, np.maximum(left - given.sum(axis=0), 0)
+
+
+def allocate_strict(capacity, shifts):
+    """Covers whole shift groups in priority order.
+
+        A group is only covered if all of its shifts can be. Once a group
+        cannot be covered, the capacity is treated as used up and every
+        later group is uncovered too.
+    """
+    covered = np.zeros((len(shifts),) + capacity.shape)
+
+    for i, shift in enumerate(shifts):
+        whole = capacity >= shift.number
+        covered[i] = np.where(whole, shift.number, 0)
+        capacity = np.where(whole, capacity - shift.number, 0)
+
+    return covered, capacity
+
+
+def allocate_partial(capacity, shifts):
+    """Covers shift groups in priority order, partly if need be.
+
+        A group that cannot be covered in full takes what is left, and any
+        later groups are uncovered.
+    """
+    covered = np.zeros((len(shifts),) + capacity.shape)
+    capacity = np.maximum(capacity, 0)
+
+    for i, shift in enumerate(shifts):
+        covered[i] = np.minimum(capacity, shift.number)
+        capacity = capacity - covered[i]
+
+    return covered, capacity
+
+
+def allocate_proportional(capacity, shifts):
+    """Covers priorities in order, sharing a priority's capacity by weight.
+
+        When a priority cannot be covered in full, its groups share what is
+        left in proportion to their weight times their shifts (see
+        ``share_capacity``), so they are all short rather than some of them
+        being uncovered.
+    """
+    covered = np.zeros((len(shifts),) + capacity.shape)
+
+    for tier in _priority_tiers(shifts):
+        covered[tier], capacity = share_capacity(
+            capacity,
+            [shifts[i].number for i in tier],
+            [shifts[i].weight for i in tier],
+        )
+
+    return covered, capacity
+
+
+def allocate_minimum_staffing(capacity, shifts):
+    """Covers every group's minimum staffing before the rest of any group.
+
+        The minimums (``Shift.minimum``) are covered first, in priority
+        order with each priority shared by weight, and the shifts above the
+        minimums are then covered the same way.
+    """
+    covered = np.zeros((len(shifts),) + capacity.shape)
+    tiers = _priority_tiers(shifts)
+
+    for needs in (
+        [shift.minimum for shift in shifts],
+        [shift.number - shift.minimum for shift in shifts],
+    ):
+        for tier in tiers:
+            given, capacity = share_capacity(
+                capacity,
+                [needs[i] for i in tier],
+                [shifts[i].weight for i in tier],
+            )
+            covered[tier] += given
+
+    return covered, capacity
+
+
+# The allocation policies a scenario can use (``allocation_policy``)
+allocation_policies = {
+    'strict': allocate_strict,
+    'partial': allocate_partial,
+    'proportional': allocate_proportional,
+    'minimum_staffing': allocate_minimum_staffing,
+}
+
+# The policies that share a priority's capacity between its groups, which
+# needs working arrays for every group of the priority (see
+# ``share_capacity``)
+sharing_policies = ('proportional', 'minimum_staffing')
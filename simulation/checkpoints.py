@@ -0,0 +1,112 @@
+"""Saves completed blocks of simulations so interrupted runs can resume.
+
+    Each stream block is saved to its own file as soon as it finishes. The
+    random stream for a block only depends on the run seed, the scenario and
+    the block index (see ``runner.block_generator``), so the seed stored
+    with the checkpoint is all that is needed to continue the remaining
+    blocks exactly as an uninterrupted run would.
+"""
+import json
+import os
+from pathlib import Path
+
+from .results import SimulationResultSet
+
+
+class Checkpoint:
+    """A directory of completed simulation blocks for one run.
+
+        Attributes:
+            directory (Path): the directory holding the checkpoint files.
+            details (dict): the seed, number of simulations, engine, sampler,
+                bit generator, variance reduction, common random numbers and
+                scenario names of the run.
+    """
+    def __init__(self, directory, details):
+        self.directory = Path(directory)
+        self.details = details
+
+    @classmethod
+    def create(
+        cls, directory, seed, num_simulations, engine, scenarios, sampler='binomial',
+        bit_generator='pcg64', variance_reduction='none', common_random_numbers=False,
+    ):
+        """Starts a new checkpoint for a run."""
+        directory = Path(directory)
+
+        if (directory / 'run.json').exists():
+            raise FileExistsError(
+                f'A checkpoint already exists in {directory}; resume it or '
+                'choose another directory'
+            )
+
+        directory.mkdir(parents=True, exist_ok=True)
+        details = {
+            'seed': seed,
+            'num_simulations': num_simulations,
+            'engine': engine,
+            'sampler': sampler,
+            'bit_generator': bit_generator,
+            'variance_reduction': variance_reduction,
+            'common_random_numbers': common_random_numbers,
+            'scenarios': [scenario.name for scenario in scenarios],
+        }
+        (directory / 'run.json').write_text(json.dumps(details))
+
+        return cls(directory, details)
+
+    @classmethod
+    def resume(cls, directory, scenarios):
+        """Opens an existing checkpoint to continue its run."""
+        directory = Path(directory)
+
+        try:
+            details = json.loads((directory / 'run.json').read_text())
+        except FileNotFoundError:
+            raise FileNotFoundError(f'No checkpoint to resume in {directory}')
+
+        if details['scenarios'] != [scenario.name for scenario in scenarios]:
+            raise ValueError('The checkpoint was made for different scenarios')
+
+        return cls(directory, details)
+
+    def _block_path(self, scenario_index, block_index):
+        return self.directory / f'scenario_{scenario_index}_block_{block_index}.npz'
+
+    def has_block(self, scenario_index, block_index):
+        """Returns whether a block has already been completed."""
+        return self._block_path(scenario_index, block_index).exists()
+
+    def load_block(self, scenario_index, block_index):
+        """Returns the saved results for a completed block."""
+        return SimulationResultSet.load(self._block_path(scenario_index, block_index))
+
+    def save_block(self, scenario_index, block_index, results):
+        """Saves the results of a completed block.
+
+            The file is written under a temporary name first, so a run that
+            is stopped part way through a save never leaves a partial block.
+        """
+        path = self._block_path(scenario_index, block_index)
+        temp_path = path.with_suffix('.tmp')
+
+        with open(temp_path, 'wb') as file:
+            results.save(file)
+
+        os.replace(temp_path, path)
+
+    def remove(self):
+        """Deletes the checkpoint once the run has finished.
+
+            Only the files the checkpoint wrote are deleted, and the
+            directory itself only if nothing else is left in it, so a
+            checkpoint kept alongside other files never takes them with it.
+        """
+        for path in self.directory.glob('scenario_*_block_*.*'):
+            if path.suffix in ('.npz', '.tmp'):
+                path.unlink()
+
+        (self.directory / 'run.json').unlink(missing_ok=True)
+
+        if not any(self.directory.iterdir()):
+            self.directory.rmdir()
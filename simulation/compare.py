@@ -0,0 +1,149 @@
+"""Compares the results of every pair of scenarios.
+
+    Each metric of one scenario is compared with the same metric of the
+    other: the difference in their means with a confidence interval, and the
+    probability that a cycle of the first scenario is better than a cycle of
+    the second. All of the metrics shared by a pair are compared at once.
+
+    When the run used common random numbers, the simulations of different
+    scenarios are paired (they drew from the same streams), so the
+    differences are taken simulation by simulation. Pairing removes the
+    variation the scenarios share, which gives much tighter intervals than
+    comparing independent runs.
+"""
+from itertools import combinations
+from statistics import NormalDist
+
+import numpy as np
+
+
+# Results where more is better; fewer is better for every other result
+higher_is_better = ('Excess Shifts', 'Actual FTE')
+
+
+def comparison_values(simulations_stats):
+    """Returns the values compared between scenarios.
+
+        Only the values are kept (as float32) so that every scenario's can
+        be held until the comparison is made.
+
+        Returns a dictionary of (result, name) pairs mapped to the value of
+        each simulation.
+    """
+    return {
+        (result, name): stats.values.astype(np.float32)
+        for result, name, stats in simulations_stats['metrics']
+    }
+
+
+def _probability_better(values_a, values_b, higher):
+    """Returns the chance a simulation of A is better than one of B.
+
+        Each metric's values for B are sorted and offset so that all of the
+        metrics share one sorted array, and the values of A are ranked in it
+        with a single search. Ties count as half.
+    """
+    num_metrics, num_b = values_b.shape
+    lowest = min(values_a.min(), values_b.min())
+    span = max(values_a.max(), values_b.max()) - lowest + 1
+    offsets = np.arange(num_metrics)[:, np.newaxis] * span
+
+    ranked = (np.sort(values_b, axis=1) - lowest + offsets).ravel()
+    queries = values_a - lowest + offsets
+    start = np.arange(num_metrics)[:, np.newaxis] * num_b
+
+    below = np.searchsorted(ranked, queries, side='left') - start
+    at_or_below = np.searchsorted(ranked, queries, side='right') - start
+    ties = (at_or_below - below).mean(axis=1) / num_b
+    a_higher = below.mean(axis=1) / num_b
+
+    return np.where(higher, a_higher, 1 - a_higher - ties) + ties / 2
+
+
+def compare_pair(values_a, values_b, higher, paired=False, confidence=0.95):
+    """Compares two scenarios' values for many metrics at once.
+
+        Attributes:
+            values_a (np.ndarray): the first scenario's values, of shape
+                (metrics, simulations).
+            values_b (np.ndarray): the second scenario's values.
+            higher (np.ndarray): whether more is better for each metric.
+            paired (bool): whether the simulations of the two scenarios are
+                paired (and so must be the same number).
+            confidence (flt): the confidence level of the intervals.
+
+        Returns a dictionary of arrays with one entry per metric: the means
+        of A and B, the difference (A - B) with its lower and upper
+        confidence limits, and the probability that A is better.
+    """
+    values_a = np.asarray(values_a, dtype=float)
+    values_b = np.asarray(values_b, dtype=float)
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+
+    mean_a = values_a.mean(axis=1)
+    mean_b = values_b.mean(axis=1)
+
+    if paired:
+        differences = values_a - values_b
+        standard_error = differences.std(axis=1, ddof=1) / np.sqrt(differences.shape[1])
+        better = np.where(higher[:, np.newaxis], differences > 0, differences < 0)
+        probability_better = better.mean(axis=1) + (differences == 0).mean(axis=1) / 2
+    else:
+        standard_error = np.sqrt(
+            values_a.var(axis=1, ddof=1) / values_a.shape[1]
+            + values_b.var(axis=1, ddof=1) / values_b.shape[1]
+        )
+        probability_better = _probability_better(values_a, values_b, higher)
+
+    difference = mean_a - mean_b
+
+    return {
+        'mean_a': mean_a,
+        'mean_b': mean_b,
+        'difference': difference,
+        'lower': difference - z * standard_error,
+        'upper': difference + z * standard_error,
+        'probability_better': probability_better,
+    }
+
+
+def compare_scenarios(scenario_values, paired=False, confidence=0.95):
+    """Compares every pair of scenarios.
+
+        Attributes:
+            scenario_values (list): (scenario name, values) pairs, with the
+                values from ``comparison_values``.
+            paired (bool): whether the run used common random numbers.
+            confidence (flt): the confidence level of the intervals.
+
+        Returns a list of rows (scenario A, scenario B, result, name, mean
+        of A, mean of B, difference, lower CI, upper CI, probability A is
+        better) for the metrics each pair has in common.
+    """
+    rows = []
+
+    for (name_a, values_a), (name_b, values_b) in combinations(scenario_values, 2):
+        metrics = [metric for metric in values_a if metric in values_b]
+
+        if not metrics:
+            continue
+
+        stacked_a = np.stack([values_a[metric] for metric in metrics])
+        stacked_b = np.stack([values_b[metric] for metric in metrics])
+        higher = np.array([result in higher_is_better for result, _ in metrics])
+        comparison = compare_pair(
+            stacked_a, stacked_b, higher,
+            paired and stacked_a.shape == stacked_b.shape, confidence,
+        )
+
+        for i, (result, name) in enumerate(metrics):
+            rows.append((
+                name_a, name_b, result, name,
+                *(
+                    round(float(comparison[key][i]), 2)
+                    for key in ('mean_a', 'mean_b', 'difference', 'lower', 'upper')
+                ),
+                round(float(comparison['probability_better'][i]), 4),
+            ))
+
+    return rows
@@ -0,0 +1,437 @@
+"""Vectorized simulation of a scenario using the pooled staff capacity."""
+import numpy as np
+
+from .allocation import allocation_policies
+from .results import SimulationResultSet
+from .samplers import (
+    binomial_inverse_cdf, samplers, uniform_designs, variance_reductions,
+)
+from .scenarios import horizons
+
+
+def apply_cycle_max(outcomes, cycle_max):
+    """Drops event occurrences once the cycle maximum has been reached.
+
+        A week is only evaluated if the running total before it is below
+        the cycle maximum, so the final week may take the total past it.
+
+        Attributes:
+            outcomes (np.ndarray): event occurrences of shape
+                (simulations, weeks, horizons).
+            cycle_max (flt): the maximum number of occurrences per cycle.
+    """
+    week_totals = outcomes.sum(axis=2)
+    prior_totals = np.cumsum(week_totals, axis=1) - week_totals
+
+    return outcomes * (prior_totals < cycle_max)[..., np.newaxis]
+
+
+def shortfall_runs(short):
+    """Summarises when each simulation had uncovered shifts.
+
+        Attributes:
+            short (np.ndarray): whether each week had an uncovered shift, of
+                shape (simulations, weeks).
+
+        Returns the number of short weeks, the longest run of consecutive
+        short weeks and the first short week (counted from 1, or 0 if there
+        were none) of each simulation.
+    """
+    short_weeks = np.zeros(len(short), dtype=np.int64)
+    longest_run = np.zeros(len(short), dtype=np.int64)
+    first_week = np.zeros(len(short), dtype=np.int64)
+
+    # Only the simulations with a shortfall need their weeks scanned
+    rows = np.flatnonzero(short.any(axis=1))
+    short = short[rows]
+    counts = np.cumsum(short, axis=1)
+
+    # The count at the last covered week; subtracting it restarts the count
+    # after every covered week, leaving the length of the current run
+    restarts = np.maximum.accumulate(np.where(short, 0, counts), axis=1)
+    short_weeks[rows] = counts[:, -1]
+    longest_run[rows] = (counts - restarts).max(axis=1, initial=0)
+    first_week[rows] = short.argmax(axis=1) + 1
+
+    return short_weeks, longest_run, first_week
+
+
+def respond_to_shortfalls(remaining_capacity, scenario, available, results):
+    """Covers the weekly shortfalls with picked up shifts, then overtime.
+
+        A shortfall is the capacity needed to cover every shift, rounded up
+        to whole shifts. It is covered from the available extra shifts
+        first and then from overtime (see ``CapacityResponse``).
+
+        Attributes:
+            remaining_capacity (np.ndarray): the capacity left after events,
+                of shape (simulations, weeks).
+            scenario (ScenarioDetails): the scenario, with a
+                ``capacity_response``.
+            available (np.ndarray): the extra shifts available to pick up
+                in each simulation and week.
+            results (SimulationResultSet): the block of results to record
+                the picked up and overtime shifts in.
+
+        Returns the capacity including the extra shifts.
+    """
+    demand = sum(shift.number for shift in scenario.shifts)
+    shortfall = np.ceil(np.maximum(demand - remaining_capacity, 0) - 1e-9)
+    pickup = np.minimum(shortfall, available)
+    overtime = np.minimum(shortfall - pickup, scenario.capacity_response.overtime)
+
+    results.pickup_shifts[:] = pickup.sum(axis=1)
+    results.overtime_shifts[:] = overtime.sum(axis=1)
+
+    return remaining_capacity + pickup + overtime
+
+
+def allocate_shifts(remaining_capacity, shifts, results, policy='strict'):
+    """Assigns the weekly capacity to shifts with an allocation policy.
+
+        Attributes:
+            remaining_capacity (np.ndarray): the capacity left after events,
+                of shape (simulations, weeks).
+            shifts (list): the scenario shifts, sorted by priority.
+            results (SimulationResultSet): the block of results to record
+                uncovered and excess shifts, shortfalls (and the weekly
+                sketch) in.
+            policy (str): the name of the policy in
+                ``allocation.allocation_policies``.
+    """
+    if policy not in allocation_policies:
+        raise ValueError(f'Unknown allocation policy: {policy}')
+
+    covered, unused = allocation_policies[policy](remaining_capacity, shifts)
+    numbers = np.array([shift.number for shift in shifts], dtype=float)
+    uncovered = numbers[:, np.newaxis, np.newaxis] - covered
+
+    # A shift group is short in a week unless it is covered in full
+    short_groups = uncovered > 1e-9
+    results.uncovered_shifts[:] = uncovered.sum(axis=2)
+
+    # Weeks with an uncovered shift at the current priority or higher
+    short = np.zeros(remaining_capacity.shape, dtype=bool)
+
+    for i, shift in enumerate(shifts):
+        short |= short_groups[i]
+
+        # Record the shortfalls once every shift of a priority is allocated
+        if i + 1 == len(shifts) or shifts[i + 1].priority != shift.priority:
+            row = results.priorities.index(shift.priority)
+            (
+                results.short_weeks[row],
+                results.longest_short_run[row],
+                results.first_short_week[row],
+            ) = shortfall_runs(short)
+
+    if results.weekly is not None:
+        results.weekly.add(remaining_capacity, uncovered)
+
+    # Record any remaining capacity
+    results.excess_shifts[:] = np.sum(np.maximum(unused, 0), axis=1)
+
+
+def draw_shocks(scenario, gen, size, weeks):
+    """Draws the weekly multipliers of each of a scenario's shocks.
+
+        Returns a dictionary of shock names mapped to arrays of shape
+        (simulations, weeks). Scenarios without shocks draw nothing.
+    """
+    return {
+        shock.name: shock.multipliers(gen, size, weeks) for shock in scenario.shocks
+    }
+
+
+def simulation_event_rates(event, weeks, gen, size, shocks):
+    """Returns an event's weekly rates for a block of simulations.
+
+        Events with uncertain rates or a shock have their own rates in each
+        simulation, of shape (simulations, weeks, notice periods); the rates
+        of other events are shared, of shape (weeks, notice periods).
+
+        Attributes:
+            event (Event): the event to find the rates of.
+            weeks (int): the number of weeks in each simulation.
+            gen (np.random.Generator): the generator for uncertain rates.
+            size (int): the number of simulations in the block.
+            shocks (dict): the multipliers from ``draw_shocks``.
+    """
+    return event.weekly_rates(
+        weeks,
+        event.simulation_rates(gen, size) if event.uncertain else None,
+        shocks[event.shock.name] if event.shock else None,
+    )
+
+
+def schedule_follow_ons(outcomes, follow_on, gen, scheduled):
+    """Adds the follow-on occurrences caused by an event to a buffer.
+
+        Only the (simulation, week) cells with a trigger are visited: each
+        cell's triggers are split across the delays with one multinomial
+        draw, and the follow-on occurrences are scatter-added into the later
+        weeks. Follow-ons that would start after the last week are dropped.
+
+        Attributes:
+            outcomes (np.ndarray): the triggering event's occurrences of
+                shape (simulations, weeks, horizons).
+            follow_on (FollowOn): the follow-on to schedule.
+            gen (np.random.Generator): the generator for random delays and
+                fractional occurrences.
+            scheduled (np.ndarray): the follow-on event's buffer of
+                occurrences, of the same shape as ``outcomes``.
+    """
+    weeks = outcomes.shape[1]
+    triggers = outcomes.sum(axis=2)
+    sims, trigger_weeks = np.nonzero(triggers)
+    counts = triggers[sims, trigger_weeks]
+
+    if len(follow_on.delays) > 1:
+        by_delay = gen.multinomial(counts, follow_on.delays)
+        cells, delays = np.nonzero(by_delay)
+        sims, trigger_weeks = sims[cells], trigger_weeks[cells]
+        counts = by_delay[cells, delays]
+    else:
+        delays = np.zeros(len(counts), dtype=np.int64)
+
+    # The notice period of each number of weeks after a trigger
+    notice = delays[:, np.newaxis] + np.arange(follow_on.duration)
+    notice_periods = np.searchsorted(
+        horizons, np.arange(notice.max(initial=0) + 1), side='right'
+    ) - 1
+
+    # Every week of every follow-on is added with a single bincount
+    week = trigger_weeks[:, np.newaxis] + notice
+    kept = week < weeks
+    index = (
+        (sims[:, np.newaxis] * weeks + week) * len(horizons) + notice_periods[notice]
+    )[kept]
+
+    scheduled += np.bincount(
+        index, weights=follow_on.week_counts(counts, gen)[kept],
+        minlength=scheduled.size,
+    ).reshape(scheduled.shape).astype(np.int64)
+
+
+def add_follow_ons(event, outcomes, gen, scheduled):
+    """Adds the occurrences caused by earlier events and schedules new ones.
+
+        Attributes:
+            event (Event): the event being simulated.
+            outcomes (np.ndarray): its sampled occurrences of shape
+                (simulations, weeks, horizons).
+            gen (np.random.Generator): the generator for random delays.
+            scheduled (dict): event names mapped to the occurrences caused
+                so far; events must be simulated in ``event_order``.
+
+        Returns the event's occurrences including those caused by others.
+    """
+    if event.name in scheduled:
+        outcomes = outcomes + scheduled.pop(event.name)
+
+    for follow_on in event.follow_ons:
+        buffer = scheduled.setdefault(
+            follow_on.event, np.zeros(outcomes.shape, dtype=np.int64)
+        )
+        schedule_follow_ons(outcomes, follow_on, gen, buffer)
+
+    return outcomes
+
+
+def expected_event_counts(weeks, scenario):
+    """Returns the expected occurrences of each event per simulation.
+
+        These are known exactly from the rates, which makes the event counts
+        useful control variates. Events with a cycle maximum, uncertain
+        rates or a shock, and events caused by others, have no simple
+        expected count and are given NaN.
+    """
+    trials = int(scenario.fte.actual.total * 5)
+    caused = {
+        follow_on.event for event in scenario.events for follow_on in event.follow_ons
+    }
+
+    return np.array([
+        np.nan if event.cycle_max or event.uncertain or event.shock
+        or event.name in caused
+        else trials * event.weekly_rates(weeks).sum()
+        for event in scenario.events
+    ])
+
+
+def record_event(block, event_index, event, outcomes, gen, scheduled, cycle_max=True):
+    """Records an event's sampled occurrences in a block of results.
+
+        The cycle maximum is applied and the event's follow-ons are added
+        and scheduled (see ``add_follow_ons``) before the occurrences are
+        counted.
+
+        Attributes:
+            block (SimulationResultSet): the block of results.
+            event_index (int): the position of the event in the scenario.
+            event (Event): the event.
+            outcomes (np.ndarray): the sampled occurrences of shape
+                (simulations, weeks, horizons).
+            gen (np.random.Generator): the generator for follow-ons.
+            scheduled (dict): the follow-on occurrences caused so far.
+            cycle_max (bool): whether to apply the event's cycle maximum.
+
+        Returns the shifts the event loses each week, of shape
+        (simulations, weeks).
+    """
+    if cycle_max and event.cycle_max:
+        outcomes = apply_cycle_max(outcomes, event.cycle_max)
+
+    outcomes = add_follow_ons(event, outcomes, gen, scheduled)
+    block.events[event_index] = outcomes.sum(axis=1).T
+
+    return outcomes.sum(axis=2) * event.losses
+
+
+def allocate_capacity(block, scenario, remaining_capacity, available=None):
+    """Covers a block's shifts from the capacity left after its events.
+
+        The shift changes are found from the recorded events, then any
+        shortfalls are covered with the available extra shifts and overtime
+        (see ``respond_to_shortfalls``) and the capacity is assigned to the
+        shifts with the scenario's allocation policy.
+
+        Attributes:
+            block (SimulationResultSet): the block of results, with its
+                events recorded.
+            scenario (ScenarioDetails): the scenario being simulated.
+            remaining_capacity (np.ndarray): the capacity left after events,
+                of shape (simulations, weeks).
+            available (np.ndarray): the extra shifts available in each
+                simulation and week, if the scenario has a capacity
+                response.
+    """
+    changes = np.array([event.changes for event in scenario.events])
+    block.shift_changes[:] = np.tensordot(changes, block.events, axes=1)
+
+    if available is not None:
+        remaining_capacity = respond_to_shortfalls(
+            remaining_capacity, scenario, available, block
+        )
+
+    block.actual_fte[:] = np.mean(remaining_capacity / 5, axis=1)
+
+    allocate_shifts(
+        remaining_capacity, scenario.shifts, block, scenario.allocation_policy
+    )
+
+
+def simulate_block(
+    block, weeks, scenario, shift_capacity, sample, gen, allocate=allocate_capacity,
+    bank_limits=False,
+):
+    """Simulates the events of a block of simulations and covers its shifts.
+
+        This is the pipeline every engine runs for a block: the shocks and
+        each event's rates are drawn, the event is sampled, its cycle
+        maximum and follow-ons are applied and its losses are totalled, and
+        the capacity left is then allocated. Engines differ only in how
+        they sample an event.
+
+        Attributes:
+            block (SimulationResultSet): the block of results to fill.
+            weeks (int): the number of weeks in each simulation.
+            scenario (ScenarioDetails): the scenario to simulate.
+            shift_capacity (flt): the weekly shift capacity before events.
+            sample (callable): draws an event's occurrences; called with the
+                event index, its rates (see ``simulation_event_rates``) and
+                the number of simulations, and returns an array of shape
+                (simulations, weeks, horizons).
+            gen (np.random.Generator): the generator to draw from.
+            allocate (callable): covers the shifts; called with the block,
+                the scenario, the capacity left after events and the
+                available extra shifts (see ``allocate_capacity``).
+            bank_limits (bool): whether ``sample`` limits events with a bank
+                by each employee's bank, which replaces their cycle maximum.
+    """
+    size = len(block)
+
+    # Number of shifts lost each week of each simulation
+    week_shift_losses = np.zeros((size, weeks))
+    shocks = draw_shocks(scenario, gen, size, weeks)
+    scheduled = {}
+
+    for i in scenario.event_order:
+        event = scenario.events[i]
+        rates = simulation_event_rates(event, weeks, gen, size, shocks)
+        week_shift_losses += record_event(
+            block, i, event, sample(i, rates, size), gen, scheduled,
+            cycle_max=not (bank_limits and event.bank),
+        )
+
+    # The starting capacity will be the normal weekly capacity minus the
+    # week event total, plus any extra shifts worked to cover shortfalls
+    response = scenario.capacity_response
+    available = None
+
+    if response:
+        available = response.available(gen, scenario.staff, size, weeks)
+
+    allocate(block, scenario, shift_capacity - week_shift_losses, available)
+
+
+def simulate_period(
+    weeks, scenario, num_simulations, block_size=10000, gen=None, sampler='binomial',
+    variance_reduction='none',
+):
+    """Runs simulations over the defined period.
+
+        All weeks of a block of simulations are sampled together; event
+        rates are broadcast as a (weeks x horizons) array so seasonal
+        profiles apply per week. Events with uncertain rates draw one set of
+        rates per simulation, and events linked to a shock are scaled by its
+        multiplier for each week; either gives a (simulations x weeks x
+        horizons) array that is sampled the same way. Occurrences that
+        cause follow-on events are scheduled into the later weeks of the
+        events they cause, which are simulated after them.
+
+        Attributes:
+            weeks (int): the number of weeks in each simulation
+            scenario (ScenarioDetails): the scenario to simulate
+            num_simulations (int): the number of simulations to run
+            block_size (int): the number of simulations sampled together
+            gen (np.random.Generator): the generator to draw from
+            sampler (str): the name of the sampler in ``samplers.samplers``
+            variance_reduction (str): one of ``samplers.variance_reductions``;
+                antithetic and stratified sampling draw every event by
+                inverting the binomial distribution instead of ``sampler``
+    """
+    if variance_reduction not in variance_reductions:
+        raise ValueError(f'Unknown variance reduction: {variance_reduction}')
+
+    if gen is None:
+        gen = np.random.Generator(np.random.PCG64())
+
+    # The employee capacity for shifts (or how many shifts the staff can
+    # cover in this scenario)
+    shift_capacity = scenario.fte.actual.total * 5
+
+    # Events can affect each whole shift of capacity
+    trials = int(shift_capacity)
+    sample = samplers[sampler]
+    uniforms = uniform_designs.get(variance_reduction)
+
+    def sample_event(event_index, rates, size):
+        # Rates of each simulation already have the simulation axis
+        draw_size = None if rates.ndim == 3 else size
+        draw_shape = rates.shape if rates.ndim == 3 else (size,) + rates.shape
+
+        if uniforms:
+            return binomial_inverse_cdf(trials, rates, uniforms(gen, draw_shape))
+
+        return sample(gen, trials, rates, draw_size)
+
+    results = SimulationResultSet.for_scenario(
+        scenario, num_simulations, horizons, weeks
+    )
+
+    for start in range(0, num_simulations, block_size):
+        block = results.block(start, min(start + block_size, num_simulations))
+        simulate_block(block, weeks, scenario, shift_capacity, sample_event, gen)
+
+    return results
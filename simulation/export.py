@@ -0,0 +1,656 @@
+"""Writes simulation results to an Excel workbook."""
+import numpy as np
+from openpyxl import Workbook
+
+from .compare import compare_scenarios, comparison_values
+from .engine import expected_event_counts
+from .results import priority_groups
+from .samplers import design_group_sizes
+from .scenarios import (
+    cycle_length, horizons, horizon_labels, MeanEstimate, RiskMetrics, Stats,
+)
+from .weekly import fan_quantiles, uncovered_resolution
+
+
+# The quantiles given confidence intervals alongside the mean
+interval_quantiles = (0.5, 0.95)
+
+# The bootstrap resamples from a fixed seed so a run's workbook can be
+# reproduced
+bootstrap_seed = 0
+
+
+def _interval_row(result, name, stats, bootstrapped):
+    """Returns a row of the confidence interval table for one ``Stats``."""
+    if bootstrapped:
+        mean_interval = stats.bootstrap_mean
+        quantile_intervals = [
+            (stats.quantile_interval(q)[0], *stats.bootstrap_quantiles[q])
+            for q in interval_quantiles
+        ]
+    else:
+        mean_interval = stats.mean_interval()
+        quantile_intervals = [stats.quantile_interval(q) for q in interval_quantiles]
+
+    values = [np.mean(stats.values), *mean_interval]
+
+    for interval in quantile_intervals:
+        values.extend(interval)
+
+    return [result, name, *(round(float(value), 2) for value in values)]
+
+
+def calculate_stats(
+    scenario, results, variance_reduction='none', bootstrap_replicates=0,
+):
+    """Calculates the statistics reported for a scenario.
+
+        Attributes:
+            scenario (ScenarioDetails): the simulated scenario.
+            results (SimulationResultSet): the results of its simulations.
+            variance_reduction (str): the method the simulations were run
+                with (see ``samplers.variance_reductions``); used to estimate
+                the precision of the mean uncovered shifts.
+            bootstrap_replicates (int): the number of bootstrap replicates
+                for the confidence intervals of the means and quantiles; the
+                analytic intervals are used if this is 0.
+    """
+    # Iterate through the simulation event results to run calculations
+    simulations_stats = {
+        'events': {},
+        'uncovered_shifts': {},
+        'estimates': {},
+        'shortfall_risk': {},
+    }
+
+    # The special "All Events" entry totals every event in each simulation
+    event_groups = {
+        'All Events': results.event_names,
+    }
+
+    for name, outcomes in results.event_rollups(event_groups).items():
+        simulations_stats['events'][name] = {
+            'stats_total': Stats(outcomes.sum(axis=0)),
+            'stats_horizons': [Stats(values) for values in outcomes],
+        }
+
+    for name in results.event_names:
+        outcomes = results.event(name)
+
+        simulations_stats['events'][name] = {
+            'stats_total': Stats(outcomes.sum(axis=0)),
+            'stats_horizons': [Stats(values) for values in outcomes],
+        }
+
+    # Shift Coverage Stats
+    # The special "All Shifts" entry totals every shift in each simulation,
+    # followed by the totals for each shift priority
+    shift_groups = {
+        'All Shifts': results.shift_names,
+        **priority_groups(scenario.shifts),
+    }
+
+    for name, values in results.shift_rollups(shift_groups).items():
+        simulations_stats['uncovered_shifts'][name] = Stats(values)
+
+    for name in results.shift_names:
+        simulations_stats['uncovered_shifts'][name] = Stats(results.shift(name))
+
+    # The precision of the mean uncovered shifts; with control variates the
+    # event counts (whose means are known from the rates) are the controls
+    controls = control_means = None
+
+    if variance_reduction == 'control_variates':
+        control_means = expected_event_counts(cycle_length, scenario)
+        known = ~np.isnan(control_means)
+        controls = results.events.sum(axis=1)[known]
+        control_means = control_means[known]
+
+    for name, shift_stats in simulations_stats['uncovered_shifts'].items():
+        simulations_stats['estimates'][name] = MeanEstimate(
+            shift_stats.values, design_group_sizes.get(variance_reduction, 1),
+            controls, control_means,
+        )
+
+    # How often and for how long shifts of each priority or higher go
+    # uncovered through the cycle
+    for i, priority in enumerate(results.priorities):
+        name = f'Priority {priority} and Above'
+        simulations_stats['shortfall_risk'][name] = RiskMetrics(
+            results.short_weeks[i], results.longest_short_run[i],
+            results.first_short_week[i], cycle_length,
+        )
+
+    # Excess shift capacity stats
+    excess_shifts_stats = Stats(results.excess_shifts)
+
+    # Actual FTE stats
+    actual_fte_stats = Stats(results.actual_fte)
+
+    # Number of shift changes for cycle
+    shift_changes_stats_total = Stats(results.shift_changes.sum(axis=0))
+    shift_changes_stats_horizons = [
+        Stats(values) for values in results.shift_changes
+    ]
+
+    simulations_stats['num_simulations'] = len(results)
+    simulations_stats['excess_shifts'] = excess_shifts_stats
+    simulations_stats['actual_fte'] = actual_fte_stats
+
+    # Extra shifts worked to cover shortfalls, if the staff respond to them
+    simulations_stats['capacity_response'] = None
+
+    if scenario.capacity_response:
+        simulations_stats['capacity_response'] = {
+            'Picked Up Shifts': Stats(results.pickup_shifts),
+            'Overtime Shifts': Stats(results.overtime_shifts),
+        }
+    simulations_stats['shift_changes'] = {
+        'stats_total': shift_changes_stats_total,
+        'stats_horizons': shift_changes_stats_horizons,
+    }
+
+    # Confidence intervals for the means and selected quantiles of the main
+    # results (which are also compared between scenarios). Every result is
+    # bootstrapped with the same resamples.
+    interval_stats = [
+        ('Event Occurrences', name, event_stats['stats_total'])
+        for name, event_stats in simulations_stats['events'].items()
+    ]
+    interval_stats.extend(
+        ('Uncovered Shifts', name, shift_stats)
+        for name, shift_stats in simulations_stats['uncovered_shifts'].items()
+    )
+    interval_stats.extend([
+        ('Excess Shifts', 'Number of Excess Shifts', excess_shifts_stats),
+        ('Actual FTE', 'Actual Worked FTE', actual_fte_stats),
+        ('Shift Changes', 'Number of Shift Changes', shift_changes_stats_total),
+    ])
+
+    if simulations_stats['capacity_response']:
+        interval_stats.extend(
+            ('Extra Shifts', name, stats)
+            for name, stats in simulations_stats['capacity_response'].items()
+        )
+
+    if bootstrap_replicates:
+        Stats.bootstrap(
+            [stats for _, _, stats in interval_stats], interval_quantiles,
+            bootstrap_replicates,
+            group_size=design_group_sizes.get(variance_reduction, 1),
+            gen=np.random.default_rng(bootstrap_seed),
+        )
+
+    simulations_stats['metrics'] = interval_stats
+    simulations_stats['intervals'] = {
+        'method': 'Bootstrap' if bootstrap_replicates else 'Analytic',
+        'rows': [
+            _interval_row(result, name, stats, bool(bootstrap_replicates))
+            for result, name, stats in interval_stats
+        ],
+    }
+
+    # The weekly bands for the fan charts, if the sketch was recorded
+    simulations_stats['weekly'] = None
+
+    if results.weekly is not None:
+        simulations_stats['weekly'] = results.weekly.table(results.shift_names)
+
+    return simulations_stats
+
+
+def write_scenario_sheet(output_ws, scenario, simulations_stats):
+    """Writes the statistics for a scenario to a worksheet.
+
+        Attributes:
+            output_ws (Worksheet): the worksheet to write to.
+            scenario (ScenarioDetails): the simulated scenario.
+            simulations_stats (dict): the statistics from ``calculate_stats``.
+    """
+    # Set Worksheet Title
+    output_ws.title = scenario.name
+
+    excess_shifts_stats = simulations_stats['excess_shifts']
+    actual_fte_stats = simulations_stats['actual_fte']
+    shift_changes_stats_total = simulations_stats['shift_changes']['stats_total']
+    shift_changes_stats_horizons = simulations_stats['shift_changes']['stats_horizons']
+
+    # Write data to the active worksheet
+    row_num = 1
+
+    # Basic Monte Carlo Details
+    output_ws.cell(row=row_num, column=1, value='SIMULATION DETAILS')
+    row_num += 1
+    
+    output_ws.cell(row=row_num, column=2, value='Value')
+    row_num += 1
+
+    output_ws.cell(row=row_num, column=1, value='Number of Simulations')
+    output_ws.cell(row=row_num, column=2, value=simulations_stats['num_simulations'])
+    row_num += 1
+
+    output_ws.cell(row=row_num, column=1, value='Length of Simulation Cycle (weeks)')
+    output_ws.cell(row=row_num, column=2, value=cycle_length)
+    row_num += 1
+
+    response = scenario.capacity_response
+
+    if response:
+        output_ws.cell(row=row_num, column=1, value='Most Picked Up Shifts per Week')
+        output_ws.cell(row=row_num, column=2, value=response.pickup_limit(scenario.staff))
+        row_num += 1
+
+        output_ws.cell(row=row_num, column=1, value='Chance a Picked Up Shift is Available')
+        output_ws.cell(row=row_num, column=2, value=response.pickup_probability)
+        row_num += 1
+
+        output_ws.cell(row=row_num, column=1, value='Most Overtime Shifts per Week')
+        output_ws.cell(row=row_num, column=2, value=response.overtime)
+        row_num += 1
+
+    row_num += 1
+
+    # Event Details
+    output_ws.cell(row=row_num, column=1, value='EVENT DETAILS')
+    row_num += 1
+
+    output_ws.cell(row=row_num, column=1, value='Event')
+    output_ws.cell(row=row_num, column=2, value='Rate of Changes (changes per event occurrence)')
+    output_ws.cell(row=row_num, column=3, value='Rate of Lost Shift Capacity (lost shifts per event occurrence)')
+    output_ws.cell(row=row_num, column=4, value='Event Rate Occurence - Total')
+
+    for i, label in enumerate(horizon_labels()):
+        output_ws.cell(row=row_num, column=5 + i, value=f'Event Rate Occurence - {label} weeks')
+
+    output_ws.cell(row=row_num, column=5 + len(horizons), value='Maximum Number of Allowed Events per Cycle')
+    output_ws.cell(row=row_num, column=6 + len(horizons), value='Seasonal Profile')
+    output_ws.cell(row=row_num, column=7 + len(horizons), value='Rate Uncertainty - Beta Concentration')
+    output_ws.cell(row=row_num, column=8 + len(horizons), value='Split Uncertainty - Dirichlet Concentration')
+    output_ws.cell(row=row_num, column=9 + len(horizons), value='Shared Shock (variance)')
+    output_ws.cell(row=row_num, column=10 + len(horizons), value='Follow On Events (occurrences per occurrence)')
+    row_num += 1
+
+    for event in scenario.events:
+        output_ws.cell(row=row_num, column=1, value=event.name)
+        output_ws.cell(row=row_num, column=2, value=event.changes)
+        output_ws.cell(row=row_num, column=3, value=event.losses)
+        output_ws.cell(row=row_num, column=4, value=np.round(event.rate_total, 4))
+
+        for i, rate in enumerate(event.rates):
+            output_ws.cell(row=row_num, column=5 + i, value=np.round(rate, 4))
+
+        output_ws.cell(row=row_num, column=5 + len(horizons), value=event.cycle_max)
+        output_ws.cell(row=row_num, column=6 + len(horizons), value=event.profile_name)
+        output_ws.cell(row=row_num, column=7 + len(horizons), value=event.rate_concentration)
+        output_ws.cell(row=row_num, column=8 + len(horizons), value=event.split_concentration)
+
+        if event.shock:
+            output_ws.cell(
+                row=row_num, column=9 + len(horizons),
+                value=f'{event.shock.name} ({event.shock.variance})',
+            )
+
+        if event.follow_ons:
+            output_ws.cell(
+                row=row_num, column=10 + len(horizons),
+                value=', '.join(
+                    f'{follow_on.event} ({round(follow_on.occurrences, 4)})'
+                    for follow_on in event.follow_ons
+                ),
+            )
+        row_num +=1
+
+    row_num +=1
+
+    # Event occurence details for the simulation
+    output_ws.cell(row=row_num, column=1, value='EVENT RESULTS')
+    row_num += 1
+
+    output_ws.cell(row=row_num, column=1, value='Event')
+    output_ws.cell(row=row_num, column=2, value='Total - Mean')
+    output_ws.cell(row=row_num, column=3, value='Total - Lower CI')
+    output_ws.cell(row=row_num, column=4, value='Total - Upper CI')
+
+    for i, label in enumerate(horizon_labels()):
+        output_ws.cell(row=row_num, column=5 + i * 3, value=f'Weeks {label} - Mean')
+        output_ws.cell(row=row_num, column=6 + i * 3, value=f'Weeks {label} - Lower CI')
+        output_ws.cell(row=row_num, column=7 + i * 3, value=f'Weeks {label} - Upper CI')
+
+    row_num += 1
+
+    for event_name, event_stats in simulations_stats['events'].items():
+        output_ws.cell(row=row_num, column=1, value=event_name)
+        output_ws.cell(row=row_num, column=2, value=event_stats['stats_total'].mean)
+        output_ws.cell(row=row_num, column=3, value=event_stats['stats_total'].ci_lower)
+        output_ws.cell(row=row_num, column=4, value=event_stats['stats_total'].ci_upper)
+
+        for i, horizon_stats in enumerate(event_stats['stats_horizons']):
+            output_ws.cell(row=row_num, column=5 + i * 3, value=horizon_stats.mean)
+            output_ws.cell(row=row_num, column=6 + i * 3, value=horizon_stats.ci_lower)
+            output_ws.cell(row=row_num, column=7 + i * 3, value=horizon_stats.ci_upper)
+
+        row_num += 1
+
+    row_num += 1
+
+    # Shift Details
+    output_ws.cell(row=row_num, column=1, value='SHIFT DETAILS')
+    output_ws.cell(row=row_num, column=2, value='Allocation Policy')
+    output_ws.cell(row=row_num, column=3, value=scenario.allocation_policy)
+    row_num += 1
+
+    output_ws.cell(row=row_num, column=1, value='Shift Name')
+    output_ws.cell(row=row_num, column=2, value='Number of Shifts')
+    output_ws.cell(row=row_num, column=3, value='Shift Priority')
+    output_ws.cell(row=row_num, column=4, value='Minimum Number of Shifts')
+    output_ws.cell(row=row_num, column=5, value='Shift Weight')
+    row_num += 1
+
+    for shift in scenario.shifts:
+        output_ws.cell(row=row_num, column=1, value=shift.name)
+        output_ws.cell(row=row_num, column=2, value=shift.number)
+        output_ws.cell(row=row_num, column=3, value=shift.priority)
+        output_ws.cell(row=row_num, column=4, value=shift.minimum)
+        output_ws.cell(row=row_num, column=5, value=shift.weight)
+        row_num += 1
+        
+    row_num += 1
+
+    # Shift Results
+    output_ws.cell(row=row_num, column=1, value='UNCOVERED SHIFT RESULTS')
+    row_num += 1
+
+    output_ws.cell(row=row_num, column=1, value='Shift')
+    output_ws.cell(row=row_num, column=2, value='Mean Uncovered Shifts per Cycle')
+    output_ws.cell(row=row_num, column=3, value='Lower CI')
+    output_ws.cell(row=row_num, column=4, value='Upper CI')
+    output_ws.cell(row=row_num, column=5, value='Estimated Mean')
+    output_ws.cell(row=row_num, column=6, value='Standard Error of Mean')
+    output_ws.cell(row=row_num, column=7, value='Effective Sample Size')
+    row_num += 1
+
+    for shift_name, shift_stats in simulations_stats['uncovered_shifts'].items():
+        estimate = simulations_stats['estimates'][shift_name]
+        output_ws.cell(row=row_num, column=1, value=shift_name)
+        output_ws.cell(row=row_num, column=2, value=shift_stats.mean)
+        output_ws.cell(row=row_num, column=3, value=shift_stats.ci_lower)
+        output_ws.cell(row=row_num, column=4, value=shift_stats.ci_upper)
+        output_ws.cell(row=row_num, column=5, value=estimate.mean)
+        output_ws.cell(row=row_num, column=6, value=estimate.standard_error)
+        output_ws.cell(row=row_num, column=7, value=estimate.effective_sample_size)
+        row_num += 1
+
+    row_num += 1
+
+    # Shortfall Risk Results
+    output_ws.cell(row=row_num, column=1, value='SHORTFALL RISK RESULTS')
+    row_num += 1
+
+    output_ws.cell(row=row_num, column=1, value='Shifts')
+    output_ws.cell(row=row_num, column=2, value='Probability of Any Shortfall per Cycle')
+    output_ws.cell(row=row_num, column=3, value='Probability of a Short Week')
+    output_ws.cell(row=row_num, column=4, value='Longest Run of Short Weeks - Mean')
+    output_ws.cell(row=row_num, column=5, value='Longest Run of Short Weeks - Median')
+    output_ws.cell(row=row_num, column=6, value='Longest Run of Short Weeks - 95th Percentile')
+    output_ws.cell(row=row_num, column=7, value='Week of First Shortfall - Mean')
+    output_ws.cell(row=row_num, column=8, value='Week of First Shortfall - 5th Percentile')
+    output_ws.cell(row=row_num, column=9, value='Week of First Shortfall - Median')
+    row_num += 1
+
+    for shifts_name, risk in simulations_stats['shortfall_risk'].items():
+        output_ws.cell(row=row_num, column=1, value=shifts_name)
+        output_ws.cell(row=row_num, column=2, value=risk.probability_any)
+        output_ws.cell(row=row_num, column=3, value=risk.probability_week)
+        output_ws.cell(row=row_num, column=4, value=risk.longest_run_mean)
+        output_ws.cell(row=row_num, column=5, value=risk.longest_run_median)
+        output_ws.cell(row=row_num, column=6, value=risk.longest_run_95th)
+
+        # The first shortfall is blank if there never was one
+        if risk.probability_any > 0:
+            output_ws.cell(row=row_num, column=7, value=risk.first_week_mean)
+            output_ws.cell(row=row_num, column=8, value=risk.first_week_5th)
+            output_ws.cell(row=row_num, column=9, value=risk.first_week_median)
+
+        row_num += 1
+
+    row_num += 1
+
+    # Excess Shift Results
+    output_ws.cell(row=row_num, column=1, value='EXCESS SHIFT RESULTS')
+    row_num += 1
+    
+    output_ws.cell(row=row_num, column=2, value='Mean Number of Shifts Per Cycle')
+    output_ws.cell(row=row_num, column=3, value='Lower CI')
+    output_ws.cell(row=row_num, column=4, value='Upper CI')
+    row_num += 1
+    
+    output_ws.cell(row=row_num, column=1, value='Number of Excess Shifts')
+    output_ws.cell(row=row_num, column=2, value=excess_shifts_stats.mean)
+    output_ws.cell(row=row_num, column=3, value=excess_shifts_stats.ci_lower)
+    output_ws.cell(row=row_num, column=4, value=excess_shifts_stats.ci_upper)
+    row_num += 2
+
+    # Capacity Response Results
+    if simulations_stats['capacity_response']:
+        output_ws.cell(row=row_num, column=1, value='CAPACITY RESPONSE RESULTS')
+        row_num += 1
+
+        output_ws.cell(row=row_num, column=2, value='Mean Number of Shifts Per Cycle')
+        output_ws.cell(row=row_num, column=3, value='Lower CI')
+        output_ws.cell(row=row_num, column=4, value='Upper CI')
+        row_num += 1
+
+        for name, stats in simulations_stats['capacity_response'].items():
+            output_ws.cell(row=row_num, column=1, value=name)
+            output_ws.cell(row=row_num, column=2, value=stats.mean)
+            output_ws.cell(row=row_num, column=3, value=stats.ci_lower)
+            output_ws.cell(row=row_num, column=4, value=stats.ci_upper)
+            row_num += 1
+
+        row_num += 1
+
+    # Actual FTE Results
+    output_ws.cell(row=row_num, column=1, value='ACTUAL FTE RESULTS')
+    row_num += 1
+    
+    output_ws.cell(row=row_num, column=2, value='Mean Actual Worked FTE per Cycle')
+    output_ws.cell(row=row_num, column=3, value='Lower CI')
+    output_ws.cell(row=row_num, column=4, value='Upper CI')
+    row_num += 1
+    
+    output_ws.cell(row=row_num, column=1, value='Actual Worked FTE')
+    output_ws.cell(row=row_num, column=2, value=actual_fte_stats.mean)
+    output_ws.cell(row=row_num, column=3, value=actual_fte_stats.ci_lower)
+    output_ws.cell(row=row_num, column=4, value=actual_fte_stats.ci_upper)
+    row_num += 2
+
+    # Number of Shift Changes
+    output_ws.cell(row=row_num, column=1, value='NUMBER OF SHIFT CHANGES')
+    row_num += 1
+
+    output_ws.cell(row=row_num, column=2, value='Total - Mean')
+    output_ws.cell(row=row_num, column=3, value='Total - Lower CI')
+    output_ws.cell(row=row_num, column=4, value='Total - Upper CI')
+
+    for i, label in enumerate(horizon_labels()):
+        output_ws.cell(row=row_num, column=5 + i * 3, value=f'Weeks {label} - Mean')
+        output_ws.cell(row=row_num, column=6 + i * 3, value=f'Weeks {label} - Lower CI')
+        output_ws.cell(row=row_num, column=7 + i * 3, value=f'Weeks {label} - Upper CI')
+    row_num += 1
+
+    output_ws.cell(row=row_num, column=1, value='Number of Shift Changes')
+    output_ws.cell(row=row_num, column=2, value=shift_changes_stats_total.mean)
+    output_ws.cell(row=row_num, column=3, value=shift_changes_stats_total.ci_lower)
+    output_ws.cell(row=row_num, column=4, value=shift_changes_stats_total.ci_upper)
+
+    for i, horizon_stats in enumerate(shift_changes_stats_horizons):
+        output_ws.cell(row=row_num, column=5 + i * 3, value=horizon_stats.mean)
+        output_ws.cell(row=row_num, column=6 + i * 3, value=horizon_stats.ci_lower)
+        output_ws.cell(row=row_num, column=7 + i * 3, value=horizon_stats.ci_upper)
+    row_num += 2
+
+    # Confidence Intervals
+    # The CIs above are the range of a single cycle; these are the 95%
+    # confidence intervals for the mean and quantiles across cycles
+    intervals = simulations_stats['intervals']
+    output_ws.cell(row=row_num, column=1, value='CONFIDENCE INTERVALS')
+    output_ws.cell(row=row_num, column=2, value=f'{intervals["method"]} 95% CIs')
+    row_num += 1
+
+    output_ws.cell(row=row_num, column=1, value='Result')
+    output_ws.cell(row=row_num, column=2, value='Name')
+    output_ws.cell(row=row_num, column=3, value='Mean')
+    output_ws.cell(row=row_num, column=4, value='Mean - Lower CI')
+    output_ws.cell(row=row_num, column=5, value='Mean - Upper CI')
+
+    for i, quantile in enumerate(interval_quantiles):
+        label = f'{quantile * 100:g}th Percentile'
+        output_ws.cell(row=row_num, column=6 + i * 3, value=label)
+        output_ws.cell(row=row_num, column=7 + i * 3, value=f'{label} - Lower CI')
+        output_ws.cell(row=row_num, column=8 + i * 3, value=f'{label} - Upper CI')
+    row_num += 1
+
+    for row in intervals['rows']:
+        for column, value in enumerate(row, start=1):
+            output_ws.cell(row=row_num, column=column, value=value)
+
+        row_num += 1
+
+
+def write_weekly_sheet(output_ws, scenario, weekly_table):
+    """Writes the weekly bands for a scenario to a worksheet.
+
+        Attributes:
+            output_ws (Worksheet): the worksheet to write to.
+            scenario (ScenarioDetails): the simulated scenario.
+            weekly_table (list): the rows from ``WeeklyQuantiles.table``.
+    """
+    # Worksheet titles are limited to 31 characters
+    output_ws.title = f'{scenario.name} - Weekly'[:31]
+
+    output_ws.cell(row=1, column=1, value='WEEKLY RESULTS')
+    output_ws.cell(
+        row=1, column=2,
+        value='Uncovered shift percentiles of partly covered shifts are to the '
+        f'nearest {uncovered_resolution:g} shifts',
+    )
+
+    output_ws.cell(row=2, column=1, value='Measure')
+    output_ws.cell(row=2, column=2, value='Week')
+    output_ws.cell(row=2, column=3, value='Mean')
+
+    for i, quantile in enumerate(fan_quantiles):
+        output_ws.cell(row=2, column=4 + i, value=f'{quantile * 100:g}th Percentile')
+
+    for row_num, row in enumerate(weekly_table, start=3):
+        for column, value in enumerate(row, start=1):
+            output_ws.cell(row=row_num, column=column, value=value)
+
+
+def write_comparison_sheet(output_ws, comparison_rows, paired):
+    """Writes the pairwise comparison of the scenarios to a worksheet.
+
+        Attributes:
+            output_ws (Worksheet): the worksheet to write to.
+            comparison_rows (list): the rows from
+                ``compare.compare_scenarios``.
+            paired (bool): whether the differences were paired.
+    """
+    output_ws.title = 'Scenario Comparison'
+
+    output_ws.cell(row=1, column=1, value='SCENARIO COMPARISON')
+    output_ws.cell(
+        row=1, column=2,
+        value='Paired differences (common random numbers)' if paired
+        else 'Independent differences',
+    )
+
+    headers = [
+        'Scenario A', 'Scenario B', 'Result', 'Name', 'Mean - A', 'Mean - B',
+        'Difference (A - B)', 'Difference - Lower CI', 'Difference - Upper CI',
+        'Probability A is Better',
+    ]
+
+    for column, header in enumerate(headers, start=1):
+        output_ws.cell(row=2, column=column, value=header)
+
+    for row_num, row in enumerate(comparison_rows, start=3):
+        for column, value in enumerate(row, start=1):
+            output_ws.cell(row=row_num, column=column, value=value)
+
+
+class WorkbookWriter:
+    """Writes one worksheet per scenario to a results workbook.
+
+        A comparison of every pair of scenarios follows the scenario
+        worksheets, and the weekly bands of each scenario are written to
+        their own worksheets after that.
+
+        Attributes:
+            paired (bool): whether the scenarios were simulated with common
+                random numbers, so their differences can be paired.
+    """
+    def __init__(self, paired=False):
+        self.output_wb = Workbook()
+        self.output_ws = self.output_wb.active
+        self.num_scenarios = 0
+        self.paired = paired
+        self.scenario_values = []
+
+    def add_scenario(self, scenario, simulations_stats):
+        """Writes the statistics for a scenario to the next worksheet."""
+        # Create a new worksheet if necessary
+        if self.output_ws is None:
+            self.output_ws = self.output_wb.create_sheet(index=self.num_scenarios)
+
+        write_scenario_sheet(self.output_ws, scenario, simulations_stats)
+        self.output_ws = None
+        self.num_scenarios += 1
+        self.scenario_values.append(
+            (scenario.name, comparison_values(simulations_stats))
+        )
+
+        if simulations_stats.get('weekly') is not None:
+            write_weekly_sheet(
+                self.output_wb.create_sheet(), scenario, simulations_stats['weekly']
+            )
+
+    def save(self, save_loc):
+        """Compares the scenarios and saves the workbook."""
+        if len(self.scenario_values) > 1:
+            write_comparison_sheet(
+                self.output_wb.create_sheet(index=self.num_scenarios),
+                compare_scenarios(self.scenario_values, self.paired),
+                self.paired,
+            )
+
+        self.output_wb.save(save_loc)
+
+
+def write_workbook(
+    scenario_results, save_loc, variance_reduction='none', bootstrap_replicates=0,
+    paired=False,
+):
+    """Writes one worksheet per scenario and saves the workbook.
+
+        Attributes:
+            scenario_results (list): (scenario, SimulationResultSet) pairs.
+            save_loc (Path): where to save the workbook.
+            variance_reduction (str): the method the simulations were run
+                with (see ``samplers.variance_reductions``).
+            bootstrap_replicates (int): the number of bootstrap replicates
+                for the confidence intervals; 0 uses the analytic intervals.
+            paired (bool): whether the scenarios were simulated with common
+                random numbers.
+    """
+    writer = WorkbookWriter(paired)
+
+    for scenario, results in scenario_results:
+        writer.add_scenario(
+            scenario,
+            calculate_stats(
+                scenario, results, variance_reduction, bootstrap_replicates
+            ),
+        )
+
+    writer.save(save_loc)
@@ -0,0 +1,239 @@
+"""Re-evaluates a baseline run after an event's rates change.
+
+    Each event count is drawn by inverting the binomial distribution at a
+    uniform random number, and the uniforms for every event come from their
+    own stream of the run seed. When an event's rates change, only that
+    event's uniforms are inverted against the new rates; the other events
+    keep their counts, and the capacity, shift allocation and results are
+    recalculated from the stored weekly losses. A changed event keeps its
+    uniforms sorted within each week and notice period, so later changes to
+    it only search its CDF values rather than every uniform. Because every
+    other draw is unchanged the before and after results are paired
+    simulation by simulation.
+
+    This follows the pooled capacity model of ``engine.simulate_period``.
+    Events with uncertain rates draw each simulation's rates from a second
+    stream of their own, and each shock's multipliers are drawn once from a
+    stream of the shock, so these draws are also kept when the rates change.
+    Scenarios with follow-on events are not supported.
+"""
+import copy
+
+import numpy as np
+
+from .engine import allocate_capacity, record_event
+from .results import SimulationResultSet
+from .samplers import binomial_cdf_table, binomial_inverse_cdf
+from .scenarios import cycle_length, horizons
+from .weekly import WeeklyQuantiles
+
+
+class IncrementalRun:
+    """A baseline run that can be updated cheaply when event rates change.
+
+        Redrawing the changed event takes a few tens of milliseconds for
+        10,000 simulations, but the allocation and its statistics are
+        recalculated for every shift, simulation and week. A whole update of
+        the bundled scenarios with 10,000 simulations takes about 0.1 s
+        under the strict and partial policies and 0.2 to 0.3 s under the
+        policies that share capacity; the first change to an event also
+        sorts its uniforms, which adds about 0.1 s.
+
+        Attributes:
+            scenario (ScenarioDetails): a copy of the scenario, updated with
+                any rate changes.
+            num_simulations (int): the number of simulations.
+            seed (int): the seed the event uniforms are generated from.
+            weeks (int): the number of weeks in each simulation.
+            results (SimulationResultSet): the results for the current
+                rates; each update replaces this with a new result set.
+            shocks (dict): the shock names mapped to their multipliers for
+                each simulation and week.
+            available (np.ndarray): the extra shifts available in each
+                simulation and week, if the scenario has a capacity
+                response.
+    """
+    def __init__(self, scenario, num_simulations, seed=None, weeks=cycle_length):
+        if any(event.follow_ons for event in scenario.events):
+            raise ValueError(
+                'Incremental runs do not support follow on events, as changing '
+                'one event would change the events it causes'
+            )
+
+        if seed is None:
+            seed = np.random.SeedSequence().entropy
+
+        self.scenario = copy.deepcopy(scenario)
+        self.num_simulations = num_simulations
+        self.seed = seed
+        self.weeks = weeks
+
+        # The capacity for shifts and the number of binomial trials per week
+        self.shift_capacity = self.scenario.fte.actual.total * 5
+        self.trials = int(self.shift_capacity)
+
+        self.results = SimulationResultSet.for_scenario(
+            self.scenario, num_simulations, horizons, weeks
+        )
+
+        # Shifts lost each week by each event, kept so a single event can be
+        # swapped out of the total
+        self.event_week_losses = np.zeros(
+            (len(self.scenario.events), num_simulations, weeks)
+        )
+        self.week_losses = np.zeros((num_simulations, weeks))
+        self.shocks = {}
+        self._sorted = {}
+
+        for shock_index, shock in enumerate(self.scenario.shocks):
+            sequence = np.random.SeedSequence(self.seed, spawn_key=(shock_index, 2))
+            gen = np.random.Generator(np.random.PCG64(sequence))
+            self.shocks[shock.name] = shock.multipliers(gen, num_simulations, weeks)
+
+        # The extra shifts available each week are drawn once from their own
+        # stream, so only the shortfalls they cover change with the rates
+        self.available = None
+        response = self.scenario.capacity_response
+
+        if response:
+            sequence = np.random.SeedSequence(self.seed, spawn_key=(0, 3))
+            gen = np.random.Generator(np.random.PCG64(sequence))
+            self.available = response.available(
+                gen, self.scenario.staff, num_simulations, weeks
+            )
+
+        for i in range(len(self.scenario.events)):
+            self._sample_event(i, self.results)
+
+        self._allocate(self.results)
+
+    def _uniforms(self, event_index):
+        """Regenerates the uniforms for an event from its own stream."""
+        sequence = np.random.SeedSequence(self.seed, spawn_key=(event_index,))
+        gen = np.random.Generator(np.random.PCG64(sequence))
+
+        return gen.random((self.num_simulations, self.weeks, len(horizons)))
+
+    def _weekly_rates(self, event_index):
+        """Returns an event's rates, drawn per simulation if uncertain."""
+        event = self.scenario.events[event_index]
+        rates = None
+
+        if event.uncertain:
+            sequence = np.random.SeedSequence(self.seed, spawn_key=(event_index, 1))
+            gen = np.random.Generator(np.random.PCG64(sequence))
+            rates = event.simulation_rates(gen, self.num_simulations)
+
+        return event.weekly_rates(
+            self.weeks, rates, self.shocks[event.shock.name] if event.shock else None
+        )
+
+    def _sorted_uniforms(self, event_index):
+        """Returns an event's uniforms sorted within each week and notice
+            period, and the simulation each sorted uniform belongs to.
+
+            Both are of shape (weeks * notice periods, simulations), and are
+            kept once made.
+        """
+        if event_index not in self._sorted:
+            uniforms = self._uniforms(event_index).reshape(self.num_simulations, -1).T
+            order = np.argsort(uniforms, axis=1).astype(np.int32)
+            self._sorted[event_index] = (
+                np.take_along_axis(uniforms, order, axis=1), order,
+            )
+
+        return self._sorted[event_index]
+
+    def _invert_sorted(self, event_index, rates):
+        """Inverts the binomial CDF at an event's sorted uniforms.
+
+            Each cell's sorted uniforms are split at its CDF values, which
+            takes one search per CDF value rather than one per uniform; the
+            counts are then put back in simulation order. The result is the
+            same as ``binomial_inverse_cdf``.
+        """
+        sorted_uniforms, order = self._sorted_uniforms(event_index)
+        size = self.num_simulations
+        outcomes = np.zeros(order.shape, dtype=np.int64)
+        active = np.flatnonzero(rates > 0)
+
+        if len(active):
+            cdf = binomial_cdf_table(self.trials, rates.ravel()[active])
+            cells = np.arange(len(active))[:, np.newaxis]
+
+            # The number of each cell's uniforms at or below each CDF value,
+            # with the offsets ``binomial_inverse_cdf`` searches with
+            below = np.searchsorted(
+                (sorted_uniforms[active] + 2 * cells).ravel(),
+                (cdf + 2 * cells).ravel(), side='right',
+            ).reshape(cdf.shape) - cells * size
+
+            # A sorted uniform's count is the number of CDF values below it
+            steps = np.bincount(
+                (below + cells * (size + 1)).ravel(), minlength=len(active) * (size + 1)
+            ).reshape(len(active), size + 1)
+            counts = np.minimum(np.cumsum(steps, axis=1)[:, :size], self.trials)
+
+            cell_outcomes = np.empty_like(counts)
+            np.put_along_axis(cell_outcomes, order[active], counts, axis=1)
+            outcomes[active] = cell_outcomes
+
+        return outcomes.T.reshape((size,) + rates.shape)
+
+    def _sample_event(self, event_index, results, keep_uniforms=False):
+        """Draws an event's counts and stores its weekly losses.
+
+            With ``keep_uniforms``, an event whose rates are the same in
+            every simulation keeps its uniforms sorted, so later changes to
+            it only search the CDF values.
+        """
+        event = self.scenario.events[event_index]
+        rates = self._weekly_rates(event_index)
+
+        if rates.ndim == 2 and (keep_uniforms or event_index in self._sorted):
+            outcomes = self._invert_sorted(event_index, rates)
+        else:
+            outcomes = binomial_inverse_cdf(
+                self.trials, rates, self._uniforms(event_index)
+            )
+
+        # Incremental runs have no follow-ons, so nothing is scheduled
+        self.week_losses -= self.event_week_losses[event_index]
+        self.event_week_losses[event_index] = record_event(
+            results, event_index, event, outcomes, None, {}
+        )
+        self.week_losses += self.event_week_losses[event_index]
+
+    def _allocate(self, results):
+        """Recalculates the capacity, shifts and shift changes from events."""
+        allocate_capacity(
+            results, self.scenario, self.shift_capacity - self.week_losses,
+            self.available,
+        )
+
+    def set_rates(self, event_name, rates):
+        """Changes an event's rates and returns the updated results.
+
+            The previous result set is left unchanged, so it can be compared
+            with the new one.
+
+            Attributes:
+                event_name (str): the name of the event to change.
+                rates (list): the new rate for each notice period.
+        """
+        event_index = self.results.event_names.index(event_name)
+        self.scenario.events[event_index].set_rates(rates)
+
+        results = SimulationResultSet(
+            **self.results.axes(),
+            **{
+                field: getattr(self.results, field).copy()
+                for field in SimulationResultSet.fields
+            },
+            weekly=WeeklyQuantiles.for_scenario(self.scenario, self.weeks),
+        )
+        self._sample_event(event_index, results, keep_uniforms=True)
+        self._allocate(results)
+        self.results = results
+
+        return results
@@ -0,0 +1,263 @@
+"""Runs the simulation, aggregation and export stages of a run concurrently.
+
+    Blocks of simulations are produced on a worker thread and passed through
+    a bounded queue to the aggregation stage, which copies each block into
+    its scenario's result set and calculates the statistics once the
+    scenario is complete. Finished scenarios are handed to a background
+    exporter thread that writes their worksheets. NumPy releases the GIL
+    while sampling, so the stages overlap and a run takes about as long as
+    its slowest stage rather than the sum of them.
+"""
+import queue
+import threading
+
+import numpy as np
+
+from .agents import StaffArrays, staff_block_size
+from .allocation import sharing_policies
+from .export import WorkbookWriter, calculate_stats
+from .results import SimulationResultSet
+from .runner import iter_blocks, num_blocks, stream_block_size
+from .scenarios import cycle_length, horizons
+
+
+# Marks the end of the items in a queue
+_done = object()
+
+def engine_block_bytes(scenario, engine='period', weeks=cycle_length):
+    """Returns the peak working memory of an engine for one stream block.
+
+        The peak is found from the arrays that are alive at once, counted in
+        arrays of one float64 per simulation and week. Sampling an event
+        holds about three arrays per notice period, one more when its rates
+        are drawn per simulation, the buffer of each event caused by another
+        and the multipliers of each shock. Allocating the
+        capacity holds about three arrays per shift group, and one more for
+        each group of the largest priority when the policy shares capacity
+        between groups. The staff engine samples in sub-blocks of
+        ``agents.staff_block_size`` simulations and holds about three arrays
+        per employee while it applies their banks.
+
+        Attributes:
+            scenario (ScenarioDetails): the scenario to simulate.
+            engine (str): the name of the engine in ``runner.engines``.
+            weeks (int): the number of weeks in each simulation.
+    """
+    periods = len(horizons)
+    caused = {
+        follow_on.event for event in scenario.events for follow_on in event.follow_ons
+    }
+    events = (
+        3 * periods
+        + periods * any(event.uncertain or event.shock for event in scenario.events)
+        + periods * len(caused)
+        + len(scenario.shocks)
+    )
+
+    tier = 0
+
+    if scenario.allocation_policy in sharing_policies:
+        tier = max(np.unique(
+            [shift.priority for shift in scenario.shifts], return_counts=True,
+        )[1])
+
+    allocation = 3 * len(scenario.shifts) + tier + 3
+    block_size = stream_block_size
+
+    if engine == 'staff':
+        events += 3 * len(StaffArrays.from_scenario(scenario))
+        block_size = min(staff_block_size, stream_block_size)
+
+    return block_size * weeks * np.dtype(float).itemsize * max(events, allocation)
+
+
+def queue_size_for_budget(
+    memory_budget, scenarios, num_simulations, workers=1, keep_results=True,
+    max_queue_size=16, engine='period',
+):
+    """Returns how many blocks can wait for aggregation within a budget.
+
+        The budget has to hold the result sets being aggregated (every
+        scenario's when they are kept, otherwise one at a time), the
+        statistics of up to two scenarios while they are exported, and the
+        blocks being simulated (see ``engine_block_bytes``). Whatever is
+        left is given to the queue. The blocks always have
+        ``runner.stream_block_size`` simulations, as their random streams
+        depend on it, so the budget does not change the results.
+
+        Attributes:
+            memory_budget (int): the memory available to the run in bytes.
+            scenarios (list): the scenarios to simulate.
+            num_simulations (int): the number of simulations per scenario.
+            workers (int): the number of processes to simulate blocks in.
+            keep_results (bool): whether every scenario's results are kept
+                until the end of the run.
+            max_queue_size (int): the largest queue to use.
+            engine (str): the name of the engine in ``runner.engines``.
+
+        Raises a ``MemoryError`` if the run cannot fit in the budget.
+    """
+    simulation_bytes = max(
+        SimulationResultSet.simulation_bytes(scenario, horizons)
+        for scenario in scenarios
+    )
+    scenario_bytes = simulation_bytes * num_simulations
+    held = scenario_bytes * (len(scenarios) if keep_results else 1)
+
+    # The values compared between scenarios are kept for every scenario
+    held += sum(
+        4 * num_simulations * (
+            len(scenario.events) + 2 * len(scenario.shifts) + 7
+        )
+        for scenario in scenarios
+    )
+
+    # The statistics copy each result to a wider type (about twice the size)
+    stats = 2 * 2 * scenario_bytes
+
+    block = simulation_bytes * stream_block_size
+    working = max(engine_block_bytes(scenario, engine) for scenario in scenarios)
+    simulating = max(workers, 1) * (working + 2 * block)
+    available = memory_budget - held - stats - simulating
+
+    if available < block:
+        needed = (held + stats + simulating + block) / 1e9
+        raise MemoryError(
+            f'The run needs about {needed:.1f} GB; split it into shards with '
+            'run-shard or run fewer simulations'
+        )
+
+    return int(min(available // block, max_queue_size))
+
+
+def _start_stage(function, errors, output=None):
+    """Runs a stage on a background thread.
+
+        Any error is kept in ``errors`` to be raised by the caller, and the
+        end of the output queue is always marked so the next stage never
+        waits forever.
+    """
+    def run_stage():
+        try:
+            function()
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            if output is not None:
+                output.put(_done)
+
+    thread = threading.Thread(target=run_stage, daemon=True)
+    thread.start()
+
+    return thread
+
+
+def run_pipeline(
+    scenarios, num_simulations, seed, engine='period', save_loc=None,
+    checkpoint=None, queue_size=4, progress=None, workers=1, sampler='binomial',
+    bit_generator='pcg64', variance_reduction='none', keep_results=True,
+    bootstrap_replicates=0, common_random_numbers=False,
+):
+    """Simulates every scenario and writes the results workbook.
+
+        Attributes:
+            scenarios (list): the scenarios to simulate.
+            num_simulations (int): the number of simulations per scenario.
+            seed (int): the seed for the run.
+            engine (str): the simulation engine to use.
+            save_loc (Path): where to save the workbook; no workbook is
+                written if this is not provided.
+            checkpoint (Checkpoint): saves and reloads completed blocks.
+            queue_size (int): the number of simulated blocks that can wait
+                for aggregation; bounds the memory used by the queue.
+            progress (callable): called with each scenario as its
+                simulations start.
+            workers (int): the number of processes to simulate blocks in.
+            sampler (str): the name of the sampler in ``samplers.samplers``.
+            bit_generator (str): the name of the bit generator in
+                ``runner.bit_generators``.
+            variance_reduction (str): one of ``samplers.variance_reductions``.
+            keep_results (bool): whether to keep every scenario's results;
+                if not, each is released once its statistics are calculated.
+            bootstrap_replicates (int): the number of bootstrap replicates
+                for the confidence intervals; 0 uses the analytic intervals.
+            common_random_numbers (bool): whether every scenario draws from
+                the same streams, so the scenario comparison is paired.
+
+        Returns a list of (scenario, ``SimulationResultSet``) pairs; the
+        result sets are None if they were not kept.
+    """
+    blocks = queue.Queue(maxsize=queue_size)
+    finished = queue.Queue()
+    errors = []
+    writer = WorkbookWriter(common_random_numbers) if save_loc else None
+
+    def simulate():
+        simulated = iter_blocks(
+            scenarios, num_simulations, seed, engine, checkpoint, workers,
+            sampler, bit_generator, variance_reduction, common_random_numbers,
+        )
+
+        for scenario_index, block_index, block in simulated:
+            if progress and block_index == 0:
+                progress(scenarios[scenario_index])
+
+            blocks.put((scenario_index, block_index, block))
+
+    def export():
+        while (item := finished.get()) is not _done:
+            writer.add_scenario(*item)
+
+        if not errors:
+            writer.save(save_loc)
+
+    simulator = _start_stage(simulate, errors, output=blocks)
+    exporter = _start_stage(export, errors) if writer else None
+
+    # Aggregate the blocks on this thread as they arrive
+    scenario_results = []
+    last_block = num_blocks(num_simulations) - 1
+
+    try:
+        while (item := blocks.get()) is not _done:
+            scenario_index, block_index, block = item
+            scenario = scenarios[scenario_index]
+
+            if block_index == 0:
+                scenario_results.append((
+                    scenario,
+                    SimulationResultSet.for_scenario(
+                        scenario, num_simulations, horizons
+                    ),
+                ))
+
+            results = scenario_results[scenario_index][1]
+            results.fill(block_index * stream_block_size, block)
+
+            if block_index == last_block:
+                if writer:
+                    finished.put((
+                        scenario,
+                        calculate_stats(
+                            scenario, results, variance_reduction,
+                            bootstrap_replicates,
+                        ),
+                    ))
+
+                if not keep_results:
+                    scenario_results[scenario_index] = (scenario, None)
+    except BaseException as e:
+        errors.append(e)
+        raise
+    finally:
+        finished.put(_done)
+
+    simulator.join()
+
+    if exporter:
+        exporter.join()
+
+    if errors:
+        raise errors[0]
+
+    return scenario_results
@@ -0,0 +1,245 @@
+"""Estimates the risk of rare shortfalls in high priority shifts.
+
+    High priority shifts are only left uncovered in weeks with very large
+    losses, which plain simulation almost never samples. This module uses
+    importance sampling instead: in each simulation one week, chosen at
+    random, has its event rates exponentially tilted so that its expected
+    losses reach the point where the high priority shifts go uncovered. Each
+    simulation is then weighted by the likelihood ratio between the real
+    rates and the mixture of tilted weeks, which keeps the estimates
+    unbiased while most of the simulations explore the tail.
+
+    The mixture over weeks suits the question asked (a shortfall in any
+    week of the cycle) and keeps the weights bounded by the number of weeks.
+    The tilts are found from the point estimates of the event rates. Events
+    with uncertain rates or a shock draw their rates as usual and only
+    their occurrences are tilted, so the weights only depend on the
+    occurrences. Follow-on events are caused by the tilted draws and need
+    no weight of their own.
+"""
+import numpy as np
+
+from .engine import simulate_block
+from .results import SimulationResultSet
+from .runner import block_generator, stream_block_size
+from .scenarios import cycle_length, horizons
+
+
+def _tilt(rates, theta):
+    """Returns binomial rates exponentially tilted by ``theta``."""
+    scaled = rates * np.exp(theta)
+
+    return scaled / (1 - rates + scaled)
+
+
+def tilt_strengths(weeks, scenario, priority=1):
+    """Finds the tilt for each week that puts the shortfall on the edge.
+
+        The tilt is chosen so that the expected shifts lost in the week
+        equal the capacity left once the shifts of the given priority and
+        above are covered. Each event is tilted in proportion to the shifts
+        it loses, which is the most likely way for the losses to be large.
+
+        Returns an array with the tilt strength for each week.
+    """
+    shift_capacity = scenario.fte.actual.total * 5
+    trials = int(shift_capacity)
+    demand = sum(shift.number for shift in scenario.shifts if shift.priority <= priority)
+    target = shift_capacity - demand
+
+    # Extra shifts worked in a short week push the edge further out
+    response = scenario.capacity_response
+
+    if response:
+        target += (
+            response.pickup_limit(scenario.staff) * response.pickup_probability
+            + response.overtime
+        )
+    event_rates = [event.weekly_rates(weeks) for event in scenario.events]
+
+    def expected_losses(theta):
+        return sum(
+            trials * event.losses
+            * _tilt(rates, theta[:, np.newaxis] * event.losses).sum(axis=1)
+            for event, rates in zip(scenario.events, event_rates)
+        )
+
+    # Bisect for the tilt of every week at once; losses rise with the tilt
+    lower = np.zeros(weeks)
+    upper = np.full(weeks, 50.0)
+
+    for _ in range(60):
+        middle = (lower + upper) / 2
+        below = expected_losses(middle) < target
+        lower = np.where(below, middle, lower)
+        upper = np.where(below, upper, middle)
+
+    return upper
+
+
+class ShortfallRisk:
+    """The estimated risk of uncovered shifts at or above a priority.
+
+        Every estimate is a (value, lower CI, upper CI) tuple for a 95%
+        confidence interval.
+
+        Attributes:
+            scenario_name (str): the name of the scenario.
+            priority (int): shifts with this priority or higher were counted.
+            num_simulations (int): the number of weighted simulations.
+            probability (tuple): the chance of any shortfall in a cycle.
+            expected_shortfall (tuple): the mean uncovered shifts per cycle.
+            conditional_shortfall (tuple): the mean uncovered shifts per
+                cycle when there is a shortfall.
+            effective_sample_size (flt): the number of plain simulations
+                that would estimate the probability as precisely.
+            tilted_hit_rate (flt): the share of simulations with a
+                shortfall (before weighting).
+    """
+    def __init__(self, scenario_name, priority, weights, shortfalls):
+        num_simulations = len(weights)
+        hits = shortfalls > 0
+        weighted_hits = weights * hits
+        weighted_shortfalls = weights * shortfalls
+
+        def interval(value, standard_error, upper_limit=np.inf):
+            return (
+                value,
+                max(value - 1.96 * standard_error, 0),
+                min(value + 1.96 * standard_error, upper_limit),
+            )
+
+        def standard_error(values):
+            return values.std(ddof=1) / np.sqrt(num_simulations)
+
+        def mean(values, upper_limit=np.inf):
+            return interval(values.mean(), standard_error(values), upper_limit)
+
+        self.scenario_name = scenario_name
+        self.priority = priority
+        self.num_simulations = num_simulations
+        self.probability = mean(weighted_hits, upper_limit=1.0)
+        self.expected_shortfall = mean(weighted_shortfalls)
+
+        # A ratio estimate, with its standard error from the delta method
+        if weighted_hits.sum() > 0:
+            ratio = weighted_shortfalls.sum() / weighted_hits.sum()
+            residuals = weighted_shortfalls - ratio * weighted_hits
+            self.conditional_shortfall = interval(
+                ratio, standard_error(residuals) / weighted_hits.mean()
+            )
+        else:
+            self.conditional_shortfall = (np.nan, np.nan, np.nan)
+
+        # Plain simulation has a variance of p(1 - p) / n for the probability
+        probability = self.probability[0]
+        variance = standard_error(weighted_hits) ** 2
+
+        if variance > 0:
+            self.effective_sample_size = probability * (1 - probability) / variance
+        else:
+            self.effective_sample_size = np.nan
+        self.tilted_hit_rate = hits.mean()
+
+    def __str__(self):
+        """String representation of ShortfallRisk."""
+        def estimate(values, digits):
+            value, lower, upper = (f'{value:.{digits}g}' for value in values)
+
+            return f'{value} (95% CI {lower}-{upper})'
+
+        return '\n'.join([
+            f'{self.scenario_name} - Priority {self.priority} and above',
+            f'  Probability of a shortfall per cycle: {estimate(self.probability, 3)}',
+            f'  Expected uncovered shifts per cycle: {estimate(self.expected_shortfall, 3)}',
+            f'  Uncovered shifts given a shortfall: {estimate(self.conditional_shortfall, 3)}',
+            f'  Effective sample size: {self.effective_sample_size:.3g} '
+            f'of {self.num_simulations} ({self.tilted_hit_rate:.0%} sampled a shortfall)',
+        ])
+
+
+def _simulate_tilted(weeks, scenario, size, thetas, gen):
+    """Runs simulations with one randomly chosen week tilted.
+
+        Returns the ``SimulationResultSet`` and the likelihood ratio weight
+        of each simulation.
+    """
+    shift_capacity = scenario.fte.actual.total * 5
+    trials = int(shift_capacity)
+
+    results = SimulationResultSet.for_scenario(scenario, size, horizons, weeks)
+    tilted_week = gen.integers(weeks, size=size)
+    is_tilted = np.arange(weeks) == tilted_week[:, np.newaxis]
+
+    # The log likelihood ratio of each week's draws under its own tilt
+    week_log_ratios = np.zeros((size, weeks))
+
+    def sample_event(event_index, rates, size):
+        event = scenario.events[event_index]
+        tilted = _tilt(rates, (thetas * event.losses)[:, np.newaxis])
+        draw_rates = np.where(is_tilted[..., np.newaxis], tilted, rates)
+        outcomes = gen.binomial(trials, draw_rates)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            success = np.where(rates > 0, np.log(tilted / rates), 0)
+            failure = np.where(rates < 1, np.log((1 - tilted) / (1 - rates)), 0)
+
+        week_log_ratios[:] += (
+            outcomes * success + (trials - outcomes) * failure
+        ).sum(axis=2)
+
+        return outcomes
+
+    simulate_block(results, weeks, scenario, shift_capacity, sample_event, gen)
+
+    # The draws came from an equal mixture of the tilted weeks
+    largest = week_log_ratios.max(axis=1, keepdims=True)
+    log_mixture = largest[:, 0] + np.log(
+        np.mean(np.exp(week_log_ratios - largest), axis=1)
+    )
+
+    return results, np.exp(-log_mixture)
+
+
+def estimate_shortfall_risk(
+    scenario, num_simulations, seed=None, priority=1, scenario_index=0,
+    weeks=cycle_length,
+):
+    """Estimates the risk of uncovered shifts at or above a priority.
+
+        Attributes:
+            scenario (ScenarioDetails): the scenario to simulate.
+            num_simulations (int): the number of simulations to run.
+            seed (int): the seed for the run; a random seed is used if not
+                provided.
+            priority (int): count shifts with this priority or higher
+                (lower numbers are higher priorities).
+            scenario_index (int): the position of the scenario in the run,
+                which selects its random streams.
+            weeks (int): the number of weeks in each simulation.
+
+        Returns a ``ShortfallRisk``.
+    """
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+
+    thetas = tilt_strengths(weeks, scenario, priority)
+    shift_names = [
+        shift.name for shift in scenario.shifts if shift.priority <= priority
+    ]
+    weights = []
+    shortfalls = []
+
+    for block_index, start in enumerate(range(0, num_simulations, stream_block_size)):
+        size = min(stream_block_size, num_simulations - start)
+        gen = block_generator(seed, scenario_index, block_index)
+        results, block_weights = _simulate_tilted(weeks, scenario, size, thetas, gen)
+
+        weights.append(block_weights)
+        shortfalls.append(
+            results.shift_rollups({'shortfall': shift_names})['shortfall']
+        )
+
+    return ShortfallRisk(
+        scenario.name, priority, np.concatenate(weights), np.concatenate(shortfalls)
+    )
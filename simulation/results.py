@@ -0,0 +1,392 @@
+"""Columnar storage for the results of many simulations."""
+import json
+
+import numpy as np
+
+from .scenarios import cycle_length
+from .weekly import WeeklyQuantiles
+
+
+def _membership(names, groups):
+    """Builds a (groups, names) matrix with 1 where a name is in a group.
+
+        Attributes:
+            names (list): the names along the axis being grouped.
+            groups (dict): the group names mapped to a list of member names.
+    """
+    matrix = np.zeros((len(groups), len(names)))
+
+    for row, members in enumerate(groups.values()):
+        for name in members:
+            matrix[row, names.index(name)] = 1
+
+    return matrix
+
+
+def priority_groups(shifts):
+    """Groups shifts by their priority.
+
+        Returns a dictionary of group names (e.g. "Priority 1 Shifts")
+        mapped to the names of the shifts with that priority.
+    """
+    groups = {}
+
+    for shift in shifts:
+        groups.setdefault(f'Priority {shift.priority} Shifts', []).append(shift.name)
+
+    return groups
+
+
+class SimulationResultSet:
+    """Holds the results of a set of simulations in preallocated arrays.
+
+        Every array has the simulations as its last axis, so a block of
+        simulations is a zero-copy slice that engines can write into
+        directly.
+
+        Attributes:
+            event_names (list): the names of the events, in axis order.
+            shift_names (list): the names of the shifts, in axis order.
+            horizons (list): the notice period edges, in axis order.
+            priorities (list): the shift priorities, highest first; the
+                shortfall results for a priority count every shift with
+                that priority or higher.
+            events (np.ndarray): event occurrences of shape
+                (events, horizons, simulations).
+            uncovered_shifts (np.ndarray): uncovered shifts of shape
+                (shifts, simulations).
+            excess_shifts (np.ndarray): excess shifts per simulation.
+            actual_fte (np.ndarray): mean actual FTE per simulation.
+            shift_changes (np.ndarray): shift changes of shape
+                (horizons, simulations).
+            short_weeks (np.ndarray): the weeks with an uncovered shift, of
+                shape (priorities, simulations).
+            longest_short_run (np.ndarray): the most consecutive weeks with
+                an uncovered shift, of shape (priorities, simulations).
+            first_short_week (np.ndarray): the first week (counted from 1)
+                with an uncovered shift, or 0 if there were none, of shape
+                (priorities, simulations).
+            pickup_shifts (np.ndarray): extra shifts picked up by part time
+                staff to cover shortfalls, per simulation.
+            overtime_shifts (np.ndarray): overtime shifts worked to cover
+                shortfalls, per simulation.
+            weekly (WeeklyQuantiles): the weekly capacity and coverage of
+                the simulations, or None if they were not recorded. Blocks
+                of a result set share its sketch.
+    """
+    # The arrays that hold the results, in the order they are saved
+    fields = (
+        'events', 'uncovered_shifts', 'excess_shifts', 'actual_fte', 'shift_changes',
+        'short_weeks', 'longest_short_run', 'first_short_week', 'pickup_shifts',
+        'overtime_shifts',
+    )
+
+    # The names along each axis, which identify the results of a scenario
+    axis_names = ('event_names', 'shift_names', 'horizons', 'priorities')
+
+    # The smallest types that hold each result safely: int32 holds any count
+    # of events in a cycle, and float32 keeps shift totals to well within
+    # the reported precision. This halves the memory of a large run. Week
+    # counts fit in int16.
+    dtypes = {
+        'events': np.int32,
+        'uncovered_shifts': np.float32,
+        'excess_shifts': np.float32,
+        'actual_fte': np.float32,
+        'shift_changes': np.float32,
+        'short_weeks': np.int16,
+        'longest_short_run': np.int16,
+        'first_short_week': np.int16,
+        'pickup_shifts': np.float32,
+        'overtime_shifts': np.float32,
+    }
+
+    def __init__(
+        self, event_names, shift_names, horizons, priorities, events,
+        uncovered_shifts, excess_shifts, actual_fte, shift_changes, short_weeks,
+        longest_short_run, first_short_week, pickup_shifts, overtime_shifts,
+        weekly=None,
+    ):
+        self.event_names = list(event_names)
+        self.shift_names = list(shift_names)
+        self.horizons = list(horizons)
+        self.priorities = list(priorities)
+        self.events = events
+        self.uncovered_shifts = uncovered_shifts
+        self.excess_shifts = excess_shifts
+        self.actual_fte = actual_fte
+        self.shift_changes = shift_changes
+        self.short_weeks = short_weeks
+        self.longest_short_run = longest_short_run
+        self.first_short_week = first_short_week
+        self.pickup_shifts = pickup_shifts
+        self.overtime_shifts = overtime_shifts
+        self.weekly = weekly
+
+    @classmethod
+    def empty(
+        cls, event_names, shift_names, horizons, priorities, num_simulations,
+        weekly=None,
+    ):
+        """Creates a result set with zeroed arrays for the simulations."""
+        shortfalls = {
+            field: np.zeros((len(priorities), num_simulations), dtype=cls.dtypes[field])
+            for field in ('short_weeks', 'longest_short_run', 'first_short_week')
+        }
+
+        return cls(
+            event_names=event_names,
+            shift_names=shift_names,
+            horizons=horizons,
+            priorities=priorities,
+            events=np.zeros(
+                (len(event_names), len(horizons), num_simulations),
+                dtype=cls.dtypes['events'],
+            ),
+            uncovered_shifts=np.zeros(
+                (len(shift_names), num_simulations),
+                dtype=cls.dtypes['uncovered_shifts'],
+            ),
+            excess_shifts=np.zeros(num_simulations, dtype=cls.dtypes['excess_shifts']),
+            actual_fte=np.zeros(num_simulations, dtype=cls.dtypes['actual_fte']),
+            shift_changes=np.zeros(
+                (len(horizons), num_simulations), dtype=cls.dtypes['shift_changes']
+            ),
+            **shortfalls,
+            pickup_shifts=np.zeros(num_simulations, dtype=cls.dtypes['pickup_shifts']),
+            overtime_shifts=np.zeros(
+                num_simulations, dtype=cls.dtypes['overtime_shifts']
+            ),
+            weekly=weekly,
+        )
+
+    @classmethod
+    def simulation_bytes(cls, scenario, horizons):
+        """Returns the memory needed to hold the results of one simulation."""
+        num_priorities = len({shift.priority for shift in scenario.shifts})
+        sizes = {
+            'events': len(scenario.events) * len(horizons),
+            'uncovered_shifts': len(scenario.shifts),
+            'excess_shifts': 1,
+            'actual_fte': 1,
+            'shift_changes': len(horizons),
+            'short_weeks': num_priorities,
+            'longest_short_run': num_priorities,
+            'first_short_week': num_priorities,
+            'pickup_shifts': 1,
+            'overtime_shifts': 1,
+        }
+
+        return sum(
+            size * np.dtype(cls.dtypes[field]).itemsize
+            for field, size in sizes.items()
+        )
+
+    @classmethod
+    def for_scenario(cls, scenario, num_simulations, horizons, weeks=cycle_length):
+        """Creates an empty result set for a scenario's events and shifts."""
+        return cls.empty(
+            [event.name for event in scenario.events],
+            [shift.name for shift in scenario.shifts],
+            horizons,
+            sorted({shift.priority for shift in scenario.shifts}),
+            num_simulations,
+            WeeklyQuantiles.for_scenario(scenario, weeks),
+        )
+
+    @classmethod
+    def concatenate(cls, result_sets):
+        """Joins result sets for the same events and shifts end to end.
+
+            Result sets are aligned by event and shift name, so they may
+            list them in a different order.
+        """
+        first = result_sets[0]
+        aligned = [first] + [first._align(other) for other in result_sets[1:]]
+
+        # The weekly sketch is only known if every result set recorded one
+        weekly = None
+
+        if all(r.weekly is not None for r in aligned):
+            weekly = first.weekly.copy()
+
+            for r in aligned[1:]:
+                weekly.update(r.weekly)
+
+        return cls(
+            **first.axes(),
+            **{
+                field: np.concatenate([getattr(r, field) for r in aligned], axis=-1)
+                for field in cls.fields
+            },
+            weekly=weekly,
+        )
+
+    def axes(self):
+        """Returns the names along each named axis of the result set."""
+        return {axis: getattr(self, axis) for axis in self.axis_names}
+
+    def arrays(self):
+        """Returns the arrays of the result set and its weekly sketch by name.
+
+            The sketch's arrays are prefixed with ``weekly_``.
+        """
+        arrays = {field: getattr(self, field) for field in self.fields}
+
+        if self.weekly is not None:
+            for field in WeeklyQuantiles.fields:
+                arrays[f'weekly_{field}'] = getattr(self.weekly, field)
+
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, axes, arrays):
+        """Creates a result set from its axes and the arrays from ``arrays``.
+
+            Attributes:
+                axes (dict): the names along each axis (see ``axes``).
+                arrays (Mapping): the arrays by name; the weekly sketch is
+                    left out if its arrays are missing.
+        """
+        weekly = None
+
+        if all(f'weekly_{field}' in arrays for field in WeeklyQuantiles.fields):
+            weekly = WeeklyQuantiles(
+                *(arrays[f'weekly_{field}'] for field in WeeklyQuantiles.fields)
+            )
+
+        return cls(
+            **axes,
+            **{field: arrays[field] for field in cls.fields},
+            weekly=weekly,
+        )
+
+    def save(self, file):
+        """Saves the result set to an ``.npz`` file or open file object."""
+        np.savez(file, axes=json.dumps(self.axes()), **self.arrays())
+
+    @classmethod
+    def load(cls, file):
+        """Loads a result set saved with ``save``."""
+        with np.load(file) as saved:
+            return cls.from_arrays(json.loads(str(saved['axes'])), saved)
+
+    def merge(self, other):
+        """Returns a new result set with the simulations of both sets."""
+        return SimulationResultSet.concatenate([self, other])
+
+    def _align(self, other):
+        """Reorders another result set's axes to match this one."""
+        if (
+            set(other.event_names) != set(self.event_names)
+            or set(other.shift_names) != set(self.shift_names)
+            or other.horizons != self.horizons
+            or other.priorities != self.priorities
+        ):
+            raise ValueError(
+                'Result sets must have the same events, shifts, horizons and priorities'
+            )
+
+        event_order = [other.event_names.index(name) for name in self.event_names]
+        shift_order = [other.shift_names.index(name) for name in self.shift_names]
+
+        return SimulationResultSet(
+            **self.axes(),
+            events=other.events[event_order],
+            uncovered_shifts=other.uncovered_shifts[shift_order],
+            excess_shifts=other.excess_shifts,
+            actual_fte=other.actual_fte,
+            shift_changes=other.shift_changes,
+            short_weeks=other.short_weeks,
+            longest_short_run=other.longest_short_run,
+            first_short_week=other.first_short_week,
+            pickup_shifts=other.pickup_shifts,
+            overtime_shifts=other.overtime_shifts,
+            weekly=other.weekly and other.weekly.reorder(shift_order),
+        )
+
+    def __len__(self):
+        """The number of simulations in the result set."""
+        return self.excess_shifts.shape[0]
+
+    def block(self, start, stop):
+        """Returns a view of the result set for a range of simulations.
+
+            Writing to the returned arrays (or adding to the weekly sketch)
+            updates this result set.
+        """
+        return SimulationResultSet(
+            **self.axes(),
+            **{field: getattr(self, field)[..., start:stop] for field in self.fields},
+            weekly=self.weekly,
+        )
+
+    def fill(self, start, other):
+        """Copies another result set's simulations in, starting at a position.
+
+            Both result sets must list their events and shifts in the same
+            order, as they do when they come from the same scenario.
+        """
+        target = self.block(start, start + len(other))
+
+        for field in self.fields:
+            getattr(target, field)[...] = getattr(other, field)
+
+        if self.weekly is not None and other.weekly is not None:
+            self.weekly.update(other.weekly)
+        else:
+            self.weekly = None
+
+    def event(self, name):
+        """Returns a (horizons, simulations) view of one event's occurrences."""
+        return self.events[self.event_names.index(name)]
+
+    def event_total(self, name):
+        """Returns one event's occurrences across all notice periods."""
+        return self.event(name).sum(axis=0)
+
+    def shift(self, name):
+        """Returns a view of one shift's uncovered shifts per simulation."""
+        return self.uncovered_shifts[self.shift_names.index(name)]
+
+    def event_rollups(self, groups):
+        """Totals the event occurrences of each simulation by group.
+
+            All groups are totalled in a single matrix product over the
+            event axis, so any number of groups costs one pass.
+
+            Attributes:
+                groups (dict): group names mapped to a list of event names.
+
+            Returns a dictionary of group names mapped to arrays of shape
+            (horizons, simulations).
+        """
+        matrix = _membership(self.event_names, groups)
+        totals = np.tensordot(matrix, self.events, axes=1)
+
+        return dict(zip(groups, totals))
+
+    def shift_rollups(self, groups):
+        """Totals the uncovered shifts of each simulation by group.
+
+            Attributes:
+                groups (dict): group names mapped to a list of shift names.
+
+            Returns a dictionary of group names mapped to arrays with one
+            total per simulation.
+        """
+        matrix = _membership(self.shift_names, groups)
+        totals = matrix @ self.uncovered_shifts
+
+        return dict(zip(groups, totals))
+
+    def horizon(self, edge):
+        """Returns an (events, simulations) view of one notice period."""
+        return self.events[:, self.horizons.index(edge)]
+
+    def __str__(self):
+        """String representation of the result set."""
+        return (
+            f'Simulation Results: {len(self)} simulations, '
+            f'{len(self.event_names)} events, {len(self.shift_names)} shifts'
+        )
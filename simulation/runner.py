@@ -0,0 +1,253 @@
+"""Runs scenario simulations in reproducible blocks of random streams."""
+import atexit
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from .agents import simulate_staff
+from .engine import simulate_period
+from .results import SimulationResultSet
+from .scenarios import cycle_length, horizons, scenarios as default_scenarios
+
+
+# The simulation engines that can be selected; 'period' samples the pooled
+# capacity of all staff, while 'staff' tracks each employee's PL, education
+# and vacation entitlements individually
+engines = {
+    'period': simulate_period,
+    'staff': simulate_staff,
+}
+
+# The bit generators that can drive the random streams. Philox is
+# counter-based, so its streams are offsets into one keyed sequence; the
+# others derive an independent seed for each stream.
+bit_generators = {
+    'pcg64': np.random.PCG64,
+    'pcg64dxsm': np.random.PCG64DXSM,
+    'philox': np.random.Philox,
+    'sfc64': np.random.SFC64,
+}
+
+# The number of simulations drawn from each random stream. Every block of
+# simulations always uses the same stream, so a run gives identical results
+# however its blocks are split between processes or machines.
+stream_block_size = 10000
+
+
+def num_blocks(num_simulations):
+    """Returns the number of stream blocks needed for the simulations."""
+    return -(-num_simulations // stream_block_size)
+
+
+def block_generator(seed, scenario_index, block_index, bit_generator='pcg64'):
+    """Returns the generator for one block of a scenario's simulations.
+
+        The stream only depends on the seed and the block's position, so
+        any block can be regenerated on its own, in any order and on any
+        worker.
+
+        Attributes:
+            seed (int): the seed for the whole run.
+            scenario_index (int): the position of the scenario in the run.
+            block_index (int): the index of the block of simulations.
+            bit_generator (str): the name of the bit generator in
+                ``bit_generators``.
+    """
+    if bit_generator == 'philox':
+        # The run seed sets the key and the block's position sets the high
+        # words of the counter; each block has 2^128 draws to itself
+        key = np.random.SeedSequence(seed).generate_state(2, np.uint64)
+        counter = [0, 0, scenario_index, block_index]
+
+        return np.random.Generator(np.random.Philox(counter=counter, key=key))
+
+    sequence = np.random.SeedSequence(seed, spawn_key=(scenario_index, block_index))
+
+    return np.random.Generator(bit_generators[bit_generator](sequence))
+
+
+def simulate_blocks(
+    scenario, scenario_index, num_simulations, seed, blocks, engine='period',
+    checkpoint=None, sampler='binomial', bit_generator='pcg64',
+    variance_reduction='none', common_random_numbers=False,
+):
+    """Runs some of the stream blocks of a scenario's simulations.
+
+        Attributes:
+            scenario (ScenarioDetails): the scenario to simulate.
+            scenario_index (int): the position of the scenario in the run.
+            num_simulations (int): the total simulations in the run.
+            seed (int): the seed for the whole run.
+            blocks (list): the indices of the blocks to run.
+            engine (str): the name of the engine in ``engines``.
+            checkpoint (Checkpoint): if provided, completed blocks are loaded
+                from the checkpoint and new blocks are saved to it.
+            sampler (str): the name of the sampler in ``samplers.samplers``.
+            bit_generator (str): the name of the bit generator in
+                ``bit_generators``.
+            variance_reduction (str): one of ``samplers.variance_reductions``.
+            common_random_numbers (bool): whether every scenario draws from
+                the same streams (those of the first scenario), which pairs
+                the simulations of different scenarios.
+
+        Returns a ``SimulationResultSet`` with the simulations of each block
+        in the order given.
+    """
+    block_results = [
+        SimulationResultSet.for_scenario(scenario, 0, horizons)
+    ]
+
+    for block_index in blocks:
+        if checkpoint and checkpoint.has_block(scenario_index, block_index):
+            block_results.append(checkpoint.load_block(scenario_index, block_index))
+            continue
+
+        start = block_index * stream_block_size
+        size = min(stream_block_size, num_simulations - start)
+        stream_index = 0 if common_random_numbers else scenario_index
+        gen = block_generator(seed, stream_index, block_index, bit_generator)
+        results = engines[engine](
+            cycle_length, scenario, size, gen=gen, sampler=sampler,
+            variance_reduction=variance_reduction,
+        )
+
+        if checkpoint:
+            checkpoint.save_block(scenario_index, block_index, results)
+
+        block_results.append(results)
+
+    return SimulationResultSet.concatenate(block_results)
+
+
+# The worker pool is kept between runs so repeated calls in one process do
+# not pay to start new workers; it is keyed by its number of workers
+_executors = {}
+
+
+def _executor(workers):
+    """Returns a pool with the given number of worker processes.
+
+        Only one pool is kept. A pool of another size is shut down once the
+        work already given to it is done.
+    """
+    if workers not in _executors:
+        for executor in _executors.values():
+            executor.shutdown(wait=False)
+
+        _executors.clear()
+        _executors[workers] = ProcessPoolExecutor(max_workers=workers)
+
+    return _executors[workers]
+
+
+def shutdown_executors():
+    """Stops the worker pool kept between runs.
+
+        This is called when the interpreter exits; call it sooner to free
+        the workers once no more runs are needed.
+    """
+    for executor in _executors.values():
+        executor.shutdown(cancel_futures=True)
+
+    _executors.clear()
+
+
+atexit.register(shutdown_executors)
+
+
+def iter_blocks(
+    scenarios, num_simulations, seed, engine='period', checkpoint=None, workers=1,
+    sampler='binomial', bit_generator='pcg64', variance_reduction='none',
+    common_random_numbers=False,
+):
+    """Simulates every block of every scenario in order.
+
+        With more than one worker the blocks are simulated in separate
+        processes, keeping at most two blocks per worker in flight so memory
+        use stays bounded. The results are the same for any number of
+        workers.
+
+        Yields (scenario index, block index, ``SimulationResultSet``) tuples.
+    """
+    jobs = (
+        (scenario_index, block_index, partial(
+            simulate_blocks, scenario, scenario_index, num_simulations, seed,
+            [block_index], engine, checkpoint, sampler, bit_generator,
+            variance_reduction, common_random_numbers,
+        ))
+        for scenario_index, scenario in enumerate(scenarios)
+        for block_index in range(num_blocks(num_simulations))
+    )
+
+    if workers <= 1:
+        for scenario_index, block_index, job in jobs:
+            yield scenario_index, block_index, job()
+
+        return
+
+    executor = _executor(workers)
+    in_flight = deque()
+
+    for scenario_index, block_index, job in jobs:
+        in_flight.append((scenario_index, block_index, executor.submit(job)))
+
+        if len(in_flight) >= workers * 2:
+            scenario_index, block_index, future = in_flight.popleft()
+            yield scenario_index, block_index, future.result()
+
+    while in_flight:
+        scenario_index, block_index, future = in_flight.popleft()
+        yield scenario_index, block_index, future.result()
+
+
+def run(
+    scenarios=None, num_simulations=1000, seed=None, engine='period', workers=1,
+    checkpoint=None, sampler='binomial', bit_generator='pcg64',
+    variance_reduction='none', common_random_numbers=False,
+):
+    """Simulates scenarios and returns their results.
+
+        This has no side effects beyond the optional checkpoint, so it can
+        be called repeatedly from one process (e.g. a notebook or a sweep
+        over scenario settings).
+
+        Attributes:
+            scenarios (list): the scenarios to simulate; defaults to all of
+                the scenarios in the ``scenarios`` package.
+            num_simulations (int): the number of simulations per scenario.
+            seed (int): the seed for the run; a random seed is used if not
+                provided.
+            engine (str): the name of the engine in ``engines``.
+            workers (int): the number of processes to simulate blocks in.
+            checkpoint (Checkpoint): saves and reloads completed blocks.
+            sampler (str): the name of the sampler in ``samplers.samplers``.
+            bit_generator (str): the name of the bit generator in
+                ``bit_generators``.
+            variance_reduction (str): one of ``samplers.variance_reductions``.
+            common_random_numbers (bool): whether every scenario draws from
+                the same streams, so their simulations are paired.
+
+        Returns a list of (scenario, ``SimulationResultSet``) pairs.
+    """
+    if scenarios is None:
+        scenarios = default_scenarios
+
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+
+    scenario_results = [
+        (scenario, SimulationResultSet.for_scenario(scenario, num_simulations, horizons))
+        for scenario in scenarios
+    ]
+    blocks = iter_blocks(
+        scenarios, num_simulations, seed, engine, checkpoint, workers, sampler,
+        bit_generator, variance_reduction, common_random_numbers,
+    )
+
+    for scenario_index, block_index, block in blocks:
+        results = scenario_results[scenario_index][1]
+        results.fill(block_index * stream_block_size, block)
+
+    return scenario_results
@@ -0,0 +1,334 @@
+"""Strategies for sampling the weekly event occurrences.
+
+    Each sampler draws the number of occurrences of an event for every
+    simulation, week and notice period, given the number of shifts that
+    could be affected (the trials) and the weekly rates. The exact draw is
+    one binomial per notice period; the others trade a small, bounded error
+    for fewer or cheaper random numbers.
+
+    The error bounds are the largest distance between the exact and the
+    approximate distribution of any week's occurrences. The binomial and
+    Poisson bounds are total variation distances; the normal bound is the
+    Berry-Esseen bound on the difference between the distribution
+    functions. ``choose_sampler`` uses them to pick the cheapest sampler
+    that is accurate enough for an event.
+
+    A size of None means the rates already have the simulations as their
+    first axis, as they do when each simulation draws its own rates.
+"""
+import math
+
+import numpy as np
+
+
+# The largest error bound the automatic sampler accepts
+auto_tolerance = 0.01
+
+# The variance reduction methods that can be selected for a run. Antithetic
+# and stratified sampling change how the uniforms behind each draw are
+# chosen; control variates only change how the means are estimated.
+variance_reductions = ('none', 'antithetic', 'stratified', 'control_variates')
+
+# The number of simulations that are stratified together
+stratum_size = 100
+
+
+def _shape(size, trials, rates):
+    shape = np.broadcast_shapes(np.shape(trials), np.shape(rates))
+
+    return shape if size is None else (size,) + shape
+
+
+def _week_trials(trials):
+    """Drops the notice period axis from an array of trials."""
+    trials = np.asarray(trials)
+
+    return trials[..., 0] if trials.ndim else trials
+
+
+def sample_binomial(gen, trials, rates, size):
+    """Draws each notice period from its own binomial distribution (exact)."""
+    return gen.binomial(trials, rates, size=_shape(size, trials, rates))
+
+
+def sample_multinomial(gen, trials, rates, size):
+    """Draws the weekly total once and splits it across notice periods.
+
+        The total comes from one binomial on the summed rate and is split
+        with a binomial per remaining notice period on the (small) total.
+        Unlike the exact draw, each trial can only count towards one notice
+        period; the distributions differ by at most
+        ``trials * sum(p_i * p_j for i < j)``. For the same reason, rates
+        that sum to more than 1 are scaled down to sum to 1, so every trial
+        has an occurrence split across the notice periods by their rates.
+    """
+    shape = _shape(size, trials, rates)
+    outcomes = np.zeros(shape, dtype=np.int64)
+
+    # Only notice periods with some chance of occurring need a split
+    active = np.flatnonzero(np.reshape(rates, (-1, shape[-1])).any(axis=0))
+
+    if not len(active):
+        return outcomes
+
+    rates = np.asarray(rates, dtype=float)
+    total_rate = rates[..., active].sum(axis=-1, keepdims=True)
+
+    if (total_rate > 1).any():
+        rates = rates / np.maximum(total_rate, 1)
+
+    remaining_rate = rates[..., active].sum(axis=-1)
+    remaining = gen.binomial(_week_trials(trials), remaining_rate, size=shape[:-1])
+
+    for period in active[:-1]:
+        share = np.divide(
+            rates[..., period], remaining_rate,
+            out=np.zeros_like(remaining_rate), where=remaining_rate > 0,
+        )
+        outcomes[..., period] = gen.binomial(remaining, np.clip(share, 0, 1))
+        remaining -= outcomes[..., period]
+        remaining_rate = remaining_rate - rates[..., period]
+
+    outcomes[..., active[-1]] = remaining
+
+    return outcomes
+
+
+def sample_poisson(gen, trials, rates, size):
+    """Draws each notice period from a Poisson distribution.
+
+        Suits the small rates of most events. By Barbour and Hall the total
+        variation distance from the binomial is at most
+        ``(1 - exp(-trials * p)) * p``. Draws are capped at the number of
+        trials.
+    """
+    outcomes = gen.poisson(
+        np.multiply(trials, rates), size=_shape(size, trials, rates)
+    )
+
+    return np.minimum(outcomes, trials)
+
+
+def sample_normal(gen, trials, rates, size):
+    """Draws each notice period from a rounded normal distribution.
+
+        Only accurate when ``trials * p * (1 - p)`` is large; the
+        Berry-Esseen bound on the error is
+        ``0.4748 * (p**2 + (1 - p)**2) / sqrt(trials * p * (1 - p))``.
+    """
+    mean = np.multiply(trials, rates)
+    std = np.sqrt(mean * (1 - np.asarray(rates)))
+    outcomes = np.rint(gen.normal(mean, std, size=_shape(size, trials, rates)))
+
+    return np.clip(outcomes, 0, trials).astype(np.int64)
+
+
+def binomial_inverse_cdf(trials, rates, uniforms):
+    """Returns the binomial counts at which the CDF reaches each uniform.
+
+        Attributes:
+            trials (int): the number of trials.
+            rates (np.ndarray): the probability of success for each cell,
+                e.g. of shape (weeks, horizons).
+            uniforms (np.ndarray): uniform random numbers with ``rates`` as
+                their trailing dimensions.
+    """
+    rates = np.asarray(rates, dtype=float)
+
+    if rates.shape == uniforms.shape:
+        return _binomial_inverse_cdf_cells(trials, rates, uniforms)
+
+    outcomes = np.zeros(uniforms.shape, dtype=np.int64)
+
+    # Cells with a zero rate never have any successes
+    active = rates > 0
+
+    if not active.any():
+        return outcomes
+
+    cdf = binomial_cdf_table(trials, rates[active])
+    width = cdf.shape[1]
+
+    # Offset each cell's CDF so all cells can be searched in one sorted array
+    cells = np.arange(len(cdf))
+    indices = np.searchsorted(
+        (cdf + 2 * cells[:, np.newaxis]).ravel(), uniforms[..., active] + 2 * cells
+    )
+    outcomes[..., active] = np.minimum(indices - cells * width, trials)
+
+    return outcomes
+
+
+def binomial_cdf_table(trials, rates):
+    """Returns the binomial CDF of each rate, of shape (rates, counts).
+
+        Uniforms are below 1 - 2^-53, so the table is cut off once every
+        rate's CDF reaches that; a shorter table is much faster to search.
+    """
+    counts = np.arange(trials + 1)
+    log_choose = np.array([
+        math.lgamma(trials + 1) - math.lgamma(k + 1) - math.lgamma(trials - k + 1)
+        for k in counts
+    ])
+    rates = np.asarray(rates, dtype=float)[:, np.newaxis]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_pmf = (
+            log_choose
+            + np.where(counts > 0, counts * np.log(rates), 0)
+            + np.where(counts < trials, (trials - counts) * np.log1p(-rates), 0)
+        )
+
+    cdf = np.cumsum(np.exp(log_pmf), axis=-1)
+    reached = cdf >= 1 - 2 ** -53
+    width = reached.argmax(axis=1).max() + 1 if reached.any(axis=1).all() else trials + 1
+
+    return cdf[:, :width]
+
+
+def _binomial_inverse_cdf_cells(trials, rates, uniforms):
+    """Inverts the binomial CDF when every uniform has its own rate.
+
+        A table per cell would be too large, so the CDF of every cell is
+        stepped up one count at a time from the ratio of successive
+        probabilities, only for the cells that have not yet reached their
+        uniform. The number of steps is the largest count drawn.
+    """
+    outcomes = np.zeros(uniforms.shape, dtype=np.int64)
+    cells = np.flatnonzero(rates > 0)
+    outcomes.flat[cells[rates.flat[cells] >= 1]] = trials
+    cells = cells[rates.flat[cells] < 1]
+
+    p = rates.flat[cells]
+    log_odds = np.log(p) - np.log1p(-p)
+    log_pmf = trials * np.log1p(-p)
+    cdf = np.exp(log_pmf)
+    targets = uniforms.flat[cells]
+
+    # Positions (into ``cells``) of the cells still below their uniform
+    pending = np.flatnonzero(cdf < targets)
+
+    for count in range(1, trials + 1):
+        if not len(pending):
+            break
+
+        log_pmf[pending] += math.log((trials - count + 1) / count) + log_odds[pending]
+        cdf[pending] += np.exp(log_pmf[pending])
+        outcomes.flat[cells[pending]] = count
+        pending = pending[cdf[pending] < targets[pending]]
+
+    return outcomes
+
+
+def antithetic_uniforms(gen, shape):
+    """Returns uniforms where each pair of simulations mirror each other.
+
+        Simulations 2k and 2k + 1 use u and 1 - u, so a high-loss
+        simulation is paired with a low-loss one. With an odd number of
+        simulations the last one has no pair.
+    """
+    size = shape[0]
+    half = gen.random(((size + 1) // 2,) + tuple(shape[1:]))
+
+    return np.stack([half, 1 - half], axis=1).reshape((-1,) + half.shape[1:])[:size]
+
+
+def stratified_uniforms(gen, shape):
+    """Returns uniforms stratified across groups of simulations.
+
+        Within each group of ``stratum_size`` simulations, every week and
+        notice period has exactly one uniform in each of the equal width
+        strata of [0, 1) (a Latin hypercube), so every group covers the
+        whole range of weekly losses, including the high-loss tail.
+    """
+    size = shape[0]
+    uniforms = np.empty(shape)
+
+    for start in range(0, size, stratum_size):
+        group = uniforms[start:start + stratum_size]
+        strata = np.argsort(gen.random(group.shape), axis=0)
+        group[:] = (strata + gen.random(group.shape)) / len(group)
+
+    return uniforms
+
+
+# The uniforms used by each sampling based variance reduction method, and
+# the number of consecutive simulations that are sampled together
+uniform_designs = {
+    'antithetic': antithetic_uniforms,
+    'stratified': stratified_uniforms,
+}
+design_group_sizes = {
+    'antithetic': 2,
+    'stratified': stratum_size,
+}
+
+
+def _multinomial_bound(trials, rates):
+    rates = np.asarray(rates)
+    pairs = (rates.sum(axis=-1) ** 2 - (rates ** 2).sum(axis=-1)) / 2
+
+    return np.max(_week_trials(trials) * pairs)
+
+
+def _poisson_bound(trials, rates):
+    return np.max((1 - np.exp(-np.multiply(trials, rates))) * rates)
+
+
+def _normal_bound(trials, rates):
+    rates = np.broadcast_to(rates, np.broadcast_shapes(np.shape(trials), np.shape(rates)))
+    trials = np.broadcast_to(trials, rates.shape)
+
+    # Rates of 0 or 1 are drawn exactly
+    uncertain = (rates > 0) & (rates < 1)
+
+    if not uncertain.any():
+        return 0.0
+
+    p = rates[uncertain]
+    variance = trials[uncertain] * p * (1 - p)
+
+    return np.max(0.4748 * (p ** 2 + (1 - p) ** 2) / np.sqrt(variance))
+
+
+# The error bound for each sampler, from the cheapest sampler to the most
+# expensive; the automatic sampler checks them in this order
+error_bounds = {
+    'normal': _normal_bound,
+    'poisson': _poisson_bound,
+    'multinomial': _multinomial_bound,
+    'binomial': lambda trials, rates: 0.0,
+}
+
+
+def choose_sampler(trials, rates, tolerance=None):
+    """Returns the name of the cheapest sampler within the tolerance.
+
+        Attributes:
+            trials (int): the number of trials (or an array of them).
+            rates (np.ndarray): the weekly rates of shape
+                (..., weeks, notice periods).
+            tolerance (flt): the largest error bound to accept; defaults to
+                ``auto_tolerance``.
+    """
+    if tolerance is None:
+        tolerance = auto_tolerance
+
+    for name, bound in error_bounds.items():
+        if bound(trials, rates) <= tolerance:
+            return name
+
+
+def sample_auto(gen, trials, rates, size):
+    """Draws with the cheapest sampler within ``auto_tolerance``."""
+    return samplers[choose_sampler(trials, rates)](gen, trials, rates, size)
+
+
+# The samplers that can be selected for a run
+samplers = {
+    'binomial': sample_binomial,
+    'multinomial': sample_multinomial,
+    'poisson': sample_poisson,
+    'normal': sample_normal,
+    'auto': sample_auto,
+}
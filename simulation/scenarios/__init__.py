@@ -3,7 +3,9 @@ from .combined_teams import scenario as scenario_combined
 from .current import scenario as scenario_current
 from .no_im import scenario as scenario_no_im
 from .status_quo import scenario as scenario_status_quo
-from .utils import cycle_length, Stats
+from .utils import (
+    cycle_length, horizons, horizon_labels, MeanEstimate, RiskMetrics, Stats,
+)
 
 scenarios = [
     scenario_current, 
@@ -73,6 +73,7 @@ vacation = Event(
     losses=standard_loss_rate,
     r4=calculated_vacation_rate * 0.2,
     r12=calculated_vacation_rate * 0.8,
+    bank='vacation',
 )
 
 
@@ -135,6 +136,8 @@ medical = Event(
 #   their bank, but this is a good worst-case scenario to use.
 # - If estimating the PL rate, can use number of PL days for all staff
 #   divided by the number of shifts for the simulation cycle.
+# - The staff-level simulation applies the limit to each person's PL bank
+#   rather than to the pooled maximum.
 max_pl = (staff['regular'] * 3)
 estimated_pl_rate = max_pl / number_of_shifts
 
@@ -147,6 +150,7 @@ personal_leave = Event(
     r0=estimated_pl_rate * 0.5,
     r2=estimated_pl_rate * 0.5,
     cycle_max=max_pl,
+    bank='pl',
 )
 
 # Project Events
@@ -170,6 +174,8 @@ project = Event(
 # - This event tracks any type of education day.
 # - A maximum of 2 per staff member is likely reasonable, as that is the 
 #   standard number of Professional Development days given to each staff member
+# - The staff-level simulation applies the limit to each person's allowance
+#   rather than to the pooled maximum.
 calculated_education_rate = 0.0147
 education_max = 2 * (staff['regular'] + staff['bece'] + staff['casual'])
 
@@ -182,6 +188,7 @@ education = Event(
     r4=calculated_education_rate * 0.3,
     r12=calculated_education_rate * 0.7,
     cycle_max=education_max,
+    bank='education',
 )
 
 # New Hire Orientation Events
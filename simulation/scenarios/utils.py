@@ -1,10 +1,188 @@
 """Utility classes and functions to help create different scenarios."""
+from statistics import NormalDist
+
 import numpy as np
 
 
 # The length (in weeks) to run each simulation for
 cycle_length = 52
 
+# The notice periods (in weeks) that event rates, counts and shift changes
+# are broken down by. Each value is the lower edge of a period, which runs
+# until the next edge; the last period is open ended. Events set the rate for
+# a period with an ``r<edge>`` keyword (e.g. ``r2`` for 2 to 4 weeks).
+horizons = [0, 2, 4, 12]
+
+# The week of the year (1 to 52) that each simulation cycle starts on; used
+# to line the named seasonal profiles up with the calendar
+cycle_start_week = 1
+
+
+def horizon_labels(edges=None):
+    """Returns a readable label for each notice period.
+
+        Attributes:
+            edges (list): the notice period edges; defaults to ``horizons``.
+    """
+    edges = horizons if edges is None else edges
+    labels = [f'{start} to {end}' for start, end in zip(edges, edges[1:])]
+    labels.append(f'{edges[-1]}+')
+
+    return labels
+
+
+def _seasonal_peaks(peaks, weeks):
+    """Builds a weekly profile from one or more seasonal peaks.
+
+        Attributes:
+            peaks (list): a list of (week of year, width in weeks, height)
+                tuples; each peak is added on top of a flat baseline of 1.
+            weeks (int): the number of weeks to build the profile for.
+    """
+    week_of_year = (cycle_start_week - 1 + np.arange(weeks)) % 52 + 1
+    profile = np.ones(weeks)
+
+    for peak_week, width, height in peaks:
+        # Distance is measured around the calendar so that peaks near the
+        # new year wrap correctly
+        distance = np.abs(week_of_year - peak_week)
+        distance = np.minimum(distance, 52 - distance)
+        profile += height * np.exp(-0.5 * (distance / width) ** 2)
+
+    return profile
+
+
+# Named seasonal profiles that can be assigned to an event; each returns the
+# relative weekly weighting for the requested number of weeks. Apart from
+# 'flat', these are illustrative shapes rather than fits to our data, so
+# the shipped scenarios do not use them; an event only follows one when it
+# is given explicitly (e.g. ``profile='flu_season'``).
+seasonal_profiles = {
+    'flat': lambda weeks: np.ones(weeks),
+    # Influenza season peaks around the middle of January
+    'flu_season': lambda weeks: _seasonal_peaks([(3, 4, 1.0)], weeks),
+    # Summer holidays peak around the end of July
+    'summer': lambda weeks: _seasonal_peaks([(30, 4, 1.5)], weeks),
+    # Summer holidays plus the Christmas break
+    'summer_christmas': lambda weeks: _seasonal_peaks(
+        [(30, 4, 1.5), (52, 1, 2.0)], weeks
+    ),
+}
+
+# Default per-person entitlements used by the staff-level simulation when a
+# scenario does not provide its own. Keys match the ``bank`` of an event.
+default_entitlements = {
+    # Personal leave days loaded into each bank at the start of the cycle
+    'pl': {'regular': 3, 'bece': 0, 'casual': 0},
+    # Professional development days given to each staff member per cycle
+    'education': {'regular': 2, 'bece': 2, 'casual': 2},
+    # Vacation days accrued per FTE per year. The pooled vacation rate covers
+    # every employee, so casual staff accrue the same days for the staff
+    # engine to match it
+    'vacation': {'regular': 20, 'bece': 20, 'casual': 20},
+}
+
+class Shock:
+    """A weekly multiplier on the rates of a group of correlated events.
+
+        Some events rise and fall together, such as sick days, medical leave
+        and bereavement during an outbreak. Each week of each simulation
+        draws one multiplier from a Gamma distribution with a mean of 1, and
+        every event linked to the shock has its rates scaled by it. This
+        keeps each event's expected rate while making their weekly counts
+        correlated, which fattens the tail of the weekly losses.
+
+        Attributes:
+            name (str): the name of the shock.
+            variance (flt): the variance of the weekly multiplier; 0.25
+                means a typical week is about 50% above or below the usual
+                rates.
+    """
+    def __init__(self, name, variance):
+        if variance <= 0:
+            raise ValueError(f'The variance of {name} must be positive')
+
+        self.name = name
+        self.variance = variance
+
+    def multipliers(self, gen, size, weeks):
+        """Draws the multiplier of each simulation and week."""
+        return gen.gamma(1 / self.variance, self.variance, size=(size, weeks))
+
+    def __str__(self):
+        """String representation of a shock."""
+        return f'Shock: {self.name}'
+
+
+class FollowOn:
+    """Occurrences of one event that another event causes later on.
+
+        For example, each departure leads to a new hire some weeks later,
+        whose orientation then takes shifts over the following weeks. Every
+        occurrence of the triggering event starts a follow-on after a random
+        delay, and the follow-on occurrences are spread evenly over the
+        weeks from its start. The notice period of each follow-on occurrence
+        is the number of weeks since the trigger.
+
+        Attributes:
+            event (str): the name of the event that follows.
+            occurrences (flt): the follow-on occurrences per occurrence of
+                the triggering event; a fraction of an occurrence in a week
+                happens with that probability.
+            delay (int|list): the weeks from the trigger to the start of the
+                follow-on. Either a fixed number of weeks or the probability
+                of each delay from 0 weeks up.
+            duration (int): the number of weeks the occurrences are spread
+                over.
+    """
+    def __init__(self, event, occurrences, delay=0, duration=1):
+        if isinstance(delay, int):
+            delays = np.zeros(delay + 1)
+            delays[delay] = 1
+        else:
+            delays = np.asarray(delay, dtype=float)
+
+        if delays.ndim != 1 or not len(delays) or (delays < 0).any():
+            raise ValueError(f'Invalid delay for follow on {event}: {delay}')
+
+        if duration < 1:
+            raise ValueError(f'Follow on {event} must last at least one week')
+
+        self.event = event
+        self.occurrences = occurrences
+        self.delays = delays / delays.sum()
+        self.duration = duration
+
+    def week_counts(self, triggers, gen):
+        """Splits the follow-ons of groups of triggers across their weeks.
+
+            Each week gets the whole occurrences it expects, plus one more
+            with a probability of the fraction left over, so the expected
+            occurrences are kept however small they are.
+
+            Attributes:
+                triggers (np.ndarray): the counts of triggers.
+                gen (np.random.Generator): the generator for the fractions.
+
+            Returns an array with the occurrences in each week of the
+            follow-on (in its last axis) for each count of triggers.
+        """
+        expected = np.multiply.outer(
+            triggers, np.full(self.duration, self.occurrences / self.duration)
+        )
+        counts = np.floor(expected)
+        fractions = expected - counts
+
+        if fractions.any():
+            counts += gen.random(expected.shape) < fractions
+
+        return counts.astype(np.int64)
+
+    def __str__(self):
+        """String representation of a follow on."""
+        return f'Follow On: {self.event}'
+
+
 class Event:
     """Represents a type of event and its weekly rate of occurence.
 
@@ -14,27 +192,171 @@ class Event:
                 this event.
             losses (flt): the capacity lost (in number of shifts) per 
                 occurrence of this event.
-            rate_0 (flt): the weekly event rate between 0 to 2 weeks in
-                the future.
-            rate_2 (flt): the weekly event rate between 2 to 4 weeks in
-                the future.
-            rate_4 (flt): the weekly event rate between 4 to 12 weeks in
-                the future.
-            rate_12 (flt): the weekly event rate after 12 weeks in the future.
-            
+            rates (np.ndarray): the weekly event rate for each notice period
+                in ``horizons``. Rates may be given as a list or with one
+                ``r<edge>`` keyword per period (e.g. ``r0=0.01, r12=0.05``);
+                periods that are not given have a rate of 0.
+            rate_total (flt): the weekly event rate across all periods.
             cycle_max (flt): the maximum number of times this event can 
                 occur within the simulation cycle.
+            profile (str|list): the seasonal variation of the event rates.
+                Either the name of one of the ``seasonal_profiles`` or a
+                list of relative weekly weights of length ``cycle_length``.
+                Weights are scaled to average 1, so the profile moves
+                events between weeks without changing the cycle total.
+                Defaults to a flat profile.
+            bank (str): the per-person entitlement that limits this event in
+                the staff-level simulation (one of the keys in
+                ``default_entitlements``). Events without a bank are not
+                limited per person.
+            rate_concentration (flt): makes the total rate uncertain. Each
+                simulation draws its total rate from a Beta distribution
+                with a mean of ``rate_total`` and this concentration (the
+                sum of its two parameters), which is roughly the number of
+                shift-weeks the estimate is based on. None treats the rate
+                as exact.
+            split_concentration (flt): makes the split of the rate across
+                notice periods uncertain. Each simulation draws its split
+                from a Dirichlet distribution with a mean of the given split
+                and this concentration, which is roughly the number of
+                occurrences the split is based on. None treats the split
+                as exact.
+            shock (Shock): the shared weekly shock that scales this event's
+                rates, if it is correlated with other events.
+            follow_ons (list): the ``FollowOn`` events that each occurrence
+                of this event causes.
     """
-    def __init__(self, name, changes, losses, r0=0, r2=0, r4=0, r12=0, cycle_max=None):
+    def __init__(
+        self, name, changes, losses, rates=None, cycle_max=None, profile=None,
+        bank=None, rate_concentration=None, split_concentration=None, shock=None,
+        follow_ons=None, **horizon_rates,
+    ):
         self.name = name
         self.changes = changes
         self.losses = losses
-        self.rate_0 = r0
-        self.rate_2 = r2
-        self.rate_4 = r4
-        self.rate_12 = r12
-        self.rate_total = r0 + r2 + r4 + r12
+
+        if rates is None:
+            rates = []
+
+            for edge in horizons:
+                rates.append(horizon_rates.pop(f'r{edge}', 0))
+
+        if horizon_rates:
+            raise TypeError(f'Unexpected event rates: {", ".join(horizon_rates)}')
+
+        self.set_rates(rates)
         self.cycle_max = cycle_max
+        self.bank = bank
+
+        for concentration in (rate_concentration, split_concentration):
+            if concentration is not None and concentration <= 0:
+                raise ValueError(f'Concentrations for {name} must be positive')
+
+        self.rate_concentration = rate_concentration
+        self.split_concentration = split_concentration
+        self.shock = shock
+        self.follow_ons = list(follow_ons or [])
+
+        if profile is None:
+            profile = 'flat'
+
+        if isinstance(profile, str):
+            if profile not in seasonal_profiles:
+                raise ValueError(f'Unknown seasonal profile: {profile}')
+
+            self.profile_name = profile
+            self.profile = seasonal_profiles[profile](cycle_length)
+        else:
+            if len(profile) != cycle_length:
+                raise ValueError(
+                    f'Profile for {name} must have {cycle_length} weeks, '
+                    f'not {len(profile)}'
+                )
+
+            self.profile_name = 'custom'
+            self.profile = np.asarray(profile, dtype=float)
+
+        # Normalize so the profile averages to 1 across the cycle
+        self.profile = self.profile / np.mean(self.profile)
+
+    def set_rates(self, rates):
+        """Sets the event rate for each notice period in ``horizons``."""
+        if len(rates) != len(horizons):
+            raise ValueError(
+                f'Rates for {self.name} must have {len(horizons)} notice '
+                f'periods, not {len(rates)}'
+            )
+
+        rates = np.asarray(rates, dtype=float)
+
+        if not ((rates >= 0) & (rates <= 1)).all():
+            raise ValueError(f'Rates for {self.name} must be from 0 to 1')
+
+        self.rates = rates
+        self.rate_total = self.rates.sum()
+
+    @property
+    def uncertain(self):
+        """Whether each simulation draws its own rates."""
+        return self.rate_total > 0 and (
+            self.rate_concentration is not None
+            or self.split_concentration is not None
+        )
+
+    def simulation_rates(self, gen, size):
+        """Draws the rates of each simulation from their distributions.
+
+            Returns an array of shape (simulations, notice periods). Nothing
+            is drawn for an exact total or split, so events without any
+            uncertainty use no random numbers.
+        """
+        totals = np.full(size, self.rate_total)
+        shares = np.broadcast_to(self.rates / self.rate_total, (size, len(self.rates)))
+
+        if self.rate_concentration is not None and self.rate_total < 1:
+            totals = gen.beta(
+                self.rate_concentration * self.rate_total,
+                self.rate_concentration * (1 - self.rate_total),
+                size=size,
+            )
+
+        # Notice periods with no rate stay at 0
+        active = self.rates > 0
+
+        if self.split_concentration is not None and active.sum() > 1:
+            shares = np.zeros((size, len(self.rates)))
+            shares[:, active] = gen.dirichlet(
+                self.split_concentration * self.rates[active] / self.rate_total,
+                size=size,
+            )
+
+        return totals[:, np.newaxis] * shares
+
+    def weekly_rates(self, weeks, rates=None, multipliers=None):
+        """Returns the event rates for each week and notice period.
+
+            The profile repeats if more weeks are requested than are in the
+            cycle. Returns an array of shape (weeks, notice periods).
+
+            Attributes:
+                weeks (int): the number of weeks.
+                rates (np.ndarray): rates to use instead of ``rates``, such
+                    as those from ``simulation_rates``; any leading axes are
+                    kept, giving an array of shape (..., weeks, notice
+                    periods).
+                multipliers (np.ndarray): the shock multipliers of each
+                    simulation and week (see ``Shock.multipliers``), which
+                    give an array of shape (simulations, weeks, notice
+                    periods).
+        """
+        weights = np.resize(self.profile, weeks)
+        rates = self.rates if rates is None else np.asarray(rates)[..., np.newaxis, :]
+
+        if multipliers is not None:
+            weights = weights * multipliers
+
+        # Rates are probabilities, so keep peak weeks from exceeding 1
+        return np.minimum(weights[..., np.newaxis] * rates, 1)
 
     def __str__(self):
         """String representation for the class"""
@@ -45,16 +367,88 @@ class Shift:
     
         Attributes:
             name (str): a description of the shift group.
+            number (flt): the number of shifts in the group each week.
+            priority (int): the order the groups are covered in; 1 first.
+            minimum (flt): the fewest shifts the group can run with, which
+                the minimum staffing allocation covers for every group
+                before the rest of any group. Defaults to ``number``.
+            weight (flt): the group's share of the capacity, relative to
+                the others of its priority, when the capacity is split
+                between them. Shares are in proportion to the weight times
+                the shifts needed.
     """
-    def __init__(self, name, number, priority=1):
+    def __init__(self, name, number, priority=1, minimum=None, weight=1):
         self.name = name
         self.number = number
         self.priority = priority
+        self.minimum = number if minimum is None else minimum
+        self.weight = weight
+
+        if not number > 0:
+            raise ValueError(f'{name} must have more than 0 shifts')
+        if not 0 <= self.minimum <= number:
+            raise ValueError(f'The minimum for {name} must be from 0 to {number}')
+        if not weight > 0:
+            raise ValueError(f'The weight for {name} must be more than 0')
 
     def __str__(self):
         """String representation of a shift."""
         return f'Shift Group: {self.name}'
     
+class CapacityResponse:
+    """How staff respond to weeks that are short of capacity.
+
+        When the capacity left after events cannot cover every shift, part
+        time staff pick up extra whole shifts, up to a limit per employee
+        of each type, and each shift they could pick up is available with
+        some probability. Overtime covers what is still short, up to a
+        weekly limit, before shifts go uncovered. Extra shifts are only
+        worked when they are needed, so they never add to the excess.
+
+        Attributes:
+            pickup (dict): employee types (``regular``, ``bece`` or
+                ``casual``) mapped to the most extra shifts each employee
+                of that type picks up in a week.
+            pickup_probability (flt): the chance each of those extra shifts
+                is available when it is needed.
+            overtime (int): the most overtime shifts worked in a week.
+    """
+    def __init__(self, pickup=None, pickup_probability=1, overtime=0):
+        self.pickup = dict(pickup or {})
+
+        for employee_type in self.pickup:
+            if employee_type not in ('regular', 'bece', 'casual'):
+                raise ValueError(f'Unknown employee type: {employee_type}')
+
+        self.pickup_probability = pickup_probability
+        self.overtime = overtime
+
+    def pickup_limit(self, staff):
+        """Returns the most extra shifts the staff could pick up in a week."""
+        return int(sum(
+            getattr(staff, employee_type) * shifts
+            for employee_type, shifts in self.pickup.items()
+        ))
+
+    def available(self, gen, staff, size, weeks):
+        """Draws the extra shifts available in each simulation and week.
+
+            Every possible extra shift is equally likely to be available, so
+            the total is a single binomial draw per week. Nothing is drawn
+            when every shift is certain to be available.
+        """
+        limit = self.pickup_limit(staff)
+
+        if self.pickup_probability >= 1:
+            return np.full((size, weeks), limit)
+
+        return gen.binomial(limit, self.pickup_probability, size=(size, weeks))
+
+    def __str__(self):
+        """String representation of a capacity response."""
+        return f'Capacity Response: {self.pickup}, {self.overtime} overtime'
+
+
 class ScenarioDetails:
     class _FTEDefinitions:
         """Class to define what an FTE is.
@@ -76,6 +470,9 @@ class ScenarioDetails:
                 self.casual = casual
                 self.total = total
 
+                if not min(regular, bece, casual, total) >= 0:
+                    raise ValueError('Employee type values cannot be negative')
+
     class _FTEScenarios:
         """Defines the different types of FTE scenarios."""
         def __init__(self, data):
@@ -99,7 +496,10 @@ class ScenarioDetails:
             except KeyError as e:
                 raise TypeError(f'Missing argument: {e}')
         
-    def __init__(self, name, fte, staff, events, shifts):
+    def __init__(
+        self, name, fte, staff, events, shifts, entitlements=None,
+        capacity_response=None, allocation_policy='strict',
+    ):
         self.name = name
         self.fte_definitions = self._FTEDefinitions()
         self.fte = self._FTEScenarios(fte)
@@ -109,22 +509,370 @@ class ScenarioDetails:
             staff['casual'],
             staff['total'],
         )
+        self.entitlements = entitlements or default_entitlements
         self.events = events
         self.shifts = sorted(shifts, key=lambda x: (x.priority, x.name))
+        self.capacity_response = capacity_response
+        self.allocation_policy = allocation_policy
+
+    @property
+    def event_order(self):
+        """The indices of the events in the order they are simulated.
+
+            Events come after every event that causes them (see
+            ``FollowOn``) and otherwise keep their order.
+        """
+        names = [event.name for event in self.events]
+        causes = {name: set() for name in names}
+
+        for event in self.events:
+            for follow_on in event.follow_ons:
+                if follow_on.event not in causes:
+                    raise ValueError(
+                        f'Unknown follow on event for {event.name}: {follow_on.event}'
+                    )
+
+                causes[follow_on.event].add(event.name)
+
+        order = []
+        remaining = list(names)
+
+        while remaining:
+            ready = [name for name in remaining if not causes[name] - set(order)]
+
+            if not ready:
+                raise ValueError(f'Follow on events form a cycle: {", ".join(remaining)}')
+
+            order.append(ready[0])
+            remaining.remove(ready[0])
+
+        return [names.index(name) for name in order]
+
+    @property
+    def shocks(self):
+        """The shocks shared by the scenario's events, in event order."""
+        shocks = {}
+
+        for event in self.events:
+            if event.shock is not None:
+                shocks.setdefault(event.shock.name, event.shock)
+
+        return list(shocks.values())
         
     def __str__(self):
         """String representation of the class for printing."""
         return f'Scenario Name: {self.name}'
 
+def bootstrap_intervals(
+    values, quantiles=(), replicates=1000, confidence=0.95, group_size=1, gen=None,
+    batch_elements=2**24,
+):
+    """Bootstraps confidence intervals for the means and quantiles of metrics.
+
+        Every metric is resampled with the same index matrices, which are
+        drawn in batches and turned into a count of how often each
+        simulation was drawn. The resampled means of all metrics are then a
+        single matrix product. A resampled quantile only depends on the
+        counts of the simulations ranked near it, so the counts below a
+        window of about six standard errors around its rank are summed in a
+        second product, with indicators of the simulations below each
+        window made from their ranks, and only the window is searched.
+
+        Attributes:
+            values (np.ndarray): the metrics of shape (metrics, simulations).
+            quantiles (tuple): the quantiles to find intervals for.
+            replicates (int): the number of bootstrap replicates.
+            confidence (flt): the confidence level of the intervals.
+            group_size (int): the number of consecutive simulations sampled
+                together (see ``MeanEstimate``); groups are resampled whole.
+            gen (np.random.Generator): the generator to resample with.
+            batch_elements (int): the size of each batch of index matrices
+                and of each chunk of indicators; bounds the memory used.
+
+        Returns the (lower, upper) mean intervals of shape (metrics, 2) and
+        the quantile intervals of shape (metrics, quantiles, 2).
+    """
+    if gen is None:
+        gen = np.random.default_rng()
+
+    values = np.asarray(values, dtype=float)
+    num_metrics, num_simulations = values.shape
+    group = np.arange(num_simulations) // group_size
+    num_groups = group[-1] + 1
+
+    # The window of ranks searched for each quantile
+    quantiles = np.asarray(quantiles, dtype=float)
+    targets = quantiles * num_simulations
+    centre = np.ceil(targets).astype(int) - 1
+    half_width = np.ceil(6 * np.sqrt(targets * (1 - quantiles))).astype(int) + 1
+    lower = np.maximum(centre - half_width, 0)
+    upper = np.minimum(centre + half_width + 1, num_simulations)
+
+    orders = np.argsort(values, axis=1, kind='stable')
+    sorted_values = np.take_along_axis(values, orders, axis=1)
+
+    # The rank of each simulation in each metric, of shape (simulations,
+    # metrics)
+    ranks = np.empty_like(orders)
+    np.put_along_axis(ranks, orders, np.arange(num_simulations), axis=1)
+    ranks = ranks.T
+
+    # The means are a product of the counts with the centred values, and
+    # the counts below each window are a product with indicators of the
+    # simulations ranked below it. The indicators are made from the ranks
+    # for a chunk of metrics at a time, so at most ``batch_elements`` are
+    # held; they are kept between batches if every metric fits in one
+    # chunk. The counts are whole numbers, so single precision keeps them
+    # exact and halves the cost of the products.
+    centres = values.mean(axis=1)
+    centred = (values - centres[:, np.newaxis]).T.astype(np.float32)
+    chunk_size = max(batch_elements // (num_simulations * max(len(quantiles), 1)), 1)
+    chunks = [
+        slice(first, first + chunk_size) for first in range(0, num_metrics, chunk_size)
+    ] if len(quantiles) else []
+
+    def indicators(chunk):
+        return (ranks[:, chunk, np.newaxis] < lower).reshape(
+            num_simulations, -1
+        ).astype(np.float32)
+
+    kept = indicators(chunks[0]) if len(chunks) == 1 else None
+
+    batch_size = max(batch_elements // num_groups, 1)
+    means = np.empty((replicates, num_metrics))
+    resampled = np.empty((replicates, num_metrics, len(quantiles)))
+
+    for start in range(0, replicates, batch_size):
+        size = min(batch_size, replicates - start)
+
+        # Count each group's draws, with the groups as rows so that the
+        # counts in a window are contiguous
+        draws = gen.integers(num_groups, size=(size, num_groups)) * size
+        draws += np.arange(size)[:, np.newaxis]
+        counts = np.bincount(
+            draws.ravel(), minlength=num_groups * size
+        ).reshape(num_groups, size).astype(np.float32)
+
+        if group_size > 1:
+            counts = counts[group]
+
+        means[start:start + size] = centres + (counts.T @ centred) / num_simulations
+        counts_below = np.empty((size, num_metrics, len(quantiles)), dtype=np.float32)
+
+        for chunk in chunks:
+            below = kept if kept is not None else indicators(chunk)
+            counts_below[:, chunk] = (counts.T @ below).reshape(size, -1, len(quantiles))
+
+        for i in range(num_metrics):
+            for j, target in enumerate(targets):
+                window = orders[i, lower[j]:upper[j]]
+                cumulative = counts_below[:, i, j] + np.cumsum(counts[window], axis=0)
+                rank = lower[j] + np.minimum(
+                    (cumulative < target).sum(axis=0), len(window) - 1
+                )
+                resampled[start:start + size, i, j] = sorted_values[i, rank]
+
+    tail = (1 - confidence) / 2
+    mean_intervals = np.quantile(means, [tail, 1 - tail], axis=0)
+    quantile_intervals = np.quantile(resampled, [tail, 1 - tail], axis=0)
+
+    return mean_intervals.T, np.moveaxis(quantile_intervals, 0, -1)
+
+
 class Stats:
-    """Calculates and outputs statistical calculations for results."""
+    """Calculates and outputs statistical calculations for results.
+
+        ``ci_lower`` and ``ci_upper`` hold the middle 95% of the simulation
+        values, which is the range expected for a single cycle. The
+        ``mean_interval`` and ``quantile_interval`` methods give confidence
+        intervals for the mean and quantiles themselves, and ``bootstrap``
+        adds bootstrapped intervals to many ``Stats`` at once.
+
+        Attributes:
+            bootstrap_mean (tuple): the bootstrapped (lower, upper) interval
+                for the mean, or None before ``bootstrap`` is called.
+            bootstrap_quantiles (dict): quantiles mapped to their
+                bootstrapped (lower, upper) intervals.
+    """
     def __init__(self, values):
         self.values = np.array(values)
         self.mean = np.round(np.mean(self.values), 0)
         ci_lower, ci_upper = np.percentile(self.values, [2.5, 97.5])
         self.ci_lower = np.round(ci_lower, 1)
         self.ci_upper = np.round(ci_upper, 1)
+        self.bootstrap_mean = None
+        self.bootstrap_quantiles = {}
+
+    def mean_interval(self, confidence=0.95):
+        """Returns the (lower, upper) normal confidence interval for the mean.
+
+            This treats the simulations as independent, which is
+            conservative for antithetic and stratified runs.
+        """
+        z = NormalDist().inv_cdf((1 + confidence) / 2)
+        mean = np.mean(self.values)
+        standard_error = np.std(self.values, ddof=1) / np.sqrt(len(self.values))
+
+        return mean - z * standard_error, mean + z * standard_error
+
+    def quantile_interval(self, quantile, confidence=0.95):
+        """Returns a quantile and its (lower, upper) confidence interval.
+
+            The interval is between the order statistics whose ranks are the
+            bounds of the binomial count of values below the quantile, so it
+            holds for any distribution.
+        """
+        z = NormalDist().inv_cdf((1 + confidence) / 2)
+        num_values = len(self.values)
+        spread = z * np.sqrt(num_values * quantile * (1 - quantile))
+        ranks = np.clip(
+            [
+                np.ceil(quantile * num_values) - 1,
+                np.floor(quantile * num_values - spread),
+                np.ceil(quantile * num_values + spread),
+            ],
+            0, num_values - 1,
+        ).astype(int)
+        value, lower, upper = np.partition(self.values, ranks)[ranks]
+
+        return value, lower, upper
+
+    @classmethod
+    def bootstrap(
+        cls, stats, quantiles=(), replicates=1000, confidence=0.95, group_size=1,
+        gen=None,
+    ):
+        """Adds bootstrapped intervals to ``Stats`` of the same simulations.
+
+            All of the stats are resampled together (see
+            ``bootstrap_intervals``), so bootstrapping many of them costs
+            little more than one.
+        """
+        mean_intervals, quantile_intervals = bootstrap_intervals(
+            [s.values for s in stats], quantiles, replicates, confidence,
+            group_size, gen,
+        )
+
+        for s, mean_interval, intervals in zip(stats, mean_intervals, quantile_intervals):
+            s.bootstrap_mean = tuple(mean_interval)
+            s.bootstrap_quantiles = dict(zip(quantiles, map(tuple, intervals)))
 
     def __str__(self):
         """String representation of Stats."""
-        return f'Mean = {np.round(self.mean, 2)} (95% CI {np.round(self.ci_lower, 2)}-{np.round(self.ci_upper, 2)})'
\ No newline at end of file
+        return f'Mean = {np.round(self.mean, 2)} (95% CI {np.round(self.ci_lower, 2)}-{np.round(self.ci_upper, 2)})'
+
+class RiskMetrics:
+    """Summarises how often and for how long shifts go uncovered.
+
+        Attributes:
+            short_weeks (np.ndarray): the weeks with an uncovered shift in
+                each simulation.
+            longest_short_run (np.ndarray): the most consecutive weeks with
+                an uncovered shift in each simulation.
+            first_short_week (np.ndarray): the first week with an uncovered
+                shift in each simulation (counted from 1), or 0 if none.
+            weeks (int): the number of weeks in each simulation.
+    """
+    def __init__(self, short_weeks, longest_short_run, first_short_week, weeks):
+        short_weeks = np.asarray(short_weeks)
+        longest_short_run = np.asarray(longest_short_run)
+        first_short_week = np.asarray(first_short_week)
+        first_short_week = first_short_week[first_short_week > 0]
+
+        def percentiles(values, q):
+            if len(values) == 0:
+                return [np.nan] * len(q)
+
+            return np.percentile(values, q, method='inverted_cdf')
+
+        # The chance of any shortfall in a cycle and in any one week
+        self.probability_any = np.round(np.mean(short_weeks > 0), 4)
+        self.probability_week = np.round(np.mean(short_weeks) / weeks, 4)
+
+        # The longest run of short weeks in a cycle
+        self.longest_run_mean = np.round(np.mean(longest_short_run), 2)
+        self.longest_run_median, self.longest_run_95th = percentiles(
+            longest_short_run, [50, 95]
+        )
+
+        # The week of the first shortfall, in the cycles that have one
+        self.first_week_mean = (
+            np.round(np.mean(first_short_week), 2) if len(first_short_week) else np.nan
+        )
+        self.first_week_5th, self.first_week_median = percentiles(
+            first_short_week, [5, 50]
+        )
+
+    def __str__(self):
+        """String representation of RiskMetrics."""
+        return (
+            f'P(any shortfall) = {self.probability_any}, '
+            f'P(short week) = {self.probability_week}, '
+            f'longest run = {self.longest_run_mean} weeks, '
+            f'first shortfall = week {self.first_week_mean}'
+        )
+
+class MeanEstimate:
+    """Estimates a mean and its precision under a variance reduction method.
+
+        Simulations that were sampled together (e.g. antithetic pairs) are
+        not independent, so the standard error comes from the spread of the
+        group totals. With control variates, the mean is adjusted by the
+        difference between the observed and the known means of the controls.
+
+        The effective sample size is the number of independent simulations
+        that would give the same standard error, so a method that halves
+        the variance doubles it.
+
+        Attributes:
+            values (np.ndarray): the value from each simulation.
+            group_size (int): the number of consecutive simulations sampled
+                together.
+            controls (np.ndarray): control variates of shape
+                (controls, simulations).
+            control_means (np.ndarray): the known mean of each control.
+    """
+    def __init__(self, values, group_size=1, controls=None, control_means=None):
+        values = np.asarray(values, dtype=float)
+        num_simulations = len(values)
+
+        if controls is not None and len(controls):
+            deviations = (controls - np.asarray(control_means)[:, np.newaxis]).T
+            centred = deviations - deviations.mean(axis=0)
+            beta = np.linalg.lstsq(centred, values - values.mean(), rcond=None)[0]
+            adjusted = values - deviations @ beta
+        else:
+            adjusted = values
+
+        # Variance of the mean from the totals of each group of simulations
+        groups = np.arange(0, num_simulations, group_size)
+        group_totals = np.add.reduceat(adjusted, groups)
+        group_sizes = np.diff(np.append(groups, num_simulations))
+        mean = adjusted.mean()
+        num_groups = len(groups)
+
+        if num_groups > 1:
+            variance = (
+                np.sum((group_totals - group_sizes * mean) ** 2)
+                * num_groups / (num_groups - 1) / num_simulations ** 2
+            )
+        else:
+            variance = np.nan
+
+        value_variance = np.var(values, ddof=1) if num_simulations > 1 else np.nan
+
+        if variance > 0:
+            effective_sample_size = value_variance / variance
+        else:
+            effective_sample_size = num_simulations
+
+        self.mean = np.round(mean, 2)
+        self.standard_error = np.round(np.sqrt(variance), 3)
+        self.effective_sample_size = np.round(effective_sample_size, 0)
+
+    def __str__(self):
+        """String representation of MeanEstimate."""
+        return (
+            f'Mean = {self.mean} (SE {self.standard_error}, '
+            f'effective sample size {self.effective_sample_size})'
+        )
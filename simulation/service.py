@@ -0,0 +1,486 @@
+"""A local HTTP service for interactive "what if" simulations.
+
+    The service keeps the scenarios, their modified copies and a random
+    generator per scenario in memory between requests. Requests that only
+    change event rates are answered from a baseline run of the scenario
+    (see ``incremental.IncrementalRun``), so only the changed events are
+    redrawn and the results are paired with the baseline's. Other requests
+    for the same scenario that arrive close together are combined into one
+    engine call and the simulations are split between them afterwards.
+    Results are cached by request, so repeating a query returns immediately.
+
+    Endpoints:
+        GET /scenarios: lists the scenarios with their events and shifts.
+        POST /simulate: simulates a scenario; the JSON body may contain
+            ``scenario`` (name, required), ``num_simulations``, ``engine``,
+            ``sampler``, ``seed`` and ``changes`` (see ``apply_changes``).
+
+    Responses are JSON summaries with the same metrics as the workbook.
+"""
+import asyncio
+from collections import OrderedDict
+import copy
+from http import HTTPStatus
+import json
+
+import numpy as np
+
+from .allocation import allocation_policies
+from .export import calculate_stats
+from .incremental import IncrementalRun
+from .runner import engines
+from .samplers import samplers
+from .scenarios import cycle_length
+from .scenarios.utils import Shift
+
+# The most simulations a single request can ask for
+max_simulations = 1000000
+
+# The simulations run for a request that does not ask for a number; the
+# baseline runs for these are made when the service starts
+default_simulations = 10000
+
+
+def apply_changes(scenario, changes):
+    """Returns a copy of a scenario with the requested changes made.
+
+        Attributes:
+            scenario (ScenarioDetails): the scenario to change.
+            changes (dict): may contain
+                ``events``: event names mapped to ``{"rates": [...]}`` or
+                    ``{"scale": 1.2}`` to replace or scale their rates;
+                ``shifts``: shift names mapped to any of ``number``,
+                    ``minimum`` and ``weight``, e.g. ``{"number": 20}``;
+                ``fte``: the actual FTE by employee type, e.g.
+                    ``{"regular": 36.5}``;
+                ``allocation_policy``: the name of one of the
+                    ``allocation.allocation_policies``.
+    """
+    if not isinstance(changes, dict):
+        raise TypeError('Changes must be a JSON object')
+
+    for section in ('events', 'shifts', 'fte'):
+        values = changes.get(section, {})
+
+        if not isinstance(values, dict) or section != 'fte' and not all(
+            isinstance(value, dict) for value in values.values()
+        ):
+            raise TypeError(f'The {section} changes must be JSON objects by name')
+
+    scenario = copy.deepcopy(scenario)
+    events = {event.name: event for event in scenario.events}
+    shifts = {shift.name: i for i, shift in enumerate(scenario.shifts)}
+
+    for name, event_changes in changes.get('events', {}).items():
+        event = events[name]
+
+        if 'rates' in event_changes:
+            event.set_rates(event_changes['rates'])
+        if 'scale' in event_changes:
+            event.set_rates(event.rates * event_changes['scale'])
+
+    # Changed shifts and FTE are made anew so they are checked like any other
+    for name, shift_changes in changes.get('shifts', {}).items():
+        shift = scenario.shifts[shifts[name]]
+        number = shift_changes.get('number', shift.number)
+
+        # A minimum of the whole group follows the group's new number
+        full = shift.minimum == shift.number
+        scenario.shifts[shifts[name]] = Shift(
+            name, number, shift.priority,
+            minimum=shift_changes.get(
+                'minimum', number if full else min(shift.minimum, number)
+            ),
+            weight=shift_changes.get('weight', shift.weight),
+        )
+
+    if 'allocation_policy' in changes:
+        if changes['allocation_policy'] not in allocation_policies:
+            raise KeyError(f'Unknown allocation policy: {changes["allocation_policy"]}')
+
+        scenario.allocation_policy = changes['allocation_policy']
+
+    if 'fte' in changes:
+        actual = {
+            employee_type: getattr(scenario.fte.actual, employee_type)
+            for employee_type in ('regular', 'bece', 'casual')
+        }
+
+        for employee_type, value in changes['fte'].items():
+            if employee_type not in actual:
+                raise KeyError(f'Unknown employee type: {employee_type}')
+
+            actual[employee_type] = value
+
+        scenario.fte.actual = type(scenario.fte.actual)(
+            **actual, total=sum(actual.values())
+        )
+
+    return scenario
+
+
+def summarize(simulations_stats):
+    """Converts the statistics from ``calculate_stats`` to plain values."""
+    def values(stats):
+        return {
+            'mean': float(stats.mean),
+            'ci_lower': float(stats.ci_lower),
+            'ci_upper': float(stats.ci_upper),
+        }
+
+    def finite(value):
+        return float(value) if np.isfinite(value) else None
+
+    def by_horizon(stats):
+        return {
+            'total': values(stats['stats_total']),
+            'horizons': [values(horizon) for horizon in stats['stats_horizons']],
+        }
+
+    return {
+        'num_simulations': simulations_stats['num_simulations'],
+        'events': {
+            name: by_horizon(stats)
+            for name, stats in simulations_stats['events'].items()
+        },
+        'uncovered_shifts': {
+            name: values(stats)
+            for name, stats in simulations_stats['uncovered_shifts'].items()
+        },
+        'estimates': {
+            name: {
+                'mean': float(estimate.mean),
+                'standard_error': float(estimate.standard_error),
+                'effective_sample_size': float(estimate.effective_sample_size),
+            }
+            for name, estimate in simulations_stats['estimates'].items()
+        },
+        'shortfall_risk': {
+            name: {
+                'probability_any': float(risk.probability_any),
+                'probability_week': float(risk.probability_week),
+                'longest_run_mean': float(risk.longest_run_mean),
+                'longest_run_median': float(risk.longest_run_median),
+                'longest_run_95th': float(risk.longest_run_95th),
+                # There is no first shortfall if none of the cycles had one
+                'first_week_mean': finite(risk.first_week_mean),
+                'first_week_5th': finite(risk.first_week_5th),
+                'first_week_median': finite(risk.first_week_median),
+            }
+            for name, risk in simulations_stats['shortfall_risk'].items()
+        },
+        'excess_shifts': values(simulations_stats['excess_shifts']),
+        'capacity_response': {
+            name: values(stats)
+            for name, stats in (simulations_stats['capacity_response'] or {}).items()
+        },
+        'actual_fte': values(simulations_stats['actual_fte']),
+        'shift_changes': by_horizon(simulations_stats['shift_changes']),
+    }
+
+
+class SimulationService:
+    """Runs simulations for requests, batching and caching them.
+
+        Attributes:
+            scenarios (dict): the available scenarios by name.
+            batch_window (flt): seconds to wait for other requests to join a
+                batch before it is simulated.
+            cache_size (int): the number of results to keep.
+            baseline_runs (int): the number of baseline runs to keep for
+                requests that only change event rates.
+    """
+    def __init__(self, scenarios, batch_window=0.02, cache_size=256, baseline_runs=4):
+        self.scenarios = {scenario.name: scenario for scenario in scenarios}
+        self.batch_window = batch_window
+        self.cache_size = cache_size
+        self.baseline_runs = baseline_runs
+        self.generators = {
+            name: np.random.Generator(np.random.PCG64()) for name in self.scenarios
+        }
+        self.seeds = {name: np.random.SeedSequence().entropy for name in self.scenarios}
+        self._changed_scenarios = OrderedDict()
+        self._cache = OrderedDict()
+        self._batches = {}
+        self._runs = OrderedDict()
+        self._run_locks = {}
+
+    def _scenario(self, name, changes):
+        """Returns the scenario with changes made, reusing recent copies.
+
+            As many changed copies are kept as results, so a long running
+            service does not keep a copy for every request it has seen.
+        """
+        if name not in self.scenarios:
+            raise KeyError(f'Unknown scenario: {name}')
+
+        key = (name, json.dumps(changes, sort_keys=True))
+
+        if not changes:
+            return key, self.scenarios[name]
+
+        if key in self._changed_scenarios:
+            self._changed_scenarios.move_to_end(key)
+        else:
+            self._changed_scenarios[key] = apply_changes(self.scenarios[name], changes)
+
+            if len(self._changed_scenarios) > self.cache_size:
+                self._changed_scenarios.popitem(last=False)
+
+        return key, self._changed_scenarios[key]
+
+    async def simulate(self, request):
+        """Returns the summary for a simulation request."""
+        num_simulations = int(request.get('num_simulations', default_simulations))
+        engine = request.get('engine', 'period')
+        sampler = request.get('sampler', 'auto')
+        seed = request.get('seed')
+
+        if not 1 <= num_simulations <= max_simulations:
+            raise ValueError(
+                f'num_simulations must be between 1 and {max_simulations}'
+            )
+        if engine not in engines:
+            raise ValueError(f'Unknown engine: {engine}')
+        if sampler not in samplers:
+            raise ValueError(f'Unknown sampler: {sampler}')
+
+        changes = request.get('changes', {})
+
+        if not isinstance(changes, dict):
+            raise TypeError('Changes must be a JSON object')
+        scenario_key, scenario = self._scenario(request['scenario'], changes)
+        cache_key = (scenario_key, engine, sampler, seed, num_simulations)
+
+        if cache_key in self._cache:
+            self._cache.move_to_end(cache_key)
+            return self._cache[cache_key]
+
+        if self._is_incremental(scenario, changes, engine, sampler):
+            summary = await self._simulate_incremental(
+                scenario, num_simulations, seed
+            )
+        elif seed is None:
+            summary = await self._join_batch(
+                (scenario_key, engine, sampler), scenario, num_simulations
+            )
+        else:
+            # Requests with a seed are reproducible, so they are run on their
+            # own rather than sharing the scenario's generator
+            gen = np.random.Generator(np.random.PCG64(seed))
+            summary, = await asyncio.get_running_loop().run_in_executor(
+                None, self._simulate, scenario, engine, sampler, gen,
+                [num_simulations],
+            )
+
+        self._cache[cache_key] = summary
+
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+        return summary
+
+    @staticmethod
+    def _is_incremental(scenario, changes, engine, sampler):
+        """Whether a request can be answered from a baseline run.
+
+            Baseline runs draw exact binomial counts with the period engine,
+            so they stand in for the exact and automatic samplers, and only
+            event rates can change without a new run.
+        """
+        return (
+            engine == 'period'
+            and sampler in ('auto', 'binomial')
+            and set(changes) <= {'events'}
+            and not any(event.follow_ons for event in scenario.events)
+        )
+
+    async def _baseline_run(self, name, num_simulations, seed):
+        """Returns the baseline run and its lock, making the run if need be."""
+        key = (name, num_simulations, seed)
+        lock = self._run_locks.setdefault(key, asyncio.Lock())
+
+        async with lock:
+            if key not in self._runs:
+                self._runs[key] = await asyncio.get_running_loop().run_in_executor(
+                    None, IncrementalRun, self.scenarios[name], num_simulations,
+                    self.seeds[name] if seed is None else seed,
+                )
+
+                if len(self._runs) > self.baseline_runs:
+                    del self._run_locks[next(iter(self._runs))]
+                    self._runs.popitem(last=False)
+
+            self._runs.move_to_end(key)
+
+        return self._runs[key], lock
+
+    async def _simulate_incremental(self, scenario, num_simulations, seed):
+        """Answers a request that only changes rates from a baseline run."""
+        run, lock = await self._baseline_run(scenario.name, num_simulations, seed)
+
+        async with lock:
+            return await asyncio.get_running_loop().run_in_executor(
+                None, self._update_run, run, scenario
+            )
+
+    @staticmethod
+    def _update_run(run, scenario):
+        """Sets a baseline run's rates to a scenario's and summarises it.
+
+            Events changed by an earlier request but not this one are set
+            back to their own rates, so the results never depend on the
+            order of the requests.
+        """
+        for event, current in zip(scenario.events, run.scenario.events):
+            if not np.array_equal(event.rates, current.rates):
+                run.set_rates(event.name, event.rates)
+
+        return summarize(calculate_stats(run.scenario, run.results))
+
+    async def warm(self, num_simulations=default_simulations):
+        """Makes the baseline runs for each scenario ahead of requests."""
+        for name, scenario in self.scenarios.items():
+            if self._is_incremental(scenario, {}, 'period', 'auto'):
+                await self._baseline_run(name, num_simulations, None)
+
+    @staticmethod
+    def _simulate(scenario, engine, sampler, gen, sizes):
+        """Runs the simulations for several requests in one engine call.
+
+            Returns the summary for each request size in ``sizes``.
+        """
+        results = engines[engine](
+            cycle_length, scenario, sum(sizes), gen=gen, sampler=sampler
+        )
+        summaries = []
+        start = 0
+
+        for size in sizes:
+            block = results.block(start, start + size)
+            summaries.append(summarize(calculate_stats(scenario, block)))
+            start += size
+
+        return summaries
+
+    async def _join_batch(self, batch_key, scenario, num_simulations):
+        """Adds a request to the next batch for its scenario and options."""
+        future = asyncio.get_running_loop().create_future()
+
+        if batch_key not in self._batches:
+            self._batches[batch_key] = []
+            asyncio.create_task(self._run_batch(batch_key, scenario))
+
+        self._batches[batch_key].append((num_simulations, future))
+
+        return await future
+
+    async def _run_batch(self, batch_key, scenario):
+        """Simulates the requests that joined a batch during its window."""
+        await asyncio.sleep(self.batch_window)
+        requests = self._batches.pop(batch_key)
+        _, engine, sampler = batch_key
+        gen = self.generators[scenario.name]
+        sizes = [num_simulations for num_simulations, _ in requests]
+
+        try:
+            summaries = await asyncio.get_running_loop().run_in_executor(
+                None, self._simulate, scenario, engine, sampler, gen, sizes
+            )
+        except Exception as e:
+            for _, future in requests:
+                future.set_exception(e)
+        else:
+            for (_, future), summary in zip(requests, summaries):
+                future.set_result(summary)
+
+    def describe(self):
+        """Lists the scenarios with their events and shifts."""
+        return {
+            name: {
+                'events': [event.name for event in scenario.events],
+                'shifts': [shift.name for shift in scenario.shifts],
+            }
+            for name, scenario in self.scenarios.items()
+        }
+
+    async def handle(self, reader, writer):
+        """Handles one HTTP connection."""
+        try:
+            request_line = (await reader.readline()).decode().split()
+            headers = {}
+
+            while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+                key, _, value = line.decode().partition(':')
+                headers[key.strip().lower()] = value.strip()
+
+            try:
+                body = await self._read_body(reader, headers)
+                status, response = await self._route(request_line, body)
+            except (KeyError, ValueError, TypeError) as e:
+                status, response = HTTPStatus.BAD_REQUEST, {'error': str(e)}
+            except Exception as e:
+                # Anything else is a fault in the service, not the request
+                status = HTTPStatus.INTERNAL_SERVER_ERROR
+                response = {'error': f'{type(e).__name__}: {e}'}
+
+            payload = json.dumps(response).encode()
+            writer.write(
+                f'HTTP/1.1 {status.value} {status.phrase}\r\n'
+                'Content-Type: application/json\r\n'
+                f'Content-Length: {len(payload)}\r\n'
+                'Connection: close\r\n\r\n'.encode() + payload
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_body(reader, headers):
+        """Reads a request's body from the length given in its headers."""
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise ValueError(f'Invalid Content-Length: {headers["content-length"]}')
+
+        if length < 0:
+            raise ValueError(f'Invalid Content-Length: {length}')
+
+        try:
+            return await reader.readexactly(length)
+        except asyncio.IncompleteReadError:
+            raise ValueError('The request body is shorter than its Content-Length')
+
+    async def _route(self, request_line, body):
+        """Returns the status and response for a request."""
+        if len(request_line) < 2:
+            raise ValueError('Malformed request')
+
+        method, path = request_line[:2]
+
+        if method == 'GET' and path == '/scenarios':
+            return HTTPStatus.OK, self.describe()
+
+        if method == 'POST' and path == '/simulate':
+            request = json.loads(body or b'{}')
+
+            if not isinstance(request, dict):
+                raise TypeError('The request body must be a JSON object')
+
+            return HTTPStatus.OK, await self.simulate(request)
+
+        return HTTPStatus.NOT_FOUND, {'error': f'No endpoint for {method} {path}'}
+
+
+async def serve(scenarios, host='127.0.0.1', port=8765, **options):
+    """Runs the service until it is stopped.
+
+        The service only listens on the local machine by default, and starts
+        listening once the baseline runs are made.
+    """
+    service = SimulationService(scenarios, **options)
+    await service.warm()
+    server = await asyncio.start_server(service.handle, host, port)
+
+    async with server:
+        await server.serve_forever()
@@ -0,0 +1,151 @@
+"""Splits a run into shards that can be simulated separately and merged.
+
+    Each shard runs a contiguous range of the stream blocks for every
+    scenario and saves the raw result arrays (which compress well, and are
+    needed for the percentile based CIs) with the run details in a single
+    ``.npz`` file. Shards only share files, so they can run on any machine
+    that can reach the output directory.
+"""
+import json
+
+import numpy as np
+
+from .results import SimulationResultSet
+from .runner import num_blocks, simulate_blocks
+
+
+def shard_blocks(num_simulations, shard_index, num_shards):
+    """Returns the stream blocks run by one shard."""
+    if not 0 <= shard_index < num_shards:
+        raise ValueError(f'Shard index must be between 0 and {num_shards - 1}')
+
+    blocks = np.arange(num_blocks(num_simulations))
+
+    return np.array_split(blocks, num_shards)[shard_index].tolist()
+
+
+def write_shard(
+    save_loc, scenarios, num_simulations, seed, shard_index, num_shards,
+    engine='period', sampler='binomial', bit_generator='pcg64',
+    variance_reduction='none', common_random_numbers=False,
+):
+    """Runs one shard of the simulations and saves its results.
+
+        Attributes:
+            save_loc (Path): where to save the shard file.
+            scenarios (list): the scenarios in the run.
+            num_simulations (int): the total simulations per scenario.
+            seed (int): the seed for the whole run; must be the same for
+                every shard.
+            shard_index (int): which shard to run.
+            num_shards (int): the number of shards the run is split into.
+            engine (str): the simulation engine to use.
+            sampler (str): the name of the sampler in ``samplers.samplers``.
+            bit_generator (str): the name of the bit generator in
+                ``runner.bit_generators``.
+            variance_reduction (str): one of ``samplers.variance_reductions``.
+            common_random_numbers (bool): whether every scenario draws from
+                the same streams.
+    """
+    blocks = shard_blocks(num_simulations, shard_index, num_shards)
+    details = {
+        'seed': seed,
+        'num_simulations': num_simulations,
+        'engine': engine,
+        'sampler': sampler,
+        'bit_generator': bit_generator,
+        'variance_reduction': variance_reduction,
+        'common_random_numbers': common_random_numbers,
+        'shard_index': shard_index,
+        'num_shards': num_shards,
+        'blocks': blocks,
+        'scenarios': [],
+    }
+    arrays = {}
+
+    for scenario_index, scenario in enumerate(scenarios):
+        results = simulate_blocks(
+            scenario, scenario_index, num_simulations, seed, blocks, engine,
+            sampler=sampler, bit_generator=bit_generator,
+            variance_reduction=variance_reduction,
+            common_random_numbers=common_random_numbers,
+        )
+
+        details['scenarios'].append({'name': scenario.name, **results.axes()})
+
+        for name, values in results.arrays().items():
+            arrays[f'{scenario_index}_{name}'] = values
+
+    np.savez_compressed(save_loc, details=json.dumps(details), **arrays)
+
+
+def read_shard(path):
+    """Reads a shard file.
+
+        Returns the run details and a list with a ``SimulationResultSet``
+        for each scenario.
+    """
+    with np.load(path) as shard:
+        details = json.loads(str(shard['details']))
+        scenario_results = []
+
+        for scenario_index, scenario in enumerate(details['scenarios']):
+            prefix = f'{scenario_index}_'
+            arrays = {
+                name.removeprefix(prefix): shard[name]
+                for name in shard.files if name.startswith(prefix)
+            }
+            axes = {axis: scenario[axis] for axis in SimulationResultSet.axis_names}
+            scenario_results.append(SimulationResultSet.from_arrays(axes, arrays))
+
+    return details, scenario_results
+
+
+def merge_shards(paths):
+    """Combines shard files into the results of the full run.
+
+        The shards must come from the same run (seed, number of
+        simulations, engine, sampler, bit generator, variance reduction,
+        common random numbers and scenarios) and together cover every
+        stream block exactly once.
+
+        Returns the run details and a list of (scenario name,
+        ``SimulationResultSet``) pairs.
+    """
+    shards = sorted(
+        (read_shard(path) for path in paths),
+        key=lambda shard: shard[0]['blocks'][:1],
+    )
+    first = shards[0][0]
+    run_keys = (
+        'seed', 'num_simulations', 'engine', 'sampler', 'bit_generator',
+        'variance_reduction', 'common_random_numbers',
+    )
+
+    for details, _ in shards:
+        if any(details[key] != first[key] for key in run_keys):
+            raise ValueError('Shards must come from the same run')
+
+        names = [scenario['name'] for scenario in details['scenarios']]
+
+        if names != [scenario['name'] for scenario in first['scenarios']]:
+            raise ValueError('Shards must simulate the same scenarios')
+
+    blocks = sorted(block for details, _ in shards for block in details['blocks'])
+
+    if blocks != list(range(num_blocks(first['num_simulations']))):
+        raise ValueError('Shards must cover every block of the run exactly once')
+
+    merged = []
+
+    for scenario_index, scenario in enumerate(first['scenarios']):
+        merged.append((
+            scenario['name'],
+            SimulationResultSet.concatenate(
+                [results[scenario_index] for _, results in shards]
+            ),
+        ))
+
+    details = {key: first[key] for key in run_keys}
+
+    return details, merged
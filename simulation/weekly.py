@@ -0,0 +1,268 @@
+"""Streaming per-week distributions for fan charts of a run.
+
+    The per-week capacity and coverage of each simulation are summarised as
+    they are simulated, so the bands for every week of the cycle can be
+    reported without keeping any simulation's weekly trajectory.
+"""
+import numpy as np
+
+
+# The quantiles reported for each week
+fan_quantiles = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+# The width of the uncovered shifts bins, in shifts
+uncovered_resolution = 0.1
+
+
+def _top_bins(shift_numbers):
+    """Returns the uncovered shifts bin that holds each whole shift group."""
+    return np.ceil(shift_numbers / uncovered_resolution - 1e-9).astype(np.intp)
+
+
+class WeeklyQuantiles:
+    """A mergeable sketch of the weekly capacity and uncovered shifts.
+
+        The capacity remaining after events in each week is counted in a
+        histogram with one bin per whole shift, from the full shift capacity
+        down to zero (lower values are counted in the lowest bin). Events
+        lose whole shifts, so every value falls on a bin and the quantiles
+        are exact; fractional losses would be rounded to the nearest shift.
+        The uncovered shifts of each shift group and week are counted in a
+        histogram with bins ``uncovered_resolution`` shifts apart, from none
+        up to the group's number of shifts. Shift groups can be fractional
+        (e.g. 15.15 shifts) and so can partly covered groups, so the last
+        bin of each group holds exactly its number: a group that is either
+        covered or not, as under the strict allocation, has exact
+        quantiles, and partly covered groups are within half a bin. The
+        means use the exact totals.
+
+        Sketches are combined by adding their counts, which gives the same
+        result for any split of the blocks between workers or shards.
+
+        Attributes:
+            lowest_capacity (flt): the capacity of the lowest histogram bin;
+                each bin above it is one shift higher.
+            shift_numbers (np.ndarray): the number of each shift, in the
+                order of the result set's shifts.
+            capacity_counts (np.ndarray): simulations in each capacity bin,
+                of shape (weeks, bins).
+            capacity_totals (np.ndarray): the total remaining capacity of
+                each week across simulations.
+            uncovered_counts (np.ndarray): simulations in each uncovered
+                shifts bin, of shape (shifts, weeks, bins); groups smaller
+                than the largest leave their top bins empty.
+            uncovered_totals (np.ndarray): the total uncovered shifts of
+                each shift and week across simulations.
+    """
+    # The arrays that hold the sketch, in the order they are saved
+    fields = (
+        'lowest_capacity', 'shift_numbers', 'capacity_counts', 'capacity_totals',
+        'uncovered_counts', 'uncovered_totals',
+    )
+
+    def __init__(
+        self, lowest_capacity, shift_numbers, capacity_counts, capacity_totals,
+        uncovered_counts, uncovered_totals,
+    ):
+        self.lowest_capacity = float(lowest_capacity)
+        self.shift_numbers = np.asarray(shift_numbers, dtype=float)
+        self.capacity_counts = capacity_counts
+        self.capacity_totals = capacity_totals
+        self.uncovered_counts = uncovered_counts
+        self.uncovered_totals = uncovered_totals
+
+    @classmethod
+    def empty(cls, shift_capacity, shift_numbers, weeks):
+        """Creates a sketch with no simulations."""
+        bins = int(np.ceil(shift_capacity)) + 1
+        uncovered_bins = int(_top_bins(np.asarray(shift_numbers)).max(initial=0)) + 1
+
+        return cls(
+            lowest_capacity=shift_capacity - (bins - 1),
+            shift_numbers=shift_numbers,
+            capacity_counts=np.zeros((weeks, bins), dtype=np.int64),
+            capacity_totals=np.zeros(weeks),
+            uncovered_counts=np.zeros(
+                (len(shift_numbers), weeks, uncovered_bins), dtype=np.int64
+            ),
+            uncovered_totals=np.zeros((len(shift_numbers), weeks)),
+        )
+
+    @classmethod
+    def for_scenario(cls, scenario, weeks):
+        """Creates an empty sketch for a scenario's capacity and shifts.
+
+            Extra shifts worked to cover a shortfall can take the capacity
+            up to the shift demand, so the top bin is raised by whole shifts
+            to fit it.
+        """
+        shift_capacity = scenario.fte.actual.total * 5
+        demand = sum(shift.number for shift in scenario.shifts)
+
+        if scenario.capacity_response:
+            shift_capacity += max(np.ceil(demand - shift_capacity), 0)
+
+        return cls.empty(
+            shift_capacity, [shift.number for shift in scenario.shifts], weeks,
+        )
+
+    @property
+    def weeks(self):
+        return self.capacity_counts.shape[0]
+
+    @property
+    def num_simulations(self):
+        return int(self.capacity_counts[0].sum()) if self.weeks else 0
+
+    def add(self, remaining_capacity, uncovered):
+        """Counts a block of simulations.
+
+            Attributes:
+                remaining_capacity (np.ndarray): the capacity left after
+                    events, of shape (simulations, weeks).
+                uncovered (np.ndarray): the uncovered shifts of each shift
+                    group, of shape (shifts, simulations, weeks).
+        """
+        bins = self.capacity_counts.shape[1]
+        index = np.clip(
+            np.rint(remaining_capacity - self.lowest_capacity), 0, bins - 1
+        ).astype(np.intp)
+
+        # Offset each week's bins so one bincount covers every week
+        index += np.arange(self.weeks) * bins
+        self.capacity_counts += np.bincount(
+            index.ravel(), minlength=self.capacity_counts.size
+        ).reshape(self.capacity_counts.shape)
+        self.capacity_totals += remaining_capacity.sum(axis=0)
+
+        # The same for every shift group and week of the uncovered shifts.
+        # Most groups are covered most weeks, so only the shortfalls are
+        # binned and the rest are counted in the zero bin. A fully
+        # uncovered group goes in its top bin, and anything short of that
+        # in the nearest bin below it
+        shifts, weeks, bins = self.uncovered_counts.shape
+        values = uncovered.ravel()
+        short = np.flatnonzero(values > 0)
+        group = short * shifts // values.size
+        top = _top_bins(self.shift_numbers)[group]
+        values = values[short]
+        index = np.where(
+            values >= self.shift_numbers[group] - 1e-9, top,
+            np.minimum(np.rint(values / uncovered_resolution), top - 1),
+        ).astype(np.intp)
+        index += (group * weeks + short % weeks) * bins
+        counts = np.bincount(
+            index, minlength=self.uncovered_counts.size
+        ).reshape(self.uncovered_counts.shape)
+        counts[..., 0] += uncovered.shape[1] - counts.sum(axis=-1)
+        self.uncovered_counts += counts
+        self.uncovered_totals += uncovered.sum(axis=1)
+
+    def update(self, other):
+        """Adds another sketch of the same scenario's simulations to this one."""
+        if (
+            other.capacity_counts.shape != self.capacity_counts.shape
+            or other.uncovered_counts.shape != self.uncovered_counts.shape
+            or other.lowest_capacity != self.lowest_capacity
+        ):
+            raise ValueError(
+                'Weekly sketches must have the same weeks, capacity and shifts'
+            )
+
+        self.capacity_counts += other.capacity_counts
+        self.capacity_totals += other.capacity_totals
+        self.uncovered_counts += other.uncovered_counts
+        self.uncovered_totals += other.uncovered_totals
+
+    def copy(self):
+        """Returns a copy of the sketch."""
+        return WeeklyQuantiles(
+            *(np.copy(getattr(self, field)) for field in self.fields)
+        )
+
+    def reorder(self, shift_order):
+        """Returns a copy of the sketch with its shifts in a new order."""
+        return WeeklyQuantiles(
+            self.lowest_capacity,
+            self.shift_numbers[shift_order],
+            self.capacity_counts.copy(),
+            self.capacity_totals.copy(),
+            self.uncovered_counts[shift_order],
+            self.uncovered_totals[shift_order],
+        )
+
+    def _histogram_quantiles(self, counts, quantiles):
+        """Returns the bin of each quantile of histograms in the last axis.
+
+            Each quantile is the lowest bin reached by at least that share of
+            the simulations (the inverted CDF).
+        """
+        cdf = np.cumsum(counts, axis=-1)
+        targets = np.asarray(quantiles) * self.num_simulations
+        index = (cdf[..., np.newaxis] < targets).sum(axis=-2)
+
+        return np.minimum(index, cdf.shape[-1] - 1)
+
+    def capacity_quantiles(self, quantiles=fan_quantiles):
+        """Returns the remaining capacity quantiles of shape (weeks, quantiles)."""
+        return self.lowest_capacity + self._histogram_quantiles(
+            self.capacity_counts, quantiles
+        )
+
+    def capacity_means(self):
+        """Returns the mean remaining capacity of each week."""
+        return self.capacity_totals / max(self.num_simulations, 1)
+
+    def uncovered_quantiles(self, quantiles=fan_quantiles):
+        """Returns the uncovered shift quantiles of shape (shifts, weeks, quantiles)."""
+        index = self._histogram_quantiles(self.uncovered_counts, quantiles)
+        bins = self.uncovered_counts.shape[-1]
+        values = np.minimum(
+            np.arange(bins) * uncovered_resolution, self.shift_numbers[:, np.newaxis]
+        )
+
+        return values[np.arange(len(values))[:, np.newaxis, np.newaxis], index]
+
+    def uncovered_means(self):
+        """Returns the mean uncovered shifts of shape (shifts, weeks)."""
+        return self.uncovered_totals / max(self.num_simulations, 1)
+
+    def table(self, shift_names, quantiles=fan_quantiles):
+        """Returns the weekly bands as rows of a table.
+
+            Each row is (measure, week, mean, *quantiles), with the weeks
+            counted from 1. The measures are the remaining shift capacity,
+            the actual FTE and the uncovered shifts of each shift.
+
+            Attributes:
+                shift_names (list): the names of the shifts, in sketch order.
+                quantiles (tuple): the quantiles to report.
+        """
+        capacity_quantiles = self.capacity_quantiles(quantiles)
+        capacity_means = self.capacity_means()
+        measures = [
+            ('Remaining Shift Capacity', capacity_means, capacity_quantiles),
+            ('Actual FTE', capacity_means / 5, capacity_quantiles / 5),
+        ]
+        measures.extend(
+            (f'Uncovered Shifts - {name}', means, bands)
+            for name, means, bands in zip(
+                shift_names, self.uncovered_means(), self.uncovered_quantiles(quantiles)
+            )
+        )
+
+        return [
+            (
+                measure, week + 1, round(float(means[week]), 2),
+                *(round(float(value), 2) for value in bands[week]),
+            )
+            for measure, means, bands in measures
+            for week in range(self.weeks)
+        ]
+
+    def __str__(self):
+        """String representation of WeeklyQuantiles."""
+        return (
+            f'Weekly Quantiles: {self.num_simulations} simulations, '
+            f'{self.weeks} weeks'
+        )
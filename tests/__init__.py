@@ -0,0 +1 @@
+"""Behaviour checks for the simulation package."""
@@ -0,0 +1,20 @@
+"""Shared fixtures for the behaviour checks."""
+import pytest
+
+from simulation import rare_events, runner
+from simulation.scenarios import scenarios
+
+
+@pytest.fixture
+def scenario():
+    """The first scenario in the package."""
+    return scenarios[0]
+
+
+@pytest.fixture
+def small_blocks(monkeypatch):
+    """Shrinks the stream blocks so a small run spans several of them."""
+    monkeypatch.setattr(runner, 'stream_block_size', 100)
+    monkeypatch.setattr(rare_events, 'stream_block_size', 100)
+
+    return 100
@@ -0,0 +1,106 @@
+"""Checks the shift allocation policies."""
+import numpy as np
+import pytest
+
+from simulation.allocation import allocation_policies, share_capacity
+from simulation.scenarios.utils import Shift
+
+
+shifts = [
+    Shift('Dispensary', 20, priority=1, minimum=15),
+    Shift('Clinical', 15.15, priority=2, minimum=10, weight=2),
+    Shift('Education', 5, priority=2, minimum=0),
+    Shift('Projects', 4, priority=3, minimum=1),
+]
+
+
+def brute_force_share(capacity, needs, weights):
+    """Finds the water level at which every need is filled by bisection."""
+    needs = np.asarray(needs, dtype=float)
+    claims = needs * np.asarray(weights, dtype=float)
+    target = min(max(capacity, 0), needs.sum())
+    low, high = 0.0, 1 / np.min(weights)
+
+    for _ in range(200):
+        level = (low + high) / 2
+
+        if np.minimum(needs, level * claims).sum() < target:
+            low = level
+        else:
+            high = level
+
+    return np.minimum(needs, high * claims)
+
+
+def test_share_capacity_matches_water_level():
+    """Shares are the needs cut off at a common level of claim."""
+    gen = np.random.default_rng(1)
+    needs = [3, 10, 0.5, 7.25]
+    weights = [1, 2, 5, 0.5]
+    capacity = gen.uniform(-2, 25, size=(40, 3))
+
+    given, left = share_capacity(capacity, needs, weights)
+
+    for index in np.ndindex(capacity.shape):
+        expected = brute_force_share(capacity[index], needs, weights)
+        np.testing.assert_allclose(given[(slice(None),) + index], expected, atol=1e-9)
+
+    np.testing.assert_allclose(
+        left, np.maximum(capacity, 0) - np.minimum(np.maximum(capacity, 0), sum(needs)),
+        atol=1e-9,
+    )
+
+
+@pytest.mark.parametrize('policy', allocation_policies)
+def test_policies_cover_within_limits(policy):
+    """No policy covers more than a group's shifts or than the capacity."""
+    gen = np.random.default_rng(2)
+    capacity = gen.uniform(-5, 60, size=(200, 4))
+    numbers = np.array([shift.number for shift in shifts])
+
+    covered, unused = allocation_policies[policy](capacity, shifts)
+
+    assert covered.shape == (len(shifts),) + capacity.shape
+    assert (covered >= 0).all()
+    assert (covered <= numbers[:, np.newaxis, np.newaxis] + 1e-9).all()
+    assert (unused >= 0).all()
+    assert (covered.sum(axis=0) + unused <= np.maximum(capacity, 0) + 1e-9).all()
+
+    # Enough capacity covers every shift
+    full = np.full((1, 1), numbers.sum() + 1)
+    covered, _ = allocation_policies[policy](full, shifts)
+    np.testing.assert_allclose(covered[:, 0, 0], numbers)
+
+
+@pytest.mark.parametrize('policy', ['partial', 'proportional', 'minimum_staffing'])
+def test_policies_use_all_capacity_when_short(policy):
+    """Policies that cover groups in part leave no capacity unused."""
+    capacity = np.linspace(0, 44.15, 50)[:, np.newaxis]
+
+    covered, unused = allocation_policies[policy](capacity, shifts)
+
+    np.testing.assert_allclose(covered.sum(axis=0), capacity, atol=1e-9)
+    np.testing.assert_allclose(unused, 0, atol=1e-9)
+
+
+def test_strict_covers_whole_groups_in_order():
+    """Strict allocation covers whole groups until one cannot be covered."""
+    capacity = np.array([[19.0, 20.0, 35.1, 35.5, 41.0]])
+
+    covered, _ = allocation_policies['strict'](capacity, shifts)
+
+    np.testing.assert_allclose(covered[:, 0], [
+        [0, 20, 20, 20, 20],
+        [0, 0, 0, 15.15, 15.15],
+        [0, 0, 0, 0, 5],
+        [0, 0, 0, 0, 0],
+    ])
+
+
+def test_minimum_staffing_covers_minimums_first():
+    """Every minimum is covered before any group goes above its minimum."""
+    capacity = np.array([[26.0]])
+
+    covered, _ = allocation_policies['minimum_staffing'](capacity, shifts)
+
+    np.testing.assert_allclose(covered[:, 0, 0], [15, 10, 0, 1])
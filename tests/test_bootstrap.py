@@ -0,0 +1,71 @@
+"""Checks the batched bootstrap against resampling each replicate directly."""
+import numpy as np
+import pytest
+
+from simulation.scenarios.utils import bootstrap_intervals
+
+
+def naive_intervals(values, quantiles, replicates, confidence, group_size, seed):
+    """Resamples each replicate's simulations from the same draws as
+        ``bootstrap_intervals`` and finds its means and quantiles directly.
+    """
+    num_simulations = values.shape[1]
+    groups = np.arange(num_simulations).reshape(-1, group_size)
+    draws = np.random.default_rng(seed).integers(
+        len(groups), size=(replicates, len(groups))
+    )
+    means = []
+    resampled = []
+
+    for replicate in draws:
+        sample = values[:, groups[replicate].ravel()]
+        means.append(sample.mean(axis=1))
+        resampled.append(
+            np.quantile(sample, quantiles, axis=1, method='inverted_cdf').T
+        )
+
+    tail = (1 - confidence) / 2
+
+    return (
+        np.quantile(means, [tail, 1 - tail], axis=0).T,
+        np.moveaxis(np.quantile(resampled, [tail, 1 - tail], axis=0), 0, -1),
+    )
+
+
+@pytest.mark.parametrize('group_size', [1, 4])
+def test_intervals_match_naive_bootstrap(group_size):
+    """Counting draws gives the same intervals as resampling directly."""
+    gen = np.random.default_rng(1)
+    values = np.stack([
+        gen.poisson(3, size=400),
+        gen.normal(50, 10, size=400),
+        np.where(gen.random(400) < 0.05, gen.exponential(20, size=400), 0),
+    ]).astype(float)
+    quantiles = (0.05, 0.5, 0.95)
+
+    mean_intervals, quantile_intervals = bootstrap_intervals(
+        values, quantiles, replicates=300, group_size=group_size,
+        gen=np.random.default_rng(2),
+    )
+    expected_means, expected_quantiles = naive_intervals(
+        values, quantiles, 300, 0.95, group_size, seed=2
+    )
+
+    np.testing.assert_allclose(mean_intervals, expected_means, rtol=1e-5)
+    np.testing.assert_array_equal(quantile_intervals, expected_quantiles)
+
+
+def test_batches_match_one_batch():
+    """Splitting the replicates and metrics into batches gives the same
+        intervals.
+    """
+    gen = np.random.default_rng(3)
+    values = gen.normal(size=(5, 300))
+
+    one = bootstrap_intervals(values, (0.1, 0.9), 200, gen=np.random.default_rng(4))
+    batched = bootstrap_intervals(
+        values, (0.1, 0.9), 200, gen=np.random.default_rng(4), batch_elements=300 * 7,
+    )
+
+    np.testing.assert_allclose(batched[0], one[0], rtol=1e-5)
+    np.testing.assert_array_equal(batched[1], one[1])
@@ -0,0 +1,50 @@
+"""Checks that resumed runs match uninterrupted ones."""
+import numpy as np
+import pytest
+
+from simulation import runner
+from simulation.checkpoints import Checkpoint
+from simulation.scenarios import scenarios
+
+
+def test_resumed_run_matches_uninterrupted_run(small_blocks, tmp_path):
+    """Finishing a run from its checkpoint gives the same results."""
+    run_scenarios = scenarios[:2]
+    expected = runner.run(run_scenarios, 350, seed=9)
+
+    # Complete some of the blocks, as a run stopped part way would
+    checkpoint = Checkpoint.create(tmp_path, 9, 350, 'period', run_scenarios)
+    runner.simulate_blocks(run_scenarios[0], 0, 350, 9, [0, 2], checkpoint=checkpoint)
+    runner.simulate_blocks(run_scenarios[1], 1, 350, 9, [1], checkpoint=checkpoint)
+
+    checkpoint = Checkpoint.resume(tmp_path, run_scenarios)
+    assert checkpoint.has_block(0, 2) and not checkpoint.has_block(0, 1)
+
+    resumed = runner.run(run_scenarios, 350, seed=9, checkpoint=checkpoint)
+
+    for (_, results), (_, single) in zip(resumed, expected):
+        for name, values in single.arrays().items():
+            np.testing.assert_array_equal(results.arrays()[name], values)
+
+
+def test_checkpoint_rejects_other_scenarios(tmp_path):
+    """A checkpoint cannot be resumed with different scenarios."""
+    Checkpoint.create(tmp_path, 9, 350, 'period', scenarios[:2])
+
+    with pytest.raises(FileExistsError):
+        Checkpoint.create(tmp_path, 9, 350, 'period', scenarios[:2])
+
+    with pytest.raises(ValueError):
+        Checkpoint.resume(tmp_path, scenarios[1:3])
+
+
+def test_remove_keeps_other_files(scenario, tmp_path):
+    """Removing a checkpoint only deletes the files it wrote."""
+    other = tmp_path / 'notes.txt'
+    other.write_text('keep')
+    checkpoint = Checkpoint.create(tmp_path, 9, 100, 'period', [scenario])
+    runner.simulate_blocks(scenario, 0, 100, 9, [0], checkpoint=checkpoint)
+
+    checkpoint.remove()
+
+    assert [path.name for path in tmp_path.iterdir()] == ['notes.txt']
@@ -0,0 +1,43 @@
+"""Checks that incremental updates match fresh runs."""
+import numpy as np
+
+from simulation import IncrementalRun, SimulationResultSet
+from simulation.samplers import binomial_inverse_cdf
+
+
+def assert_same_results(results, expected):
+    """Asserts that two result sets hold the same simulations."""
+    for field in SimulationResultSet.fields:
+        np.testing.assert_array_equal(getattr(results, field), getattr(expected, field))
+
+
+def test_invert_sorted_matches_inverse_cdf(scenario):
+    """Searching the sorted uniforms gives the same counts as inverting each."""
+    run = IncrementalRun(scenario, 500, seed=5)
+
+    for event_index, event in enumerate(run.scenario.events):
+        rates = run._weekly_rates(event_index)
+
+        if rates.ndim != 2:
+            continue
+
+        np.testing.assert_array_equal(
+            run._invert_sorted(event_index, rates),
+            binomial_inverse_cdf(run.trials, rates, run._uniforms(event_index)),
+        )
+
+
+def test_rate_change_matches_fresh_run(scenario):
+    """A rate change gives the same results as a new run at those rates."""
+    run = IncrementalRun(scenario, 500, seed=6)
+    event = run.scenario.events[0]
+    rates = [rate * 1.5 for rate in event.rates]
+
+    # Change the rates twice, so the second change uses the sorted uniforms
+    run.set_rates(event.name, [rate * 0.5 for rate in event.rates])
+    results = run.set_rates(event.name, rates)
+
+    changed = run.scenario
+    fresh = IncrementalRun(changed, 500, seed=6)
+
+    assert_same_results(results, fresh.results)
@@ -0,0 +1,37 @@
+"""Checks the memory the pipeline plans for against what the engines use."""
+import copy
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from simulation import pipeline, runner
+from simulation.scenarios import cycle_length, scenarios
+
+
+@pytest.mark.parametrize('engine, policy', [
+    ('period', 'strict'), ('period', 'minimum_staffing'), ('staff', 'strict'),
+])
+def test_engine_memory_within_estimate(monkeypatch, engine, policy):
+    """An engine's peak memory for a block is within its estimate."""
+    size = 2000
+    monkeypatch.setattr(pipeline, 'stream_block_size', size)
+    scenario = copy.deepcopy(scenarios[2])
+    scenario.allocation_policy = policy
+
+    tracemalloc.start()
+    results = runner.engines[engine](
+        cycle_length, scenario, size, gen=np.random.default_rng(1)
+    )
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    held = sum(np.asarray(values).nbytes for values in results.arrays().values())
+
+    assert peak <= pipeline.engine_block_bytes(scenario, engine) + held
+
+
+def test_budget_too_small_for_run():
+    """A run that cannot fit in the budget is stopped before it starts."""
+    with pytest.raises(MemoryError):
+        pipeline.queue_size_for_budget(10 ** 8, scenarios, 10 ** 6)
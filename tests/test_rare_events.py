@@ -0,0 +1,83 @@
+"""Checks the importance sampling estimates against plain simulation."""
+import copy
+import math
+
+import numpy as np
+
+from simulation import runner
+from simulation.rare_events import (
+    _simulate_tilted, estimate_shortfall_risk, tilt_strengths,
+)
+from simulation.scenarios import scenarios
+from simulation.scenarios.utils import Shock
+
+
+# A scenario and priority with shortfalls common enough to count directly
+scenario = scenarios[2]
+priority = 3
+
+
+def test_weights_average_to_one():
+    """The likelihood ratios have a mean of one under the tilted draws."""
+    gen = np.random.default_rng(10)
+    thetas = tilt_strengths(runner.cycle_length, scenario, priority)
+    _, weights = _simulate_tilted(runner.cycle_length, scenario, 4000, thetas, gen)
+
+    standard_error = weights.std(ddof=1) / math.sqrt(len(weights))
+
+    assert (weights > 0).all()
+    assert abs(weights.mean() - 1) < 5 * standard_error
+
+
+def test_no_tilt_has_unit_weights():
+    """Without a tilt every simulation has a weight of one."""
+    gen = np.random.default_rng(11)
+    thetas = np.zeros_like(tilt_strengths(runner.cycle_length, scenario, priority))
+    _, weights = _simulate_tilted(runner.cycle_length, scenario, 200, thetas, gen)
+
+    np.testing.assert_allclose(weights, 1)
+
+
+def test_estimates_match_brute_force():
+    """The weighted estimates agree with counting plain simulations."""
+    risk = estimate_shortfall_risk(scenario, 3000, seed=12, priority=priority)
+    [(_, results)] = runner.run([scenario], 20000, seed=13)
+    shift_names = [
+        shift.name for shift in scenario.shifts if shift.priority <= priority
+    ]
+    shortfalls = results.shift_rollups({'shortfall': shift_names})['shortfall']
+
+    for (value, lower, upper), counts in (
+        (risk.probability, shortfalls > 0),
+        (risk.expected_shortfall, shortfalls),
+    ):
+        standard_error = math.hypot(
+            (upper - lower) / (2 * 1.96), counts.std(ddof=1) / math.sqrt(len(counts))
+        )
+
+        assert abs(value - counts.mean()) < 4 * standard_error
+
+
+def test_uncertain_and_shocked_rates_match_brute_force():
+    """Events with uncertain rates and a shock are weighted correctly."""
+    uncertain = copy.deepcopy(scenario)
+    shock = Shock('Outbreak', 0.05)
+
+    # Correlated sick days and medical leaves, and uncertain bereavement
+    for event in uncertain.events[2:4]:
+        event.shock = shock
+
+    uncertain.events[1].rate_concentration = 20
+
+    risk = estimate_shortfall_risk(uncertain, 3000, seed=14, priority=priority)
+    [(_, results)] = runner.run([uncertain], 20000, seed=15)
+    shift_names = [
+        shift.name for shift in uncertain.shifts if shift.priority <= priority
+    ]
+    hits = results.shift_rollups({'shortfall': shift_names})['shortfall'] > 0
+    value, lower, upper = risk.probability
+    standard_error = math.hypot(
+        (upper - lower) / (2 * 1.96), hits.std(ddof=1) / math.sqrt(len(hits))
+    )
+
+    assert abs(value - hits.mean()) < 4 * standard_error
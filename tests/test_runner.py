@@ -0,0 +1,25 @@
+"""Checks that runs do not depend on how their blocks are simulated."""
+import numpy as np
+
+from simulation import runner
+from simulation.scenarios import scenarios
+
+
+def test_workers_match_one_process():
+    """Runs give the same results in worker processes, which are shut down."""
+    expected = runner.run(scenarios[:2], 300, seed=16)
+
+    try:
+        for workers in (2, 3):
+            results = runner.run(scenarios[:2], 300, seed=16, workers=workers)
+
+            for (_, result), (_, single) in zip(results, expected):
+                for name, values in single.arrays().items():
+                    np.testing.assert_array_equal(result.arrays()[name], values)
+
+        # Only the pool of the latest size is kept
+        assert list(runner._executors) == [3]
+    finally:
+        runner.shutdown_executors()
+
+    assert not runner._executors
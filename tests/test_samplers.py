@@ -0,0 +1,73 @@
+"""Checks that the inverse CDF samplers match the binomial distribution."""
+import math
+
+import numpy as np
+import pytest
+
+from simulation.samplers import binomial_cdf_table, binomial_inverse_cdf
+
+
+def brute_force_inverse_cdf(trials, rate, uniform):
+    """Returns the smallest count whose binomial CDF reaches the uniform."""
+    cdf = 0
+
+    for count in range(trials + 1):
+        cdf += math.comb(trials, count) * rate ** count * (1 - rate) ** (trials - count)
+
+        if cdf >= uniform:
+            return count
+
+    return trials
+
+
+def test_cdf_table_matches_pmf_sum():
+    """Each row of the table is the running sum of the binomial PMF."""
+    trials = 30
+    rates = np.array([0.001, 0.05, 0.5, 0.97])
+    table = binomial_cdf_table(trials, rates)
+
+    for rate, row in zip(rates, table):
+        expected = np.cumsum([
+            math.comb(trials, k) * rate ** k * (1 - rate) ** (trials - k)
+            for k in range(trials + 1)
+        ])
+        np.testing.assert_allclose(row, expected[:len(row)], rtol=1e-12)
+
+
+def test_shared_rates_match_brute_force():
+    """Uniforms that share each cell's rate invert to the exact counts."""
+    gen = np.random.default_rng(1)
+    trials = 40
+    rates = np.array([[0.0, 0.01, 0.2], [0.5, 0.9, 1.0]])
+    uniforms = gen.random((50,) + rates.shape)
+
+    outcomes = binomial_inverse_cdf(trials, rates, uniforms)
+    expected = np.vectorize(brute_force_inverse_cdf)(trials, rates, uniforms)
+
+    np.testing.assert_array_equal(outcomes, expected)
+
+
+def test_per_simulation_rates_match_brute_force():
+    """Uniforms with a rate each invert to the exact counts."""
+    gen = np.random.default_rng(2)
+    trials = 40
+    rates = gen.choice([0.0, 0.003, 0.1, 0.6, 1.0], size=(50, 2, 3))
+    uniforms = gen.random(rates.shape)
+
+    outcomes = binomial_inverse_cdf(trials, rates, uniforms)
+    expected = np.vectorize(brute_force_inverse_cdf)(trials, rates, uniforms)
+
+    np.testing.assert_array_equal(outcomes, expected)
+
+
+@pytest.mark.parametrize('rate', [0.002, 0.3])
+def test_inverse_cdf_distribution(rate):
+    """Counts drawn from uniforms have the binomial mean and variance."""
+    gen = np.random.default_rng(3)
+    trials = 200
+    outcomes = binomial_inverse_cdf(trials, np.array([rate]), gen.random((100000, 1)))
+    mean = trials * rate
+    variance = mean * (1 - rate)
+
+    assert abs(outcomes.mean() - mean) < 5 * math.sqrt(variance / len(outcomes))
+    assert outcomes.var() == pytest.approx(variance, rel=0.05)
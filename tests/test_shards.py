@@ -0,0 +1,68 @@
+"""Checks that sharded runs merge into the single run."""
+import numpy as np
+import pytest
+
+from simulation import SimulationResultSet, runner
+from simulation.scenarios import scenarios
+from simulation.shards import merge_shards, shard_blocks, write_shard
+
+
+def assert_same_results(results, expected):
+    """Asserts that two result sets hold the same simulations and sketch.
+
+        The sketch totals are summed in a different order when blocks are
+        merged, so they can differ in the last bits.
+    """
+    assert results.axes() == expected.axes()
+
+    for name, values in expected.arrays().items():
+        np.testing.assert_allclose(results.arrays()[name], values, rtol=1e-12)
+
+
+def test_shards_cover_every_block_once():
+    """The shards split the blocks between them without overlap."""
+    blocks = [block for shard in range(3) for block in shard_blocks(1000, shard, 3)]
+
+    assert blocks == list(range(runner.num_blocks(1000)))
+
+    with pytest.raises(ValueError):
+        shard_blocks(1000, 3, 3)
+
+
+def test_merged_shards_match_single_run(small_blocks, tmp_path):
+    """Merging the shards of a run gives the results of running it at once."""
+    run_scenarios = scenarios[:2]
+    expected = runner.run(run_scenarios, 450, seed=7)
+    paths = []
+
+    # Write the shards out of order, as separate machines might
+    for shard_index in (2, 0, 1):
+        path = tmp_path / f'shard_{shard_index}.npz'
+        write_shard(path, run_scenarios, 450, 7, shard_index, 3)
+        paths.append(path)
+
+    details, merged = merge_shards(paths)
+
+    assert details['seed'] == 7
+    assert [name for name, _ in merged] == [scenario.name for scenario in run_scenarios]
+
+    for (_, results), (_, single) in zip(merged, expected):
+        assert_same_results(results, single)
+
+
+def test_merge_rejects_missing_shards(small_blocks, tmp_path):
+    """A run with a shard missing cannot be merged."""
+    path = tmp_path / 'shard_0.npz'
+    write_shard(path, scenarios[:1], 450, 7, 0, 3)
+
+    with pytest.raises(ValueError):
+        merge_shards([path])
+
+
+def test_saved_results_round_trip(scenario, tmp_path):
+    """A saved result set loads back the same."""
+    [(_, results)] = runner.run([scenario], 200, seed=8)
+    path = tmp_path / 'results.npz'
+    results.save(path)
+
+    assert_same_results(SimulationResultSet.load(path), results)
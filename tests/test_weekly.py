@@ -0,0 +1,70 @@
+"""Checks the weekly quantile sketch against the simulations it counts."""
+import numpy as np
+import pytest
+
+from simulation.weekly import WeeklyQuantiles, fan_quantiles, uncovered_resolution
+
+
+shift_numbers = np.array([20, 15.15, 5])
+
+
+def sample_block(gen, size, weeks, whole_groups):
+    """Returns random capacity and uncovered shifts for a block."""
+    capacity = gen.integers(20, 45, size=(size, weeks)).astype(float)
+    uncovered = gen.uniform(0, 1, size=(len(shift_numbers), size, weeks))
+    uncovered *= shift_numbers[:, np.newaxis, np.newaxis]
+    uncovered[gen.random(uncovered.shape) < 0.6] = 0
+
+    if whole_groups:
+        uncovered = np.where(uncovered > 0, shift_numbers[:, np.newaxis, np.newaxis], 0)
+
+    return capacity, uncovered
+
+
+@pytest.mark.parametrize('whole_groups', [True, False])
+def test_quantiles_match_simulations(whole_groups):
+    """The quantiles are those of the simulations (the inverted CDF)."""
+    gen = np.random.default_rng(1)
+    weeks = 6
+    sketch = WeeklyQuantiles.empty(44.0, shift_numbers, weeks)
+    capacity, uncovered = sample_block(gen, 1000, weeks, whole_groups)
+    sketch.add(capacity, uncovered)
+
+    np.testing.assert_array_equal(
+        sketch.capacity_quantiles(),
+        np.moveaxis(np.quantile(capacity, fan_quantiles, axis=0, method='inverted_cdf'), 0, -1),
+    )
+    np.testing.assert_allclose(sketch.capacity_means(), capacity.mean(axis=0))
+
+    expected = np.moveaxis(
+        np.quantile(uncovered, fan_quantiles, axis=1, method='inverted_cdf'), 0, -1
+    )
+    tolerance = 0 if whole_groups else uncovered_resolution / 2 + 1e-9
+    np.testing.assert_allclose(sketch.uncovered_quantiles(), expected, atol=tolerance)
+    np.testing.assert_allclose(sketch.uncovered_means(), uncovered.mean(axis=1))
+
+
+def test_merged_blocks_match_one_block():
+    """Adding blocks to separate sketches and merging them changes nothing."""
+    gen = np.random.default_rng(2)
+    weeks = 4
+    whole = WeeklyQuantiles.empty(44.0, shift_numbers, weeks)
+    merged = WeeklyQuantiles.empty(44.0, shift_numbers, weeks)
+    capacity, uncovered = sample_block(gen, 300, weeks, whole_groups=False)
+    whole.add(capacity, uncovered)
+
+    for block in np.array_split(np.arange(300), 3):
+        part = WeeklyQuantiles.empty(44.0, shift_numbers, weeks)
+        part.add(capacity[block], uncovered[:, block])
+        merged.update(part)
+
+    for field in WeeklyQuantiles.fields:
+        np.testing.assert_allclose(getattr(merged, field), getattr(whole, field))
+
+
+def test_update_rejects_other_shapes():
+    """Sketches of different weeks cannot be merged."""
+    sketch = WeeklyQuantiles.empty(44.0, shift_numbers, 4)
+
+    with pytest.raises(ValueError):
+        sketch.update(WeeklyQuantiles.empty(44.0, shift_numbers, 5))